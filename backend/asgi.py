@@ -13,4 +13,6 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
+# The transaction change feed (api/transactions/events/) is an async streaming view, it has
+# to be served by an ASGI server through this application
 application = get_asgi_application()
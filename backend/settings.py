@@ -53,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'banking.throttling.RateLimitMiddleware',
 ]
 
 # For production, set the following to the domain of the frontend
@@ -121,9 +122,106 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Wait for the write lock instead of failing when transfer workers run concurrently
+            'timeout': 20,
+            # Take the write lock when the transaction starts, so select_for_update() blocks
+            # like an account lock and read-modify-write of balances cannot interleave
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Number of BalanceDelta rows that spread the credits of a hot bank account
+HOT_ACCOUNT_STRIPES = 8
+
+# Where CSV files uploaded to users/bulk-import/ wait for the import_clients command
+CLIENT_IMPORT_DIR = BASE_DIR / 'imports'
+
+# Seconds a card authorization holds the funds before sweep_holds releases it
+CARD_HOLD_TTL = 7 * 24 * 60 * 60
+# Seconds between two checks for cards changed by other processes in the card index
+CARD_INDEX_TTL = 60
+
+# Rounding of converted amounts (a rounding mode of the decimal module)
+FX_ROUNDING = 'ROUND_HALF_EVEN'
+
+# Seconds between two checks for a newer FX rate snapshot
+FX_RATE_TABLE_TTL = 5
+
+# Retries of a failed scheduled transfer wait SCHEDULED_TRANSFER_RETRY_DELAY seconds, doubled on
+# every failure, after SCHEDULED_TRANSFER_MAX_FAILURES failures the occurrence is skipped
+SCHEDULED_TRANSFER_RETRY_DELAY = 15 * 60
+SCHEDULED_TRANSFER_MAX_FAILURES = 5
+
+# Yearly interest rate paid daily on positive balances, and the monthly maintenance fee
+ACCRUAL_INTEREST_RATE = '0.0100'
+ACCRUAL_MONTHLY_FEE = '2.00'
+
+# Last transactions per bank account returned by overview/, by default and at most
+CLIENT_OVERVIEW_TRANSACTIONS = 5
+CLIENT_OVERVIEW_MAX_TRANSACTIONS = 50
+
+# IBANs whose account is kept in the memory of each process for the transfers and resolve-iban/
+IBAN_CACHE_SIZE = 100000
+
+# Sub-requests of a batch/ request, and how many of them run at the same time
+BATCH_MAX_REQUESTS = 20
+BATCH_CONCURRENCY = 4
+
+# Stripes of every counter of the banker dashboard
+DASHBOARD_COUNTER_STRIPES = 8
+
+# Velocity limits of outgoing transfers per account and window (minute, hour, day), in the
+# currency of the account. A limit can set a maximum count, a maximum amount or both
+VELOCITY_LIMITS = {
+    'minute': {'count': 5, 'amount': '2000.00'},
+    'hour': {'count': 30, 'amount': '10000.00'},
+    'day': {'count': 100, 'amount': '25000.00'},
+}
+# A receiver the account did not pay during the last VELOCITY_RECEIVER_HISTORY_DAYS is new
+VELOCITY_RECEIVER_HISTORY_DAYS = 90
+VELOCITY_NEW_RECEIVER_MAX_AMOUNT = '1000.00'
+VELOCITY_NEW_RECEIVERS_PER_DAY = 10
+
+# Token buckets of the rate limiting middleware per endpoint group: (requests, seconds) per
+# user and per client IP. A client gets the requests at once, then they refill over the seconds
+RATE_LIMITS = {
+    'login': {'user': (5, 60), 'ip': (20, 60)},
+    'transfer': {'user': (10, 60), 'ip': (30, 60)},
+    'list': {'user': (120, 60), 'ip': (300, 60)},
+}
+# Cache alias shared by the processes for the buckets, None keeps them in the memory of each process
+RATE_LIMIT_CACHE = None
+RATE_LIMIT_MAX_BUCKETS = 100000
+# META header with the client IP set by the proxy (e.g. 'HTTP_X_FORWARDED_FOR'), None uses REMOTE_ADDR
+RATE_LIMIT_CLIENT_IP_HEADER = None
+
+# How the event hubs of a process learn about new events (transactions, application status
+# changes): banking.events.PollingBackend polls the outbox tables and works with any number
+# of processes, banking.events.LocalBackend only sees the events published by its own process
+EVENT_HUB_BACKEND = 'banking.events.PollingBackend'
+# Seconds between two polls of an outbox table, and between two keep-alive comments on an idle stream
+EVENT_HUB_POLL_INTERVAL = 1
+EVENT_HUB_HEARTBEAT = 15
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        # Declines of the velocity checks, the approvals are logged at DEBUG
+        'banking.velocity': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -0,0 +1,211 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, ROUND_HALF_EVEN
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Case, Count, F, Max, Min, Sum, When
+from django.utils import timezone
+
+from .models import AccrualRun, ArchivedTransaction, BankAccount, Transaction, TransactionType, get_code
+from .money import MoneyField, money_value
+from .dashboard import add_balance_changes
+from .feed import post_transactions
+from .transfers import load_pending_deltas
+
+CENT = Decimal('0.01')
+DAYS_IN_YEAR = 365
+
+TRANSACTION_ID_PREFIXES = {
+    AccrualRun.INTEREST: 'INT',
+    AccrualRun.FEE: 'FEE',
+}
+
+
+def get_accrual_date(kind, date):
+    # Fees are monthly, every date of a month is the same fee run
+    if kind == AccrualRun.FEE:
+        return date.replace(day=1)
+    return date
+
+
+def get_accrual_transaction_id(kind, accrual_date, bank_account_id):
+    # Deterministic, an account accrues at most once per date as long as both the hot and the
+    # archive table are checked for the transaction_id
+    return f'{TRANSACTION_ID_PREFIXES[kind]}{accrual_date:%Y%m%d}-{bank_account_id}'
+
+
+def compute_amounts(kind, accounts):
+    """
+    Compute the accrual of every account with Decimal arithmetic.
+
+    Interest is the yearly rate over DAYS_IN_YEAR on the positive balance, rounded half
+    even to cents. The fee is charged to every account.
+
+    Returns:
+        dict: Bank account id -> signed amount, accounts that accrue nothing are left out.
+    """
+    if kind == AccrualRun.FEE:
+        fee = Decimal(settings.ACCRUAL_MONTHLY_FEE)
+        return {bank_account.id: -fee for bank_account in accounts}
+
+    daily_rate = Decimal(settings.ACCRUAL_INTEREST_RATE) / DAYS_IN_YEAR
+    amounts = {}
+    for bank_account in accounts:
+        balance = bank_account.get_balance()
+        if balance <= 0:
+            continue
+        amount = (balance * daily_rate).quantize(CENT, rounding=ROUND_HALF_EVEN)
+        if amount > 0:
+            amounts[bank_account.id] = amount
+    return amounts
+
+
+def accrue_chunk(kind, accrual_date, transaction_type, after_id, range_end, chunk_size):
+    """
+    Accrue the next `chunk_size` accounts of a range in one database transaction.
+
+    Accounts that already have the accrual transaction of this date are skipped, so a chunk
+    can be run again after a crash. Balances are changed with a single relative UPDATE.
+
+    Returns:
+        int: The id of the last account of the chunk, None when the range is done.
+    """
+    with transaction.atomic():
+        accounts = list(
+            BankAccount.objects.select_for_update()
+                               .filter(id__gt=after_id, id__lt=range_end)
+                               .order_by('id')[:chunk_size]
+        )
+        if not accounts:
+            return None
+
+        transaction_ids = {
+            bank_account.id: get_accrual_transaction_id(kind, accrual_date, bank_account.id)
+            for bank_account in accounts
+        }
+        # An accrual of an old date may already have been moved to the archive table
+        accrued = {
+            transaction_id
+            for model in (Transaction, ArchivedTransaction)
+            for transaction_id in model.objects.filter(transaction_id__in=transaction_ids.values())
+                                               .values_list('transaction_id', flat=True)
+        }
+        pending = [bank_account for bank_account in accounts if transaction_ids[bank_account.id] not in accrued]
+
+        load_pending_deltas(pending)
+        amounts = compute_amounts(kind, pending)
+
+        if amounts:
+            if kind == AccrualRun.FEE:
+                BankAccount.objects.filter(pk__in=amounts).update(balance=F('balance') - money_value(Decimal(settings.ACCRUAL_MONTHLY_FEE)))
+            else:
+                # Daily interest takes few distinct values, one WHEN per amount keeps the CASE short
+                ids_by_amount = {}
+                for bank_account_id, amount in amounts.items():
+                    ids_by_amount.setdefault(amount, []).append(bank_account_id)
+                BankAccount.objects.filter(pk__in=amounts).update(balance=F('balance') + Case(
+                    *[When(pk__in=ids, then=money_value(amount)) for amount, ids in ids_by_amount.items()],
+                    output_field=MoneyField()
+                ))
+
+            post_transactions([
+                Transaction(
+                    transaction_id=transaction_ids[bank_account.id],
+                    bank_account=bank_account,
+                    amount=amounts[bank_account.id],
+                    currency_id=bank_account.currency_id,
+                    type=transaction_type,
+                    date=accrual_date,
+                    balance_after=None if bank_account.is_hot else bank_account.balance + amounts[bank_account.id]
+                )
+                for bank_account in pending if bank_account.id in amounts
+            ])
+            add_balance_changes(
+                (bank_account.currency_id, amounts[bank_account.id])
+                for bank_account in pending if bank_account.id in amounts
+            )
+
+        return accounts[-1].id
+
+
+def accrue_range(kind, accrual_date, range_start, range_end, chunk_size):
+    # Runs in a worker process, every worker opens its own database connection
+    connections.close_all()
+
+    transaction_type = get_code(TransactionType, kind)
+    after_id = range_start - 1
+    while after_id is not None:
+        after_id = accrue_chunk(kind, accrual_date, transaction_type, after_id, range_end, chunk_size)
+
+
+def split_id_range(start, end, parts):
+    # [start, end] cut into at most `parts` half open ranges of the same width
+    step = max(-(-(end - start + 1) // parts), 1)
+    return [(low, min(low + step, end + 1)) for low in range(start, end + 1, step)]
+
+
+def run_accrual(kind, date, workers=None, chunk_size=1000):
+    """
+    Accrue interest or fees on every bank account for a date.
+
+    The accounts are partitioned by id range across a process pool, each worker walks its
+    range in chunks. A run is idempotent per accrual date: a completed run is not started
+    again, and a failed or interrupted run resumes by skipping the accounts that already
+    have the transaction of this date.
+
+    Args:
+        kind (str): AccrualRun.INTEREST or AccrualRun.FEE.
+        date (date): The accrual date, any day of the month for fees.
+        workers (int): The number of worker processes. Default is the number of CPUs (1 on SQLite).
+        chunk_size (int): The number of accounts accrued per database transaction.
+
+    Returns:
+        AccrualRun: The run.
+    """
+    # SQLite lets one writer in at a time, a pool of writers only queues on its lock
+    if workers is None:
+        workers = 1 if connections['default'].vendor == 'sqlite' else os.cpu_count()
+
+    accrual_date = get_accrual_date(kind, date)
+
+    accrual_run, _ = AccrualRun.objects.get_or_create(kind=kind, accrual_date=accrual_date)
+    if accrual_run.status == AccrualRun.COMPLETED:
+        return accrual_run
+
+    accrual_run.status = AccrualRun.RUNNING
+    accrual_run.save()
+
+    bounds = BankAccount.objects.aggregate(start=Min('id'), end=Max('id'))
+    try:
+        if bounds['start'] is not None:
+            ranges = split_id_range(bounds['start'], bounds['end'], workers)
+            if len(ranges) == 1:
+                accrue_range(kind, accrual_date, *ranges[0], chunk_size)
+            else:
+                # The forked workers must not share the connection of this process
+                connections.close_all()
+                with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+                    futures = [
+                        pool.submit(accrue_range, kind, accrual_date, range_start, range_end, chunk_size)
+                        for range_start, range_end in ranges
+                    ]
+                    for future in futures:
+                        future.result()
+    except Exception:
+        accrual_run.status = AccrualRun.FAILED
+        accrual_run.save()
+        raise
+
+    # Totals come from the ledger, so they include the chunks of earlier interrupted attempts
+    transaction_type = get_code(TransactionType, kind)
+    totals = [
+        model.objects.filter(type=transaction_type, date=accrual_date).aggregate(accounts=Count('id'), total=Sum('amount'))
+        for model in (Transaction, ArchivedTransaction)
+    ]
+    accrual_run.accounts = sum(tier['accounts'] for tier in totals)
+    accrual_run.total = sum(Decimal(tier['total'] or 0) for tier in totals).quantize(CENT)
+    accrual_run.status = AccrualRun.COMPLETED
+    accrual_run.finished_at = timezone.now()
+    accrual_run.save()
+    return accrual_run
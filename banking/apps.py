@@ -1,6 +1,59 @@
-from django.apps import AppConfig
+import logging
+import os
+import sys
+import threading
+import time
+
+from django.apps import AppConfig, apps
+
+logger = logging.getLogger(__name__)
+
+
+def is_server_process(argv=None):
+    """
+    Tell whether the process serves requests: a WSGI/ASGI server, or the serving process of
+    runserver. Other management commands (migrate, test, the batch jobs) are not servers.
+    """
+    argv = sys.argv if argv is None else argv
+    if not argv:
+        return False
+
+    program = os.path.basename(argv[0])
+    if program not in ('manage.py', 'django-admin') and not argv[0].endswith(os.path.join('django', '__main__.py')):
+        return True
+    if len(argv) < 2 or argv[1] != 'runserver':
+        return False
+    # The autoreloader parent only watches the files, the child it spawns serves
+    return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in argv
+
+
+def warm_caches():
+    # Load the process-local caches before the first request needs them
+    from django.db import DatabaseError, connection
+
+    from .cards import card_index
+    from .velocity import velocity_checker
+
+    # The thread starts inside ready(), wait until every application is loaded
+    while not apps.ready:
+        time.sleep(0.1)
+    try:
+        for name, cache in [('card index', card_index), ('velocity checker', velocity_checker)]:
+            try:
+                cache.ensure_warm()
+            except DatabaseError:
+                logger.warning('could not warm the %s at startup, it is warmed on first use', name, exc_info=True)
+    finally:
+        connection.close()
 
 
 class BankingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'banking'
+
+    def ready(self):
+        # Connect the signal handlers
+        from . import signals
+
+        if is_server_process():
+            threading.Thread(target=warm_caches, name='warm-caches', daemon=True).start()
@@ -0,0 +1,109 @@
+from django.db import transaction
+from django.db.models import F, Max
+
+from .models import ArchivedTransaction, Transaction
+
+# Columns copied from the Transaction table to the archive table
+ARCHIVED_FIELDS = [field.attname for field in Transaction._meta.concrete_fields]
+
+
+def get_archive_cutoff():
+    """
+    Return the date of the most recent archived transaction.
+
+    Returns:
+        date: The newest archived date, or None if nothing was archived.
+    """
+    return ArchivedTransaction.objects.aggregate(cutoff=Max('date'))['cutoff']
+
+
+def archive_transactions(before, chunk_size=1000):
+    """
+    Move the transactions dated before `before` to the archive table.
+
+    Every chunk is copied and deleted in its own database transaction, so an interrupted
+    run can simply be started again. Only transactions that already have a running balance
+    are archived, the running balance of the rows left behind is computed from them.
+
+    Args:
+        before (date): Transactions strictly older than this date are archived.
+        chunk_size (int): The number of transactions moved per database transaction.
+
+    Yields:
+        int: The number of transactions moved by each chunk.
+    """
+    candidates = Transaction.objects.filter(date__lt=before, balance_after__isnull=False).order_by('id')
+
+    while True:
+        with transaction.atomic():
+            chunk = list(candidates.values(*ARCHIVED_FIELDS)[:chunk_size])
+            if not chunk:
+                return
+
+            ArchivedTransaction.objects.bulk_create([ArchivedTransaction(**row) for row in chunk])
+            Transaction.objects.filter(pk__in=[row['id'] for row in chunk]).delete()
+
+        yield len(chunk)
+
+
+def spans_archive(date_from, date_to):
+    """
+    Check if a query over a date range has to read the archive table.
+
+    Args:
+        date_from (date | None): The lower bound of the range, None when unbounded.
+        date_to (date | None): The upper bound of the range, None when unbounded.
+
+    Returns:
+        bool: True when the range reaches archived transactions.
+    """
+    if date_from is None and date_to is None:
+        # Unbounded lists only read the hot table, ask for a date range to get older history
+        return False
+
+    cutoff = get_archive_cutoff()
+    if cutoff is None:
+        return False
+    return date_from is None or date_from <= cutoff
+
+
+def get_tier_ordering(ordering):
+    """
+    The order of a list read from both tables: the requested ordering, ties broken by id
+    in the direction of the first field so the indexes still serve it.
+
+    Args:
+        ordering (list of str | None): The ordering fields of the filter, e.g. ['-date'].
+
+    Returns:
+        list of str: The fields to order both tables by.
+    """
+    ordering = list(ordering or [])
+    if not any(field.lstrip('-') == 'id' for field in ordering):
+        ordering.append('-id' if ordering and ordering[0].startswith('-') else 'id')
+    return ordering
+
+
+def order_tier(queryset, ordering):
+    # Order one table and load the sort keys, the ?fields= of the request may leave their columns out
+    keys = {f'tier_key_{position}': F(field.lstrip('-')) for position, field in enumerate(ordering)}
+    return queryset.annotate(**keys).order_by(*ordering)
+
+
+def merge_tiers(hot, archived, ordering):
+    """
+    Merge the rows of the hot and the archive table into one list in `ordering`.
+
+    Args:
+        hot (list of tuple): (instance, data) pairs of the hot table, read with order_tier.
+        archived (list of tuple): (instance, data) pairs of the archive table, read with order_tier.
+        ordering (list of str): The fields from get_tier_ordering.
+
+    Returns:
+        list: The data of the rows in order.
+    """
+    rows = archived + hot
+    # A stable sort per field from the last one, each sort only merges the two sorted runs
+    for position in reversed(range(len(ordering))):
+        rows.sort(key=lambda row: getattr(row[0], f'tier_key_{position}'), reverse=ordering[position].startswith('-'))
+    return [data for _, data in rows]
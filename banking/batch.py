@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(Exception):
+    """Raised when a sub-request of a batch is refused. The message is safe to return to the client."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def resolve_sub_request(path):
+    """
+    Resolve the path of a sub-request to its view.
+
+    Only the synchronous API views can be batched: not the streams, nor the batch itself.
+
+    Returns:
+        ResolverMatch: The view and its arguments.
+
+    Raises:
+        BatchError: If the path is not an API route that can be batched.
+    """
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        raise BatchError('path must be an API path starting with /api/')
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        raise BatchError('Not found', status=404)
+    if match.url_name == 'batch' or asyncio.iscoroutinefunction(match.func):
+        raise BatchError('This endpoint cannot be batched')
+    return match
+
+
+def build_sub_request(request, path, user):
+    # A GET request for `path` with the headers of the batch, authenticated as `user`
+    url = urlsplit(path)
+    sub_request = HttpRequest()
+    sub_request.method = 'GET'
+    sub_request.path = sub_request.path_info = url.path
+    sub_request.GET = QueryDict(url.query)
+    sub_request.COOKIES = request.COOKIES
+    sub_request.META = {
+        name: value for name, value in request.META.items()
+        if name.startswith('HTTP_') or name in ('REMOTE_ADDR', 'SERVER_NAME', 'SERVER_PORT')
+    }
+    sub_request.META['REQUEST_METHOD'] = 'GET'
+    sub_request.META['QUERY_STRING'] = url.query
+    # Read by the REST framework instead of running the authentication again
+    sub_request._force_auth_user = user
+    return sub_request
+
+
+def run_sub_request(match, sub_request):
+    # Runs in a worker thread, which gives its database connection back like a request would
+    try:
+        response = match.func(sub_request, *match.args, **match.kwargs)
+        if hasattr(response, 'data'):
+            return response.status_code, response.data
+        return response.status_code, json.loads(response.content or b'null')
+    finally:
+        close_old_connections()
+
+
+async def run_batch(request, paths, user):
+    """
+    Run GET sub-requests concurrently, at most BATCH_CONCURRENCY at a time.
+
+    Every sub-request gets the same user, so the authentication and the role of the user are
+    resolved once for the batch. The sub-requests do not go through the middlewares.
+
+    Args:
+        request (HttpRequest): The batch request.
+        paths (list of str): The paths of the sub-requests, with their query string.
+        user (User): The authenticated user, with its role loaded.
+
+    Returns:
+        list of dict: The status and the body of every sub-request, in order.
+    """
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+
+    async def run(path):
+        try:
+            match = resolve_sub_request(path)
+        except BatchError as e:
+            return {'path': path, 'status': e.status, 'body': {'error': str(e)}}
+
+        async with semaphore:
+            try:
+                status, body = await sync_to_async(run_sub_request, thread_sensitive=False)(
+                    match, build_sub_request(request, path, user)
+                )
+            except Exception:
+                logger.exception('Batch sub-request %s failed', path)
+                return {'path': path, 'status': 500, 'body': {'error': 'An error occurred'}}
+        return {'path': path, 'status': status, 'body': body}
+
+    return await asyncio.gather(*(run(path) for path in paths))
@@ -0,0 +1,335 @@
+import hmac
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+
+from .holds import place_hold
+from .models import Card
+from .money import minor_unit
+from .utils import generate_credit_card_visa, generate_cvv, generate_transaction_id, is_luhn_valid
+
+# What an authorization needs to know about a card, without touching the database
+CardEntry = namedtuple('CardEntry', ['card_id', 'bank_account_id', 'cvv', 'expiry_date', 'legacy_check_digit', 'exponent'])
+
+
+def load_card_entries(cards):
+    # (card number, CardEntry) pairs of a Card queryset, the exponent is the one of the account currency
+    rows = cards.values_list(
+        'card_number', 'id', 'bank_account_id', 'cvv', 'expiry_date', 'legacy_check_digit',
+        'bank_account__currency__exponent'
+    )
+    for card_number, card_id, bank_account_id, cvv, expiry_date, legacy_check_digit, exponent in rows.iterator(chunk_size=10000):
+        yield card_number, CardEntry(card_id, bank_account_id, str(cvv), expiry_date, legacy_check_digit, exponent)
+
+
+def get_card_generation():
+    # Changes when a card is added (the last id) or when one is retired or reactivated (the active count)
+    return tuple(Card.objects.aggregate(last_id=Max('id'), active=Count('id', filter=Q(is_active=True))).values())
+
+
+class CardIndex:
+    """
+    Process-local hash map of card number to CardEntry.
+
+    It is warmed from the Card table at startup (see banking.apps) or on first use, and kept
+    coherent by the Card signals in banking.signals. The changes made by other processes are
+    picked up three ways: a number missing from the map is looked up in the database, a hold
+    is only placed on a card that is still active (see banking.holds.place_hold), and every
+    CARD_INDEX_TTL seconds the map is warmed again if the cards changed.
+
+    Readers never lock once it is warm: warm() builds a new dict and swaps it in, put() and
+    remove() are single dict operations.
+    """
+
+    def __init__(self):
+        self._cards = None
+        self._lock = threading.Lock()
+        # Held while the cards are loaded, a request arriving during the startup warm waits for it
+        self._warming = threading.Lock()
+        self._generation = None
+        self._checked_at = 0
+
+    def warm(self):
+        with self._warming:
+            self._warm()
+
+    def ensure_warm(self):
+        with self._warming:
+            if self._cards is None:
+                self._warm()
+
+    def refresh(self):
+        # Warm the map again if the cards changed since it was loaded, like fx.get_rate_table
+        # checks for a newer rate snapshot. Readers do not wait for a refresh of another thread
+        if not self._warming.acquire(blocking=False):
+            return
+        try:
+            if self._generation != get_card_generation():
+                self._warm()
+            else:
+                self._checked_at = time.monotonic()
+        finally:
+            self._warming.release()
+
+    def _warm(self):
+        # Read before the cards, so that a change made during the load is picked up by the next refresh
+        generation = get_card_generation()
+        cards = dict(load_card_entries(Card.objects.filter(is_active=True)))
+        with self._lock:
+            self._cards = cards
+            self._generation = generation
+            self._checked_at = time.monotonic()
+
+    def get(self, card_number):
+        card = self._get(card_number)
+        if card is None:
+            # Issued by another process since the map was loaded
+            card = next((entry for _, entry in load_card_entries(
+                Card.objects.filter(card_number=card_number, is_active=True)
+            )), None)
+            if card is not None:
+                self._cards[card_number] = card
+        return card
+
+    def get_legacy(self, card_number):
+        # Only the cards flagged by migration 0045 may have a wrong check digit, they are all in the map
+        card = self._get(card_number)
+        return card if card is not None and card.legacy_check_digit else None
+
+    def _get(self, card_number):
+        if self._cards is None:
+            self.ensure_warm()
+        elif time.monotonic() - self._checked_at >= settings.CARD_INDEX_TTL:
+            self.refresh()
+        return self._cards.get(card_number)
+
+    def put(self, card):
+        self.put_many([card])
+
+    def put_many(self, cards):
+        # Called once the cards are committed, their entries are read back with one query
+        if self._cards is None:
+            return
+        numbers = [card.card_number for card in cards]
+        entries = dict(load_card_entries(Card.objects.filter(card_number__in=numbers, is_active=True)))
+        for card_number in numbers:
+            entry = entries.get(card_number)
+            if entry is None:
+                self._cards.pop(card_number, None)
+            else:
+                self._cards[card_number] = entry
+
+    def remove(self, card_number):
+        if self._cards is None:
+            return
+        self._cards.pop(card_number, None)
+
+    def __len__(self):
+        return len(self._cards or {})
+
+
+card_index = CardIndex()
+
+
+class AuthorizationDeclined(Exception):
+    """Raised when a card payment is declined. The message is the decline reason."""
+
+
+def parse_expiry(expiry):
+    """
+    Parse a card expiry in the format MM/YY.
+
+    Returns:
+        tuple: The month and the 4 digit year.
+
+    Raises:
+        AuthorizationDeclined: If the expiry is malformed.
+    """
+    try:
+        month, year = expiry.split('/')
+        month, year = int(month), 2000 + int(year)
+    except (AttributeError, ValueError):
+        raise AuthorizationDeclined('expiry must be in the format MM/YY')
+
+    if not 1 <= month <= 12:
+        raise AuthorizationDeclined('expiry must be in the format MM/YY')
+    return month, year
+
+
+def parse_amount(amount, exponent=2):
+    # Rounded to the minor unit of the currency of the card account
+    try:
+        amount = Decimal(str(amount)).quantize(minor_unit(exponent))
+    except (InvalidOperation, ValueError):
+        raise AuthorizationDeclined('amount must be a number')
+
+    if amount <= 0:
+        raise AuthorizationDeclined('Amount must be greater than 0')
+    return amount
+
+
+def check_card(card_number, cvv, expiry, index=card_index, today=None):
+    """
+    Run the in-memory checks of a card authorization: check digit, known card, expiry and CVV.
+
+    A number with a wrong Luhn check digit is a typo, unless it is one of the legacy cards
+    issued before generate_credit_card computed the check digit correctly.
+
+    Returns:
+        CardEntry: The card.
+
+    Raises:
+        AuthorizationDeclined: If a check fails.
+    """
+    card_number = str(card_number)
+    if is_luhn_valid(card_number):
+        card = index.get(card_number)
+    else:
+        card = index.get_legacy(card_number)
+    if card is None:
+        raise AuthorizationDeclined('Invalid card number')
+
+    month, year = parse_expiry(expiry)
+    if (card.expiry_date.month, card.expiry_date.year) != (month, year):
+        raise AuthorizationDeclined('Invalid expiry date')
+    # A card is valid until the end of its MM/YY month, whatever day the issuer stored
+    today = today or date.today()
+    if (year, month) < (today.year, today.month):
+        raise AuthorizationDeclined('Card expired')
+
+    if not hmac.compare_digest(card.cvv, str(cvv)):
+        raise AuthorizationDeclined('Invalid CVV')
+
+    return card
+
+
+def authorize_card_payment(card_number, cvv, expiry, amount):
+    """
+    Authorize a card payment and hold the funds on the linked bank account.
+
+    The card checks run against the in-memory card index. The funds are held until the
+    hold is captured, released or expires (see banking.holds).
+
+    Returns:
+        Hold: The active hold.
+
+    Raises:
+        AuthorizationDeclined: If the payment is declined.
+    """
+    card = check_card(card_number, cvv, expiry)
+    amount = parse_amount(amount, card.exponent)
+
+    hold = place_hold(generate_transaction_id(prefix='AUTH'), card, amount)
+    if hold is None:
+        # Only a declined payment pays for telling a retired card from missing funds
+        if not Card.objects.filter(pk=card.card_id, is_active=True).exists():
+            card_index.remove(card_number)
+            raise AuthorizationDeclined('Invalid card number')
+        raise AuthorizationDeclined('Insufficient funds')
+
+    return hold
+
+
+def generate_card_numbers(count):
+    """
+    Generate `count` distinct Visa numbers that no card has yet.
+
+    The candidates are checked against the Card table with one query per round, a round
+    only regenerates the few numbers that were taken.
+
+    Returns:
+        list of str: The card numbers.
+    """
+    numbers = set()
+    while len(numbers) < count:
+        candidates = {generate_credit_card_visa() for _ in range(count - len(numbers))} - numbers
+        taken = set(Card.objects.filter(card_number__in=candidates).values_list('card_number', flat=True))
+        numbers |= candidates - taken
+    return list(numbers)
+
+
+def renew_card_batch(until, expiry_date, batch_size=1000, index=card_index):
+    """
+    Replace up to `batch_size` active cards expiring on or before `until`.
+
+    The cards are read from the partial expiry index in expiry order. The replacements are
+    inserted with a bulk insert (in chunks of the SQLite variable limit) and the old cards
+    are retired with one UPDATE, there is no query per card. A retired card stays in the
+    table, inactive, and its replacement points to it.
+
+    Args:
+        until (date): Last expiry date renewed.
+        expiry_date (date): Expiry date of the replacements, after `until`.
+        batch_size (int): Cards renewed in the database transaction.
+        index (CardIndex): The card index updated once the batch is committed.
+
+    Returns:
+        int: The number of cards renewed.
+    """
+    with transaction.atomic():
+        cards = list(
+            Card.objects.select_for_update(skip_locked=True)
+                        .filter(is_active=True, expiry_date__lte=until)
+                        .order_by('expiry_date', 'id')
+                        .values_list('id', 'card_number', 'user_id', 'bank_account_id', 'type', 'cardApplication_id')[:batch_size]
+        )
+        if not cards:
+            return 0
+
+        numbers = generate_card_numbers(len(cards))
+        # The signals do not run for bulk inserts, last4 is set here instead of in Card.save()
+        replacements = Card.objects.bulk_create([
+            Card(
+                card_number=number,
+                last4=number[-4:],
+                expiry_date=expiry_date,
+                cvv=generate_cvv(),
+                user_id=user_id,
+                bank_account_id=bank_account_id,
+                type=card_type,
+                cardApplication_id=card_application_id,
+                replaces_id=card_id
+            )
+            for number, (card_id, _, user_id, bank_account_id, card_type, card_application_id) in zip(numbers, cards)
+        ])
+        Card.objects.filter(pk__in=[card[0] for card in cards]).update(is_active=False)
+
+        def update_index():
+            for card in cards:
+                index.remove(card[1])
+            index.put_many(replacements)
+        transaction.on_commit(update_index)
+
+    return len(cards)
+
+
+def renew_expiring_cards(until, expiry_date, batch_size=1000, index=card_index):
+    """
+    Replace every active card expiring on or before `until`, one batch per database transaction.
+
+    The bank accounts keep an active card throughout, so the IBAN cache and the dashboard
+    card counter are unchanged. The card index of this process is updated as every batch
+    commits. The other processes find the new cards in the database on their first
+    authorization, and stop accepting the old ones at their next refresh or hold.
+
+    Returns:
+        int: The number of cards renewed.
+
+    Raises:
+        ValueError: If the replacements would expire within the window themselves.
+    """
+    if expiry_date <= until:
+        raise ValueError('The replacements must expire after the renewal window')
+
+    renewed = 0
+    while True:
+        count = renew_card_batch(until, expiry_date, batch_size=batch_size, index=index)
+        renewed += count
+        if count < batch_size:
+            return renewed
@@ -0,0 +1,175 @@
+import random
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import ApplicationStatus, BalanceDelta, BankAccount, BankAccountApplication, Card, CardApplication, \
+                    DashboardCounter
+from .money import money_value
+
+PENDING_BANK_ACCOUNT_APPLICATIONS = 'pending_bank_account_applications'
+PENDING_CARD_APPLICATIONS = 'pending_card_applications'
+# Per day, by the status given by the banker
+APPROVED = 'approved'
+REJECTED = 'rejected'
+# Per currency, the balances of the accounts including the pending credits of hot accounts
+BALANCE = 'balance'
+BANK_ACCOUNTS = 'bank_accounts'
+# Active cards, a renewal replaces a card without changing the count
+CARDS = 'cards'
+# Counters of amounts, in DashboardCounter.value. The others are counts, in DashboardCounter.count
+MONEY_COUNTERS = {BALANCE}
+
+
+def get_counter_key(name, day=None, currency_id=None, stripe=0):
+    return f'{name}:{day or ""}:{currency_id or ""}:{stripe}'
+
+
+def add_to_counter(name, amount, day=None, currency_id=None):
+    """
+    Add `amount` to a dashboard counter, in the database transaction of the change it counts.
+
+    The amount lands on one of the DASHBOARD_COUNTER_STRIPES stripes of the counter, chosen
+    at random, with a relative UPDATE.
+    """
+    stripe = random.randrange(settings.DASHBOARD_COUNTER_STRIPES)
+    key = get_counter_key(name, day, currency_id, stripe)
+    if name in MONEY_COUNTERS:
+        change = {'value': F('value') + money_value(amount)}
+    else:
+        change = {'count': F('count') + amount}
+
+    with transaction.atomic():
+        updated = DashboardCounter.objects.filter(key=key).update(**change)
+        if not updated:
+            DashboardCounter.objects.get_or_create(
+                key=key, defaults={'name': name, 'day': day, 'currency_id': currency_id, 'stripe': stripe}
+            )
+            DashboardCounter.objects.filter(key=key).update(**change)
+
+
+def add_balance_changes(changes):
+    """
+    Add the balance changes of a write to the balance counters of their currencies.
+
+    Args:
+        changes (iterable): (currency id, signed amount) pairs, summed per currency first.
+            A transfer between accounts of the same currency cancels out and writes nothing.
+    """
+    totals = {}
+    for currency_id, amount in changes:
+        totals[currency_id] = totals.get(currency_id, 0) + amount
+    for currency_id, amount in totals.items():
+        if amount:
+            add_to_counter(BALANCE, amount, currency_id=currency_id)
+
+
+def get_pending_counter(application):
+    if isinstance(application, BankAccountApplication):
+        return PENDING_BANK_ACCOUNT_APPLICATIONS
+    return PENDING_CARD_APPLICATIONS
+
+
+def record_application_decision(application):
+    # A pending application was approved or rejected by a banker
+    add_to_counter(get_pending_counter(application), -1)
+    add_to_counter(application.get_status_display(), 1, day=timezone.localdate())
+
+
+def get_dashboard():
+    """
+    Read the dashboard figures from the counters with one indexed query.
+
+    Returns:
+        dict: The pending applications by type, today's approvals and rejections, the total
+        balance per currency and the account and card counts.
+    """
+    today = timezone.localdate()
+    totals = DashboardCounter.objects.filter(Q(day__isnull=True) | Q(day=today)) \
+                                     .values_list('name', 'currency_id') \
+                                     .annotate(total=Sum('value'), count=Sum('count')) \
+                                     .order_by('name', 'currency_id')
+    counts = {name: count for name, currency_id, _, count in totals if currency_id is None}
+    totals = {(name, currency_id): total for name, currency_id, total, _ in totals}
+
+    def count(name):
+        return counts.get(name) or 0
+
+    return {
+        'pending_applications': {
+            'bank_account': count(PENDING_BANK_ACCOUNT_APPLICATIONS),
+            'card': count(PENDING_CARD_APPLICATIONS),
+        },
+        'today': {
+            'date': today,
+            'approved': count(APPROVED),
+            'rejected': count(REJECTED),
+        },
+        'balances': [
+            {'currency': currency_id, 'total': str(Decimal(total).quantize(Decimal('0.01')))}
+            for (name, currency_id), total in totals.items() if name == BALANCE
+        ],
+        'bank_accounts': count(BANK_ACCOUNTS),
+        'cards': count(CARDS),
+    }
+
+
+def rebuild_counters():
+    """
+    Recompute every dashboard counter from the tables, replacing the current values.
+
+    Changes committed while the figures are read are not counted twice nor lost on SQLite,
+    whose writers wait for this transaction. On other databases run it when no banker
+    action or transfer is in flight.
+
+    Returns:
+        int: The number of counters written.
+    """
+    today = timezone.localdate()
+    counters = {}
+
+    def put(name, value, day=None, currency_id=None):
+        if value:
+            counters[(name, day, currency_id)] = value
+
+    with transaction.atomic():
+        # Take the write lock first so the figures and the counters are consistent
+        DashboardCounter.objects.all().delete()
+
+        for model, name in ((BankAccountApplication, PENDING_BANK_ACCOUNT_APPLICATIONS),
+                            (CardApplication, PENDING_CARD_APPLICATIONS)):
+            put(name, model.objects.filter(status=ApplicationStatus.PENDING).count())
+            # An application is saved for the last time when the banker decides, its date is the day of the decision
+            decisions = model.objects.filter(date=today, status__in=[ApplicationStatus.APPROVED, ApplicationStatus.REJECTED]) \
+                                     .values_list('status').annotate(total=Count('id')).order_by()
+            for code, total in decisions:
+                status = ApplicationStatus(code).label
+                counters[(status, today, None)] = counters.get((status, today, None), 0) + total
+
+        balances = {}
+        for model, field in ((BankAccount, 'balance'), (BalanceDelta, 'amount')):
+            prefix = '' if model is BankAccount else 'bank_account__'
+            totals = model.objects.values_list(f'{prefix}currency_id').annotate(total=Sum(field)).order_by()
+            for currency_id, total in totals:
+                balances[currency_id] = balances.get(currency_id, 0) + (total or 0)
+        for currency_id, total in balances.items():
+            put(BALANCE, total, currency_id=currency_id)
+
+        put(BANK_ACCOUNTS, BankAccount.objects.count())
+        put(CARDS, Card.objects.filter(is_active=True).count())
+
+        DashboardCounter.objects.bulk_create([
+            DashboardCounter(
+                key=get_counter_key(name, day, currency_id),
+                name=name,
+                day=day,
+                currency_id=currency_id,
+                **{'value' if name in MONEY_COUNTERS else 'count': value}
+            )
+            for (name, day, currency_id), value in counters.items()
+        ])
+
+    return len(counters)
@@ -0,0 +1,243 @@
+import asyncio
+import contextvars
+import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max
+
+logger = logging.getLogger(__name__)
+
+# Events buffered for a client that does not read its stream, past it the stream is closed
+# and the client resumes from the database
+MAX_PENDING_EVENTS = 1000
+# Events read per query by the pollers and by the backlog of a client
+PAGE_SIZE = 500
+
+
+def format_event(event_id, payload):
+    return f'id: {event_id}\ndata: {json.dumps(payload)}\n\n'
+
+
+class Subscription:
+    __slots__ = ('topics', 'events', 'ready', 'overflowed')
+
+    def __init__(self, topics):
+        self.topics = topics
+        self.events = deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+
+    def push(self, event):
+        if len(self.events) >= MAX_PENDING_EVENTS:
+            self.overflowed = True
+        else:
+            self.events.append(event)
+        self.ready.set()
+
+
+class OutboxBackend:
+    """
+    Base of the hub backends. The events are rows of an outbox model written in the database
+    transaction of the change they describe, with an increasing id, a topic column and a JSON
+    payload. The backlog of a client that resumes is always read from the outbox.
+
+    The subclasses decide how the hub of a process learns about the new events.
+    """
+
+    def __init__(self, model, topic_field):
+        self.model = model
+        self.topic_field = topic_field
+        self.hub = None
+        # Queries of the hub go through a thread of their own, so they keep one database connection
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'{model.__name__}-hub')
+
+    def load(self, after_id, topics=None, before_id=None):
+        # One page of (id, topic, payload) after a cursor
+        try:
+            events = self.model.objects.filter(id__gt=after_id)
+            if topics is not None:
+                events = events.filter(**{f'{self.topic_field}__in': topics})
+            if before_id is not None:
+                events = events.filter(id__lte=before_id)
+            return list(events.order_by('id').values_list('id', self.topic_field, 'payload')[:PAGE_SIZE])
+        except Exception:
+            # A broken connection is opened again by the next query
+            connection.close()
+            raise
+
+    def load_last_id(self):
+        return self.model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+    def start(self, loop):
+        # Called by the hub when its first client subscribes
+        pass
+
+    def published(self, events):
+        # Called once the events are committed, in the thread of the publisher
+        pass
+
+
+class PollingBackend(OutboxBackend):
+    """
+    Every process polls the outbox: one query per EVENT_HUB_POLL_INTERVAL for all the clients
+    of the process, whatever their number. Works with any number of processes and hosts.
+
+    The event ids are the order of the stream. On SQLite writers are serialized, so the events
+    are committed in the order of their ids.
+    """
+
+    def __init__(self, model, topic_field):
+        super().__init__(model, topic_field)
+        self._task = None
+
+    def start(self, loop):
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            # Not a child of the request that started it, it outlives it
+            self._task = loop.create_task(self._poll(loop), context=contextvars.Context())
+
+    async def _poll(self, loop):
+        try:
+            while self.hub.has_subscriptions():
+                try:
+                    events = await loop.run_in_executor(self.executor, self.load, self.hub.last_id)
+                except Exception:
+                    logger.exception('Polling of %s failed', self.model.__name__)
+                    events = []
+
+                self.hub.dispatch(events)
+                if len(events) < PAGE_SIZE:
+                    await asyncio.sleep(settings.EVENT_HUB_POLL_INTERVAL)
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+
+class LocalBackend(OutboxBackend):
+    """
+    The publisher hands its events to the hub of its own process once they are committed,
+    nothing is polled. Only for deployments where one process serves both the writes and
+    the streams.
+    """
+
+    def published(self, events):
+        self.hub.dispatch_threadsafe(events)
+
+
+class EventHub:
+    """
+    In-process pub/sub of outbox events: the clients of a process subscribe to topics (an
+    account, a user) and the events of the backend are fanned out to the subscriptions of
+    their topic. An idle client is a suspended coroutine waiting on its subscription.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        backend.hub = self
+        self.last_id = 0
+        self._subscriptions = {}
+        self._loop = None
+
+    async def subscribe(self, topics):
+        """
+        Register a subscription for the events of `topics`.
+
+        Returns:
+            tuple: The Subscription, and the id of the last event before it. Every later
+            event is delivered to the subscription.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop (a restarted server, a test) does not inherit the subscriptions
+            self._subscriptions = {}
+            self._loop = None
+
+        if self._loop is None:
+            last_id = await loop.run_in_executor(self.backend.executor, self.backend.load_last_id)
+            if self._loop is None:
+                self.last_id = last_id
+                self._loop = loop
+
+        subscription = Subscription(topics)
+        for topic in topics:
+            self._subscriptions.setdefault(topic, set()).add(subscription)
+        self.backend.start(loop)
+        return subscription, self.last_id
+
+    def unsubscribe(self, subscription):
+        for topic in subscription.topics:
+            subscriptions = self._subscriptions.get(topic)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[topic]
+
+    def has_subscriptions(self):
+        return bool(self._subscriptions)
+
+    def dispatch(self, events):
+        # Runs in the event loop, `events` are (id, topic, payload)
+        for event in events:
+            self.last_id = max(self.last_id, event[0])
+            for subscription in self._subscriptions.get(event[1], ()):
+                subscription.push(event)
+
+    def dispatch_threadsafe(self, events):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.dispatch, events)
+
+    def publish(self, events):
+        """
+        Insert outbox events, inside the database transaction of the change they describe.
+
+        Args:
+            events (list): Unsaved instances of the outbox model.
+        """
+        events = self.backend.model.objects.bulk_create(events)
+        dispatched = [(event.id, getattr(event, self.backend.topic_field), event.payload) for event in events]
+        transaction.on_commit(lambda: self.backend.published(dispatched))
+
+    async def stream(self, subscription, position, cursor=None):
+        """
+        Server-Sent Events of a subscription: first the backlog from the outbox between the
+        cursor of the client and the subscription, then the live events, with a keep-alive
+        comment every EVENT_HUB_HEARTBEAT seconds of silence.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            if cursor is not None:
+                last_id = cursor
+                while True:
+                    events = await loop.run_in_executor(
+                        self.backend.executor, self.backend.load, last_id, subscription.topics, position
+                    )
+                    for event_id, _, payload in events:
+                        yield format_event(event_id, payload)
+                        last_id = event_id
+                    if len(events) < PAGE_SIZE:
+                        break
+
+            while True:
+                while subscription.events:
+                    event_id, _, payload = subscription.events.popleft()
+                    # The events up to the position are in the backlog
+                    if event_id > position:
+                        yield format_event(event_id, payload)
+                if subscription.overflowed:
+                    # The client reads slower than its events come, it reconnects and resumes from the database
+                    return
+
+                subscription.ready.clear()
+                try:
+                    await asyncio.wait_for(subscription.ready.wait(), settings.EVENT_HUB_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def __len__(self):
+        return len({subscription for subscriptions in self._subscriptions.values() for subscription in subscriptions})
@@ -0,0 +1,50 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .events import EventHub
+from .models import Transaction, TransactionEvent
+
+
+def get_event_payload(transaction):
+    # The transaction in the format of TransactionSerializer, built by hand as it is on the write path
+    return {
+        'id': transaction.id,
+        'transaction_id': transaction.transaction_id,
+        'amount': f'{transaction.amount:.2f}',
+        # The date is given as a datetime by some callers, the column keeps the day
+        'date': (transaction.date.date() if isinstance(transaction.date, datetime) else transaction.date).isoformat(),
+        'balance_after': None if transaction.balance_after is None else f'{transaction.balance_after:.2f}',
+        'created_at': transaction.created_at.isoformat().replace('+00:00', 'Z') if transaction.created_at else None,
+        'bank_account': transaction.bank_account_id,
+        'currency': transaction.currency_id,
+        'type': transaction.type,
+        'fx_snapshot': transaction.fx_snapshot_id,
+        'counterparty': transaction.counterparty_id,
+    }
+
+
+def post_transactions(transactions):
+    """
+    Insert transactions together with their events of the change feed.
+
+    Must run inside the database transaction that applies them, so the feed never shows a
+    transaction that was rolled back nor misses one that was committed.
+
+    Args:
+        transactions (list of Transaction): Unsaved transactions.
+
+    Returns:
+        list of Transaction: The saved transactions.
+    """
+    transactions = Transaction.objects.bulk_create(transactions)
+    transaction_feed.publish([
+        TransactionEvent(bank_account_id=transaction.bank_account_id, payload=get_event_payload(transaction))
+        for transaction in transactions
+    ])
+    return transactions
+
+
+# Change feed of the transactions, a topic is a bank account
+transaction_feed = EventHub(import_string(settings.EVENT_HUB_BACKEND)(TransactionEvent, 'bank_account_id'))
@@ -0,0 +1,71 @@
+from django_filters import rest_framework as filters
+
+from .models import Transaction, ArchivedTransaction, BankAccount, \
+                    BankAccountApplication, CardApplication
+
+# Every filter and ordering exposed here is backed by an index declared on the model,
+# banking.tests.FilterIndexTests checks the query plans
+
+
+class TransactionFilter(filters.FilterSet):
+    ordering = filters.OrderingFilter(fields=('date', 'amount', 'id'))
+
+    class Meta:
+        model = Transaction
+        fields = {
+            'bank_account': ['exact'],
+            'type': ['exact'],
+            'date': ['exact', 'gte', 'lte'],
+            'amount': ['gte', 'lte'],
+            'currency': ['exact'],
+        }
+
+    def get_date_range(self):
+        # Bounds of the requested date range, used to decide whether the archive is read
+        if not self.is_valid():
+            return None, None
+
+        data = self.form.cleaned_data
+        if data.get('date'):
+            return data['date'], data['date']
+        return data.get('date__gte'), data.get('date__lte')
+
+class ArchivedTransactionFilter(TransactionFilter):
+    class Meta(TransactionFilter.Meta):
+        model = ArchivedTransaction
+
+class BankAccountFilter(filters.FilterSet):
+    ordering = filters.OrderingFilter(fields=('balance', 'id'))
+
+    class Meta:
+        model = BankAccount
+        fields = {
+            'user': ['exact'],
+            'currency': ['exact'],
+            'balance': ['exact', 'gte', 'lte'],
+        }
+
+class BankAccountApplicationFilter(filters.FilterSet):
+    ordering = filters.OrderingFilter(fields=('date', 'id'))
+
+    class Meta:
+        model = BankAccountApplication
+        fields = {
+            'status': ['exact'],
+            'user': ['exact'],
+            'currency': ['exact'],
+            'date': ['exact', 'gte', 'lte'],
+        }
+
+class CardApplicationFilter(filters.FilterSet):
+    ordering = filters.OrderingFilter(fields=('monthly_salary', 'date', 'id'))
+
+    class Meta:
+        model = CardApplication
+        fields = {
+            'status': ['exact'],
+            'user': ['exact'],
+            'reason': ['exact'],
+            'date': ['exact', 'gte', 'lte'],
+            'monthly_salary': ['gte', 'lte'],
+        }
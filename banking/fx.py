@@ -0,0 +1,155 @@
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Currency, FxRate, FxRateSnapshot
+from .money import minor_unit
+
+RATE_PRECISION = Decimal('1E-10')
+
+
+class FxError(Exception):
+    """Raised when an amount cannot be converted. The message is safe to return to the client."""
+
+
+def round_amount(amount, exponent=2):
+    # Round to the minor unit of a currency (see Currency.exponent), the rounding mode is a setting
+    return amount.quantize(minor_unit(exponent), rounding=settings.FX_ROUNDING)
+
+
+def load_exponents():
+    return dict(Currency.objects.values_list('id', 'exponent'))
+
+
+class RateTable:
+    """
+    Immutable in-memory copy of one FxRateSnapshot.
+
+    Rates are looked up by (base currency id, quote currency id). The inverse of a published
+    rate is derived when only the opposite pair was published. The exponents of the
+    currencies are loaded with the rates, converted amounts are rounded to the minor unit of
+    their currency.
+    """
+
+    def __init__(self, snapshot_id, rates, exponents=None):
+        self.snapshot_id = snapshot_id
+        self.rates = dict(rates)
+        self.exponents = dict(exponents or {})
+
+    @classmethod
+    def load(cls, snapshot_id):
+        rates = FxRate.objects.filter(snapshot_id=snapshot_id).values_list('base_id', 'quote_id', 'rate')
+        return cls(snapshot_id, {(base_id, quote_id): rate for base_id, quote_id, rate in rates}, load_exponents())
+
+    def get_exponent(self, currency_id):
+        return self.exponents.get(currency_id, 2)
+
+    def get_rate(self, base_id, quote_id):
+        if base_id == quote_id:
+            return Decimal(1)
+
+        rate = self.rates.get((base_id, quote_id))
+        if rate is not None:
+            return rate
+
+        inverse = self.rates.get((quote_id, base_id))
+        if inverse:
+            return Decimal(1) / inverse
+
+        raise FxError('No exchange rate for these currencies')
+
+    def convert(self, amount, base_id, quote_id):
+        """
+        Convert `amount` from the base currency to the quote currency.
+
+        The product is exact, only the result is rounded to the minor unit of the quote
+        currency with settings.FX_ROUNDING.
+        """
+        if base_id == quote_id:
+            return amount
+        return round_amount(Decimal(amount) * self.get_rate(base_id, quote_id), self.get_exponent(quote_id))
+
+    def convert_totals(self, totals, quote_id):
+        """
+        Convert amounts grouped by currency into the quote currency.
+
+        Reports convert one total per currency instead of one amount per transaction, the
+        sum of the exact products is rounded once.
+
+        Args:
+            totals (dict): Currency id -> amount in that currency.
+            quote_id (int): The currency to convert to.
+
+        Returns:
+            tuple: The converted amount per currency id and the converted grand total.
+        """
+        exponent = self.get_exponent(quote_id)
+        converted = {}
+        total = Decimal(0)
+        for base_id, amount in totals.items():
+            exact = Decimal(amount) * self.get_rate(base_id, quote_id)
+            converted[base_id] = round_amount(exact, exponent)
+            total += exact
+        return converted, round_amount(total, exponent)
+
+
+# The rate table of this process, replaced as a whole (a single reference assignment) and never mutated
+_rate_table = None
+_checked_at = 0
+
+
+def get_rate_table():
+    """
+    Return the rate table of the latest snapshot.
+
+    The table is loaded once per process. Every FX_RATE_TABLE_TTL seconds the id of the
+    latest snapshot is checked and a newer snapshot replaces the table, so snapshots
+    published by other processes are picked up too.
+
+    Raises:
+        FxError: If no rates were ever published.
+    """
+    global _rate_table, _checked_at
+
+    now = time.monotonic()
+    if _rate_table is None or now - _checked_at >= settings.FX_RATE_TABLE_TTL:
+        latest = FxRateSnapshot.objects.order_by('-id').values_list('id', flat=True).first()
+        if latest is None:
+            raise FxError('No exchange rates published')
+        if _rate_table is None or _rate_table.snapshot_id != latest:
+            _rate_table = RateTable.load(latest)
+        _checked_at = now
+
+    return _rate_table
+
+
+def publish_rates(rates):
+    """
+    Store a new rate snapshot and make it the rate table of this process once committed.
+
+    Args:
+        rates (list of tuple): (base currency id, quote currency id, rate) rows.
+
+    Returns:
+        FxRateSnapshot: The new snapshot.
+    """
+    # Keep the same precision as FxRate.rate so this process converts like the ones loading the snapshot
+    rates = [(base_id, quote_id, Decimal(str(rate)).quantize(RATE_PRECISION)) for base_id, quote_id, rate in rates]
+
+    with transaction.atomic():
+        snapshot = FxRateSnapshot.objects.create()
+        FxRate.objects.bulk_create([
+            FxRate(snapshot=snapshot, base_id=base_id, quote_id=quote_id, rate=rate)
+            for base_id, quote_id, rate in rates
+        ])
+
+    table = RateTable(snapshot.id, {(base_id, quote_id): rate for base_id, quote_id, rate in rates}, load_exponents())
+
+    def swap():
+        global _rate_table
+        _rate_table = table
+    transaction.on_commit(swap)
+
+    return snapshot
@@ -0,0 +1,192 @@
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import GreaterThanOrEqual
+from django.utils import timezone
+
+from .dashboard import add_balance_changes
+from .feed import post_transactions
+from .models import BalanceDelta, BankAccount, Card, Hold, Transaction, TransactionType
+from .money import money_value
+from .utils import generate_transaction_id
+
+
+class HoldError(Exception):
+    """Raised when a hold cannot be captured or released. The message is safe to return to the client."""
+
+
+def get_hold_expiry(now=None):
+    return (now or timezone.now()) + timedelta(seconds=settings.CARD_HOLD_TTL)
+
+
+def place_hold(authorization_code, card, amount):
+    """
+    Reserve `amount` on the bank account of `card` and record the hold.
+
+    The reservation is a single conditional UPDATE, so two authorizations can never
+    reserve the same funds. The funds are the available balance of the account, including
+    the credits of a hot account that are not folded into its balance yet, like
+    BankAccount.get_available_balance. It also requires the card to be active in the
+    database: the card index of this process may not know yet that another process retired the card.
+
+    Args:
+        authorization_code (str): The authorization code the hold is known by.
+        card (CardEntry): The authorized card.
+        amount (Decimal): The amount to hold.
+
+    Returns:
+        Hold: The active hold, or None if the account does not have the funds or the card
+        is no longer active.
+    """
+    pending_delta = Subquery(
+        BalanceDelta.objects.filter(bank_account_id=OuterRef('pk'))
+                            .values('bank_account_id')
+                            .annotate(total=Sum('amount'))
+                            .values('total')
+    )
+    with transaction.atomic():
+        reserved = BankAccount.objects.filter(
+            Exists(Card.objects.filter(pk=card.card_id, bank_account_id=OuterRef('pk'), is_active=True)),
+            GreaterThanOrEqual(
+                F('balance') + Coalesce(pending_delta, money_value(0)),
+                F('reserved') + money_value(amount)
+            ),
+            pk=card.bank_account_id
+        ).update(reserved=F('reserved') + money_value(amount))
+
+        if not reserved:
+            return None
+
+        return Hold.objects.create(
+            authorization_code=authorization_code,
+            bank_account_id=card.bank_account_id,
+            card_id=card.card_id,
+            amount=amount,
+            expires_at=get_hold_expiry()
+        )
+
+
+def lock_active_hold(authorization_code):
+    hold = Hold.objects.select_for_update().filter(authorization_code=authorization_code).first()
+    if hold is None:
+        raise HoldError('Invalid authorization code')
+    if hold.status != Hold.ACTIVE:
+        raise HoldError(f'Hold is already {hold.status}')
+    return hold
+
+
+def capture_hold(authorization_code, amount=None):
+    """
+    Capture an active hold: release the reserved funds and post the debit.
+
+    Args:
+        authorization_code (str): The authorization code of the hold.
+        amount (Decimal | str, optional): The amount to capture, defaults to the held amount.
+            It can be lower than the held amount, the difference goes back to the account.
+
+    Returns:
+        tuple: The captured Hold and the debit Transaction.
+
+    Raises:
+        HoldError: If the hold is unknown, not active or the amount is invalid.
+    """
+    with transaction.atomic():
+        hold = lock_active_hold(authorization_code)
+
+        if amount is None:
+            amount = hold.amount
+        else:
+            try:
+                amount = Decimal(str(amount)).quantize(Decimal('0.01'))
+            except (InvalidOperation, ValueError):
+                raise HoldError('amount must be a number')
+            if amount <= 0 or amount > hold.amount:
+                raise HoldError('amount must be greater than 0 and at most the held amount')
+
+        bank_account = BankAccount.objects.select_for_update().get(pk=hold.bank_account_id)
+        bank_account.balance -= amount
+        bank_account.reserved -= hold.amount
+        bank_account.save(update_fields=['balance', 'reserved'])
+
+        now = timezone.now()
+        debit, = post_transactions([Transaction(
+            transaction_id=generate_transaction_id(),
+            bank_account=bank_account,
+            amount=-amount,
+            currency_id=bank_account.currency_id,
+            type=TransactionType.DEBIT,
+            date=timezone.localdate(now),
+            balance_after=None if bank_account.is_hot else bank_account.balance
+        )])
+
+        add_balance_changes([(bank_account.currency_id, -amount)])
+
+        hold.status = Hold.CAPTURED
+        hold.captured_amount = amount
+        hold.settled_at = now
+        hold.save(update_fields=['status', 'captured_amount', 'settled_at'])
+
+    return hold, debit
+
+
+def release_hold(authorization_code):
+    """
+    Release an active hold, the reserved funds become available again.
+
+    Raises:
+        HoldError: If the hold is unknown or not active.
+    """
+    with transaction.atomic():
+        hold = lock_active_hold(authorization_code)
+
+        BankAccount.objects.filter(pk=hold.bank_account_id).update(reserved=F('reserved') - money_value(hold.amount))
+
+        hold.status = Hold.RELEASED
+        hold.settled_at = timezone.now()
+        hold.save(update_fields=['status', 'settled_at'])
+
+    return hold
+
+
+def expire_holds(now=None, batch_size=500):
+    """
+    Expire up to `batch_size` active holds that are due.
+
+    The due holds are read from the partial expiry index in expiry order, so the cost
+    depends on the number of due holds, not on the size of the holds table.
+
+    Returns:
+        int: The number of holds expired.
+    """
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        due = list(
+            Hold.objects.select_for_update(skip_locked=True)
+                        .filter(status=Hold.ACTIVE, expires_at__lte=now)
+                        .order_by('expires_at')
+                        .values_list('id', 'bank_account_id', 'amount')[:batch_size]
+        )
+        if not due:
+            return 0
+
+        released = {}
+        for _, bank_account_id, amount in due:
+            released[bank_account_id] = released.get(bank_account_id, 0) + amount
+
+        for bank_account_id, amount in released.items():
+            BankAccount.objects.filter(pk=bank_account_id).update(reserved=F('reserved') - money_value(amount))
+
+        Hold.objects.filter(pk__in=[hold_id for hold_id, _, _ in due]).update(status=Hold.EXPIRED, settled_at=now)
+
+    return len(due)
+
+
+def get_next_expiry():
+    # Head of the expiry queue, used by the sweeper to sleep until the next hold is due
+    return Hold.objects.filter(status=Hold.ACTIVE).order_by('expires_at') \
+                       .values_list('expires_at', flat=True).first()
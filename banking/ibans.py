@@ -0,0 +1,92 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef
+
+from .models import BankAccount, Card
+
+# What a transfer needs to know about the account of an IBAN
+IbanEntry = namedtuple('IbanEntry', ['bank_account_id', 'currency_id', 'has_card'])
+
+
+def normalize_iban(iban):
+    # IBANs are printed in groups of 4 characters and typed in any case
+    return ''.join(str(iban).split()).upper()
+
+
+class IbanCache:
+    """
+    Process-local LRU cache of IBAN to IbanEntry, bounded to `max_entries` IBANs.
+
+    A miss is one read of the unique IBAN index. The entries are dropped by the BankAccount
+    and Card signals in banking.signals, changes made by other processes are only seen once
+    the entry is evicted. The transfers check the cards again under the account lock, so a
+    stale has_card is never trusted for the money.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Bank account id -> IBAN, the cards only know their account
+        self._ibans = {}
+        self._lock = threading.Lock()
+
+    def load(self, iban):
+        row = BankAccount.objects.filter(IBAN=iban) \
+                                 .annotate(has_card=Exists(Card.objects.filter(bank_account_id=OuterRef('pk'), is_active=True))) \
+                                 .values_list('id', 'currency_id', 'has_card') \
+                                 .first()
+        return IbanEntry(*row) if row else None
+
+    def get(self, iban):
+        """
+        Returns:
+            IbanEntry: The account of the IBAN, or None if no account has it.
+        """
+        iban = normalize_iban(iban)
+        with self._lock:
+            entry = self._entries.get(iban)
+            if entry is not None:
+                self._entries.move_to_end(iban)
+                return entry
+
+        # Unknown IBANs are not cached, they would push out the real ones
+        entry = self.load(iban)
+        if entry is None:
+            return None
+
+        with self._lock:
+            self._entries[iban] = entry
+            self._ibans[entry.bank_account_id] = iban
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._ibans.pop(evicted.bank_account_id, None)
+        return entry
+
+    def account_saved(self, bank_account):
+        # Balances are saved by every transfer, only an IBAN or currency change drops the entry
+        with self._lock:
+            iban = self._ibans.get(bank_account.id)
+            if iban is None:
+                return
+            if iban != bank_account.IBAN or self._entries[iban].currency_id != bank_account.currency_id:
+                del self._ibans[bank_account.id]
+                del self._entries[iban]
+
+    def invalidate_account(self, bank_account_id):
+        with self._lock:
+            iban = self._ibans.pop(bank_account_id, None)
+            if iban is not None:
+                self._entries.pop(iban, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._ibans.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+iban_cache = IbanCache(settings.IBAN_CACHE_SIZE)
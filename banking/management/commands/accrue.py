@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.accrual import run_accrual
+from banking.models import AccrualRun
+
+
+class Command(BaseCommand):
+    help = 'Post the daily interest or the monthly fee of every bank account'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=[kind for kind, _ in AccrualRun.KIND_CHOICES])
+        parser.add_argument('--date', help='Accrual date (YYYY-MM-DD), default is today')
+        parser.add_argument('--workers', type=int, help='Worker processes, default is the number of CPUs (1 on SQLite)')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Accounts accrued per database transaction')
+
+    def handle(self, *args, **options):
+        try:
+            accrual_date = date.fromisoformat(options['date']) if options['date'] else date.today()
+        except ValueError:
+            raise CommandError('--date must be in the format YYYY-MM-DD')
+
+        accrual_run = run_accrual(
+            options['kind'], accrual_date,
+            workers=options['workers'], chunk_size=options['chunk_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{accrual_run.kind} {accrual_run.accrual_date}: {accrual_run.accounts} accounts, total {accrual_run.total}'
+        ))
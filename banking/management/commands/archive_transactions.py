@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.archive import archive_transactions
+
+
+class Command(BaseCommand):
+    help = 'Move old transactions from the Transaction table to the archive table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='Archive transactions dated before this date (YYYY-MM-DD)')
+        parser.add_argument('--days', type=int, default=365, help='Archive transactions older than this many days')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Transactions moved per database transaction')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                before = date.fromisoformat(options['before'])
+            except ValueError:
+                raise CommandError('--before must be a date in the format YYYY-MM-DD')
+        else:
+            before = date.today() - timedelta(days=options['days'])
+
+        total = 0
+        for moved in archive_transactions(before, chunk_size=options['chunk_size']):
+            total += moved
+            self.stdout.write(f'Archived {total} transactions')
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {total} transactions dated before {before}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from banking.models import BankAccount, Transaction
+from banking.transfers import fill_running_balances
+
+
+class Command(BaseCommand):
+    help = 'Compute the running balance of transactions that do not have one yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Transactions updated per database transaction')
+
+    def handle(self, *args, **options):
+        # Rows are filled oldest first in committed chunks, running the command again resumes the backfill
+        account_ids = Transaction.objects.filter(balance_after__isnull=True) \
+                                         .order_by('bank_account_id') \
+                                         .values_list('bank_account_id', flat=True) \
+                                         .distinct()
+
+        total = 0
+        for bank_account in BankAccount.objects.filter(pk__in=list(account_ids)).order_by('id'):
+            filled = fill_running_balances(bank_account, chunk_size=options['chunk_size'])
+            total += filled
+            self.stdout.write(f'Bank account {bank_account.id}: {filled} transactions')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {total} transactions'))
@@ -0,0 +1,46 @@
+import random
+import time
+import tracemalloc
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from banking.cards import CardEntry, CardIndex, check_card
+from banking.utils import generate_credit_card_visa
+
+
+class Command(BaseCommand):
+    help = 'Measure the latency of the in-memory card checks of an authorization for growing card counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, nargs='+', default=[10000, 1000000])
+        parser.add_argument('--authorizations', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        expiry_date = date(date.today().year + 3, 6, 30)
+        expiry = expiry_date.strftime('%m/%y')
+
+        for count in options['cards']:
+            tracemalloc.start()
+            index = CardIndex()
+            # A synthetic index, the benchmark does not need the cards in the database
+            index._cards = {
+                generate_credit_card_visa(): CardEntry(card_id, card_id, '123', expiry_date)
+                for card_id in range(count)
+            }
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            card_numbers = random.choices(list(index._cards), k=options['authorizations'])
+            latencies = []
+            for card_number in card_numbers:
+                start = time.perf_counter_ns()
+                check_card(card_number, '123', expiry, index=index)
+                latencies.append(time.perf_counter_ns() - start)
+
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] / 1000
+            p99 = latencies[int(len(latencies) * 0.99)] / 1000
+            self.stdout.write(
+                f'{len(index):>9} cards: p50 {p50:.1f} us, p99 {p99:.1f} us, index {memory / 2 ** 20:.0f} MiB'
+            )
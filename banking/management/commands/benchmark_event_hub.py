@@ -0,0 +1,69 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from banking.events import EventHub, PollingBackend
+from banking.models import ApplicationEvent
+
+
+class Command(BaseCommand):
+    help = 'Hold idle event stream subscriptions on one process and measure their memory, idle CPU and fan-out latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscriptions', type=int, default=10000)
+        parser.add_argument('--users', type=int, default=1000, help='Topics the subscriptions are spread over')
+        parser.add_argument('--idle', type=float, default=10, help='Seconds the subscriptions stay idle')
+
+    def handle(self, *args, **options):
+        asyncio.run(self.run(options['subscriptions'], options['users'], options['idle']))
+
+    async def run(self, count, users, idle):
+        # A hub of its own polling the real outbox, the synthetic topics get no events from it
+        hub = EventHub(PollingBackend(ApplicationEvent, 'user_id'))
+        received = {'count': 0, 'expected': 0}
+        done = asyncio.Event()
+
+        async def consume(stream):
+            async for chunk in stream:
+                if not chunk.startswith(':'):
+                    received['count'] += 1
+                    if received['count'] == received['expected']:
+                        done.set()
+
+        tracemalloc.start()
+        tasks = []
+        for number in range(count):
+            subscription, position = await hub.subscribe([number % users])
+            tasks.append(asyncio.create_task(consume(hub.stream(subscription, position))))
+        await asyncio.sleep(0.5)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(f'{len(hub)} subscriptions: {memory / count / 1024:.1f} KiB each, {memory / 2 ** 20:.0f} MiB in all')
+
+        start = time.process_time()
+        await asyncio.sleep(idle)
+        cpu = time.process_time() - start
+        self.stdout.write(f'idle {idle:.0f} s: {cpu * 1000:.0f} ms of CPU ({cpu / idle * 100:.1f}% of a core)')
+
+        event_id = hub.last_id
+        for topics, label in (([0], 'one user'), (list(range(users)), 'every user')):
+            received['count'] = 0
+            received['expected'] = sum(1 for number in range(count) if number % users in topics)
+            done.clear()
+            start = time.perf_counter()
+            events = []
+            for topic in topics:
+                event_id += 1
+                events.append((event_id, topic, {'application': 'card_application', 'id': event_id, 'status': 'approved'}))
+            hub.dispatch(events)
+            await done.wait()
+            self.stdout.write(
+                f'fan-out to {label}: {received["expected"]} events delivered in {(time.perf_counter() - start) * 1000:.1f} ms'
+            )
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.stdout.write(f'{len(hub)} subscriptions left after the clients disconnected')
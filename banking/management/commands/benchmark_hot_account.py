@@ -0,0 +1,67 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from banking.models import BankAccount, Currency, Role, User
+from banking.money import money_value
+from banking.transfers import credit_hot_account, fold_balance_deltas
+
+
+class Command(BaseCommand):
+    help = 'Measure credit throughput to a single account with and without delta stripes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stripes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--credits', type=int, default=2000, help='Credits sent per run')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        credits = options['credits']
+
+        user = User.objects.create(
+            username='hot-account-benchmark',
+            password='hot-account-benchmark',
+            role=Role.objects.get(client_permission=True)
+        )
+        bank_account = BankAccount.objects.create(
+            bank_account_id=0,
+            IBAN='HOT-ACCOUNT-BENCHMARK',
+            currency=Currency.objects.first(),
+            balance=0,
+            user=user
+        )
+
+        try:
+            def credit_row(_):
+                with transaction.atomic():
+                    BankAccount.objects.filter(pk=bank_account.pk).update(balance=F('balance') + money_value(1))
+
+            elapsed = self.run(credit_row, threads, credits)
+            self.stdout.write(f'row updates: {credits / elapsed:10.0f} credits/s')
+
+            BankAccount.objects.filter(pk=bank_account.pk).update(is_hot=True)
+            bank_account.refresh_from_db()
+
+            for stripes in options['stripes']:
+                def credit_stripe(_):
+                    credit_hot_account(bank_account.id, 1, stripes=stripes)
+
+                elapsed = self.run(credit_stripe, threads, credits)
+                fold_balance_deltas(bank_account)
+                self.stdout.write(f'{stripes:3d} stripes:  {credits / elapsed:10.0f} credits/s')
+
+            bank_account.refresh_from_db()
+            expected = credits * (len(options['stripes']) + 1)
+            self.stdout.write(f'final balance {bank_account.get_balance()} (expected {expected})')
+        finally:
+            user.delete()
+
+    def run(self, credit, threads, credits):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(credit, range(credits)))
+        return time.perf_counter() - start
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from banking.models import Transaction
+
+
+class Command(BaseCommand):
+    help = 'Time the SUM aggregates and the reads of the transaction amounts, and check the totals against Python sums'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measure, the best one is reported')
+
+    def measure(self, label, repeat, run):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(f'{label}: {best * 1000:.1f} ms')
+        return result
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        transactions = Transaction.objects.order_by()
+        self.stdout.write(f'{transactions.count()} transactions')
+
+        total = self.measure(
+            'SUM of every amount', repeat,
+            lambda: transactions.aggregate(total=Sum('amount'))['total']
+        )
+        per_account = self.measure(
+            'SUM per bank account', repeat,
+            lambda: dict(transactions.values_list('bank_account_id').annotate(total=Sum('amount')))
+        )
+        amounts = self.measure(
+            'read every amount', repeat,
+            lambda: list(transactions.values_list('bank_account_id', 'amount'))
+        )
+
+        exact_total = sum(amount for _, amount in amounts)
+        exact_per_account = {}
+        for bank_account_id, amount in amounts:
+            exact_per_account[bank_account_id] = exact_per_account.get(bank_account_id, 0) + amount
+        mismatches = sum(1 for bank_account_id, amount in exact_per_account.items() if per_account[bank_account_id] != amount)
+
+        self.stdout.write(f'SUM {total!r}, Python sum {exact_total!r}: {"equal" if total == exact_total else "different"}')
+        self.stdout.write(f'{mismatches} of {len(exact_per_account)} per account SUMs differ from the Python sums')
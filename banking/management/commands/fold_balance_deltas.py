@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from banking.models import BankAccount
+from banking.transfers import fold_balance_deltas
+
+
+class Command(BaseCommand):
+    help = 'Merge the pending credit stripes of hot bank accounts into their balance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Seconds between folds, run once when 0')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            folded = 0
+            for bank_account in BankAccount.objects.filter(is_hot=True).only('id'):
+                if fold_balance_deltas(bank_account):
+                    folded += 1
+
+            self.stdout.write(f'Folded pending credits of {folded} hot accounts')
+
+            if not interval:
+                return
+            time.sleep(interval)
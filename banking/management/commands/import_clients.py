@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.models import ClientImport, User
+from banking.onboarding import import_clients
+
+
+class Command(BaseCommand):
+    help = 'Create clients in bulk from a CSV file with username and password columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help='CSV file to import')
+        parser.add_argument('--banker', help='Username of the banker running the import')
+        parser.add_argument('--job', type=int, help='Run or resume an existing import instead of a new file')
+        parser.add_argument('--pending', action='store_true', help='Run every import uploaded through the API')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows handled per database transaction')
+        parser.add_argument('--workers', type=int, help='Password hashing processes, default is the number of CPUs')
+
+    def handle(self, *args, **options):
+        if options['job']:
+            client_imports = ClientImport.objects.filter(pk=options['job'])
+            if not client_imports:
+                raise CommandError(f'Import {options["job"]} does not exist')
+        elif options['pending']:
+            client_imports = ClientImport.objects.filter(status=ClientImport.PENDING).order_by('id')
+        elif options['file']:
+            banker = User.objects.filter(username=options['banker'], role__banker_permission=True).first()
+            if banker is None:
+                raise CommandError('--banker must be the username of a banker')
+            client_imports = [ClientImport.objects.create(user=banker, file=options['file'])]
+        else:
+            raise CommandError('Give a CSV file, --job or --pending')
+
+        for client_import in client_imports:
+            import_clients(client_import, batch_size=options['batch_size'], workers=options['workers'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Import {client_import.id}: {client_import.imported} clients created, '
+                f'{client_import.errors.count()} rows rejected'
+            ))
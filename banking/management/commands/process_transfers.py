@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from banking.transfers import process_transfer_batch, run_batch_workers
+
+
+class Command(BaseCommand):
+    help = 'Apply queued transfers in batches, one database transaction per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=500, help='Transfers applied per database transaction')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is drained')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        processed = run_batch_workers(
+            process_transfer_batch, workers, options['batch_size'], options['poll_interval'], options['once']
+        )
+
+        if workers == 1:
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} transfers'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{workers} workers finished'))
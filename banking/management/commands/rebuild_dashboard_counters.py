@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from banking.dashboard import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the counters of the banker dashboard from the applications, accounts and cards'
+
+    def handle(self, *args, **options):
+        counters = rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f'{counters} counters rebuilt'))
@@ -0,0 +1,50 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.models import ReconciliationRun
+from banking.reconciliation import run_reconciliation
+
+
+class Command(BaseCommand):
+    help = 'Compare the balance of every bank account with the sum of its transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--run', type=int, help='Resume this run instead of the last unfinished one')
+        parser.add_argument('--new', action='store_true', help='Start a new run even if one is unfinished')
+        parser.add_argument('--workers', type=int, help='Worker processes, default is the number of CPUs')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Account ids reconciled per chunk')
+        parser.add_argument('--report', help='Write the discrepancies to this CSV file')
+
+    def handle(self, *args, **options):
+        if options['run']:
+            reconciliation_run = ReconciliationRun.objects.filter(pk=options['run']).first()
+            if reconciliation_run is None:
+                raise CommandError(f'Run {options["run"]} does not exist')
+        else:
+            reconciliation_run = None
+            if not options['new']:
+                reconciliation_run = ReconciliationRun.objects.exclude(status=ReconciliationRun.COMPLETED) \
+                                                              .order_by('-id').first()
+            if reconciliation_run is None:
+                reconciliation_run = ReconciliationRun.objects.create(chunk_size=options['chunk_size'])
+
+        if reconciliation_run.status != ReconciliationRun.COMPLETED:
+            if reconciliation_run.next_account_id:
+                self.stdout.write(f'Resuming run {reconciliation_run.id} at account {reconciliation_run.next_account_id}')
+            run_reconciliation(reconciliation_run, workers=options['workers'])
+
+        if options['report']:
+            with open(options['report'], 'w', newline='') as report:
+                writer = csv.writer(report)
+                writer.writerow(['bank_account', 'balance', 'ledger_balance', 'difference'])
+                rows = reconciliation_run.discrepancy_rows.order_by('bank_account_id') \
+                                         .values_list('bank_account_id', 'balance', 'ledger_balance')
+                for bank_account_id, balance, ledger_balance in rows.iterator():
+                    writer.writerow([bank_account_id, balance, ledger_balance, balance - ledger_balance])
+
+        style = self.style.SUCCESS if not reconciliation_run.discrepancies else self.style.WARNING
+        self.stdout.write(style(
+            f'Run {reconciliation_run.id}: {reconciliation_run.accounts} accounts, '
+            f'{reconciliation_run.discrepancies} discrepancies'
+        ))
@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from banking.cards import renew_expiring_cards
+
+
+class Command(BaseCommand):
+    help = 'Replace the active cards expiring within the renewal window with new cards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Renew the cards expiring within this many days, expired cards included')
+        parser.add_argument('--years', type=int, default=5, help='Years the replacements are valid for')
+        parser.add_argument('--date', help='Day the window starts (YYYY-MM-DD), default is today')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Cards renewed per database transaction')
+
+    def handle(self, *args, **options):
+        try:
+            today = date.fromisoformat(options['date']) if options['date'] else date.today()
+        except ValueError:
+            raise CommandError('--date must be in the format YYYY-MM-DD')
+
+        until = today + timedelta(days=options['days'])
+        expiry_date = today + timedelta(days=options['years'] * 365)
+        try:
+            renewed = renew_expiring_cards(until, expiry_date, batch_size=options['batch_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Renewed {renewed} cards expiring by {until}, the new cards expire on {expiry_date}'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from banking.scheduling import run_scheduled_batch
+from banking.transfers import run_batch_workers
+
+
+class Command(BaseCommand):
+    help = 'Execute the scheduled transfers that are due, one database transaction per batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders executed per database transaction')
+        parser.add_argument('--poll-interval', type=float, default=30.0, help='Seconds to wait when no order is due')
+        parser.add_argument('--once', action='store_true', help='Exit once no order is due')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        executed = run_batch_workers(
+            run_scheduled_batch, workers, options['batch_size'], options['poll_interval'], options['once']
+        )
+
+        if workers == 1:
+            self.stdout.write(self.style.SUCCESS(f'Executed {executed} scheduled transfers'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{workers} workers finished'))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from banking.holds import expire_holds, get_next_expiry
+
+
+class Command(BaseCommand):
+    help = 'Expire the card authorization holds that are due and release their funds'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Holds expired per database transaction')
+        parser.add_argument('--max-sleep', type=float, default=60.0,
+                            help='Longest wait before checking the expiry queue again, new holds may expire earlier')
+        parser.add_argument('--once', action='store_true', help='Exit once no hold is due')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_sleep = options['max_sleep']
+
+        expired = 0
+        while True:
+            count = expire_holds(batch_size=batch_size)
+            expired += count
+            if count == batch_size:
+                continue
+
+            if options['once']:
+                break
+
+            # Sleep until the head of the expiry queue is due instead of polling the table
+            next_expiry = get_next_expiry()
+            delay = max_sleep
+            if next_expiry is not None:
+                delay = min(max((next_expiry - timezone.now()).total_seconds(), 0), max_sleep)
+            time.sleep(delay)
+
+        self.stdout.write(self.style.SUCCESS(f'Expired {expired} holds'))
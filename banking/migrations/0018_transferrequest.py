@@ -0,0 +1,33 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0017_alter_transaction_transaction_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransferRequest',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('transfer_id', models.CharField(max_length=30, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('bank_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outgoing_transfer_requests', to='banking.bankaccount')),
+                ('bank_account_receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_transfer_requests', to='banking.bankaccount')),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='banking.currency')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='banking.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='banking_tra_status_1ebcb6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0018_transferrequest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='is_hot',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='BalanceDelta',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('stripe', models.PositiveSmallIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('bank_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_deltas', to='banking.bankaccount')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('bank_account', 'stripe'), name='unique_balance_delta_stripe')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0019_bankaccount_is_hot_balancedelta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='balance_after',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['bank_account', 'date', 'id'], name='banking_tra_bank_ac_b60d51_idx'),
+        ),
+    ]
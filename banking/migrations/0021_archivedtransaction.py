@@ -0,0 +1,30 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0020_transaction_balance_after'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('transaction_id', models.CharField(max_length=30, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date', models.DateField()),
+                ('balance_after', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('bank_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='banking.bankaccount')),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='banking.currency')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='banking.transactiontype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bank_account', 'date', 'id'], name='banking_arc_bank_ac_8fbe1c_idx'), models.Index(fields=['date'], name='banking_arc_date_01fe89_idx')],
+            },
+        ),
+    ]
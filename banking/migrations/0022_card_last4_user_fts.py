@@ -0,0 +1,46 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:22
+
+from django.db import migrations, models
+from django.db.models.functions import Substr
+
+
+def populate_card_last4(apps, schema_editor):
+    Card = apps.get_model('banking', 'Card')
+    Card.objects.update(last4=Substr('card_number', 13, 4))
+
+
+def create_user_fts(apps, schema_editor):
+    # Trigram full text index over usernames for substring search, SQLite only
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE banking_user_fts USING fts5(username, tokenize='trigram')"
+    )
+    schema_editor.execute(
+        'INSERT INTO banking_user_fts(rowid, username) SELECT id, username FROM banking_user'
+    )
+
+
+def drop_user_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+
+    schema_editor.execute('DROP TABLE IF EXISTS banking_user_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0021_archivedtransaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='last4',
+            field=models.CharField(blank=True, db_index=True, max_length=4),
+        ),
+        migrations.RunPython(populate_card_last4, migrations.RunPython.noop),
+        migrations.RunPython(create_user_fts, drop_user_fts),
+    ]
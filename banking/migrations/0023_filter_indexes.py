@@ -0,0 +1,73 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0022_card_last4_user_fts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['amount'], name='banking_arc_amount_3c444a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['bank_account', 'amount'], name='banking_arc_bank_ac_63c099_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankaccount',
+            index=models.Index(fields=['balance'], name='banking_ban_balance_015252_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankaccount',
+            index=models.Index(fields=['user', 'balance'], name='banking_ban_user_id_d8909f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankaccount',
+            index=models.Index(fields=['currency', 'balance'], name='banking_ban_currenc_e17884_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankaccountapplication',
+            index=models.Index(fields=['date'], name='banking_ban_date_56bbff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bankaccountapplication',
+            index=models.Index(fields=['status', 'date'], name='banking_ban_status__57f590_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardapplication',
+            index=models.Index(fields=['date'], name='banking_car_date_ff95cc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardapplication',
+            index=models.Index(fields=['reason'], name='banking_car_reason_2c7d7b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardapplication',
+            index=models.Index(fields=['monthly_salary'], name='banking_car_monthly_edce2c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardapplication',
+            index=models.Index(fields=['status', 'monthly_salary'], name='banking_car_status__9c1eda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cardapplication',
+            index=models.Index(fields=['status', 'date'], name='banking_car_status__35b910_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['date'], name='banking_tra_date_0700ea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['amount'], name='banking_tra_amount_6783bb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['bank_account', 'amount'], name='banking_tra_bank_ac_d0d49a_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0023_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientImport',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('file', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('rows_processed', models.IntegerField(default=0)),
+                ('imported', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='banking.user')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ClientImportError',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('row', models.IntegerField()),
+                ('username', models.CharField(blank=True, max_length=100)),
+                ('error', models.CharField(max_length=100)),
+                ('client_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='errors', to='banking.clientimport')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0024_clientimport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bankaccount',
+            name='reserved',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0025_bankaccount_reserved'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('authorization_code', models.CharField(max_length=30, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('captured_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('status', models.CharField(choices=[('active', 'Active'), ('captured', 'Captured'), ('released', 'Released'), ('expired', 'Expired')], default='active', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('settled_at', models.DateTimeField(blank=True, null=True)),
+                ('bank_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='banking.bankaccount')),
+                ('card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='banking.card')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'active')), fields=['expires_at'], name='hold_active_expiry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0026_hold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FxRateSnapshot',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='archivedtransaction',
+            name='fx_snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='banking.fxratesnapshot'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='fx_snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='banking.fxratesnapshot'),
+        ),
+        migrations.CreateModel(
+            name='FxRate',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20)),
+                ('base', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='banking.currency')),
+                ('quote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='banking.currency')),
+                ('snapshot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='banking.fxratesnapshot')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('snapshot', 'base', 'quote'), name='unique_fx_rate_pair')],
+            },
+        ),
+    ]
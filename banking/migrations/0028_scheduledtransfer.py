@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0027_fx_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledTransfer',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('interval', models.CharField(choices=[('daily', 'Daily'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], max_length=10)),
+                ('start_at', models.DateTimeField()),
+                ('occurrences', models.IntegerField(default=0)),
+                ('next_run_at', models.DateTimeField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('failures', models.IntegerField(default=0)),
+                ('last_error', models.CharField(blank=True, max_length=100, null=True)),
+                ('last_run_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('bank_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='outgoing_scheduled_transfers', to='banking.bankaccount')),
+                ('bank_account_receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incoming_scheduled_transfers', to='banking.bankaccount')),
+                ('currency', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='banking.currency')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='banking.user')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('is_active', True)), fields=['next_run_at'], name='scheduled_transfer_due_idx')],
+            },
+        ),
+    ]
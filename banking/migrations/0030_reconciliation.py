@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-19 11:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0029_accrualrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReconciliationRun',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('chunk_size', models.IntegerField()),
+                ('next_account_id', models.IntegerField(default=0)),
+                ('accounts', models.IntegerField(default=0)),
+                ('discrepancies', models.IntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReconciliationDiscrepancy',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('ledger_balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('bank_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='banking.bankaccount')),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discrepancy_rows', to='banking.reconciliationrun')),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0031_transaction_counterparty_created_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionEvent',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('bank_account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='banking.bankaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bank_account', 'id'], name='banking_tra_bank_ac_2e258b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:11
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0032_transactionevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationEvent',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='banking.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='banking_app_user_id_076842_idx')],
+            },
+        ),
+    ]
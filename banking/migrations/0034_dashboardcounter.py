@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-19 12:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0033_applicationevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('key', models.CharField(max_length=60, unique=True)),
+                ('name', models.CharField(max_length=30)),
+                ('day', models.DateField(blank=True, null=True)),
+                ('stripe', models.PositiveSmallIntegerField(default=0)),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('currency', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='banking.currency')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='banking_das_day_bd29ab_idx')],
+            },
+        ),
+    ]
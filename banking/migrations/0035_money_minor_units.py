@@ -0,0 +1,47 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:02
+
+from django.db import migrations, models
+
+# (model, field) of the amounts moving to integer minor units, in 0035 to 0037
+MONEY_FIELDS = [
+    ('archivedtransaction', 'amount'),
+    ('archivedtransaction', 'balance_after'),
+    ('balancedelta', 'amount'),
+    ('bankaccount', 'balance'),
+    ('bankaccount', 'reserved'),
+    ('cardapplication', 'monthly_salary'),
+    ('transaction', 'amount'),
+    ('transaction', 'balance_after'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0034_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='currency',
+            name='exponent',
+            field=models.PositiveSmallIntegerField(default=2),
+        ),
+    ] + [
+        # Nullable while both columns exist, so that reverting 0037 can add them back before
+        # 0036 copies the amounts back
+        migrations.AlterField(
+            model_name=model_name,
+            name=name,
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        )
+        for model_name, name in MONEY_FIELDS
+    ] + [
+        # Filled from the decimal columns by 0036, they replace them in 0037
+        migrations.AddField(
+            model_name=model_name,
+            name=f'{name}_minor',
+            field=models.BigIntegerField(blank=True, null=True),
+        )
+        for model_name, name in MONEY_FIELDS
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:02
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Cast, Round
+
+MONEY_FIELDS = [
+    ('archivedtransaction', 'amount'),
+    ('archivedtransaction', 'balance_after'),
+    ('balancedelta', 'amount'),
+    ('bankaccount', 'balance'),
+    ('bankaccount', 'reserved'),
+    ('cardapplication', 'monthly_salary'),
+    ('transaction', 'amount'),
+    ('transaction', 'balance_after'),
+]
+
+
+def copy_to_minor_units(apps, schema_editor):
+    # One UPDATE per table. The amounts have 2 decimal places and at most 10 digits, so
+    # rounding amount * 100 is exact even where the decimals are stored as floats
+    for model_name, name in MONEY_FIELDS:
+        model = apps.get_model('banking', model_name)
+        model.objects.update(**{
+            f'{name}_minor': Cast(Round(F(name) * 100), output_field=models.BigIntegerField())
+        })
+
+
+def copy_from_minor_units(apps, schema_editor):
+    for model_name, name in MONEY_FIELDS:
+        model = apps.get_model('banking', model_name)
+        model.objects.update(**{
+            name: Cast(F(f'{name}_minor') / Value(100.0), output_field=models.DecimalField(max_digits=10, decimal_places=2))
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0035_money_minor_units'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_minor_units, copy_from_minor_units),
+    ]
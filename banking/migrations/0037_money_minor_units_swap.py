@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:02
+
+import banking.money
+from django.db import migrations, models
+
+MONEY_FIELDS = [
+    ('archivedtransaction', 'amount', {}),
+    ('archivedtransaction', 'balance_after', {'blank': True, 'null': True}),
+    ('balancedelta', 'amount', {'default': 0}),
+    ('bankaccount', 'balance', {}),
+    ('bankaccount', 'reserved', {'default': 0}),
+    ('cardapplication', 'monthly_salary', {}),
+    ('transaction', 'amount', {}),
+    ('transaction', 'balance_after', {'blank': True, 'null': True}),
+]
+
+# (model, fields, name) of the indexes over the decimal columns, dropped with them and
+# created again over the integer ones
+MONEY_INDEXES = [
+    ('archivedtransaction', ['amount'], 'banking_arc_amount_3c444a_idx'),
+    ('archivedtransaction', ['bank_account', 'amount'], 'banking_arc_bank_ac_63c099_idx'),
+    ('bankaccount', ['balance'], 'banking_ban_balance_015252_idx'),
+    ('bankaccount', ['user', 'balance'], 'banking_ban_user_id_d8909f_idx'),
+    ('bankaccount', ['currency', 'balance'], 'banking_ban_currenc_e17884_idx'),
+    ('cardapplication', ['monthly_salary'], 'banking_car_monthly_edce2c_idx'),
+    ('cardapplication', ['status', 'monthly_salary'], 'banking_car_status__9c1eda_idx'),
+    ('transaction', ['amount'], 'banking_tra_amount_6783bb_idx'),
+    ('transaction', ['bank_account', 'amount'], 'banking_tra_bank_ac_d0d49a_idx'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0036_money_minor_units_data'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(model_name=model_name, name=index_name)
+        for model_name, fields, index_name in MONEY_INDEXES
+    ] + [
+        migrations.RemoveField(model_name=model_name, name=name)
+        for model_name, name, options in MONEY_FIELDS
+    ] + [
+        migrations.RenameField(model_name=model_name, old_name=f'{name}_minor', new_name=name)
+        for model_name, name, options in MONEY_FIELDS
+    ] + [
+        migrations.AlterField(
+            model_name=model_name,
+            name=name,
+            field=banking.money.MoneyField(decimal_places=2, max_digits=10, **options),
+        )
+        for model_name, name, options in MONEY_FIELDS
+    ] + [
+        migrations.AddIndex(model_name=model_name, index=models.Index(fields=fields, name=index_name))
+        for model_name, fields, index_name in MONEY_INDEXES
+    ]
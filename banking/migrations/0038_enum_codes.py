@@ -0,0 +1,40 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# (model, field, lookup model) of the foreign keys to lookup tables becoming codes, in 0038 to 0040
+LOOKUP_FIELDS = [
+    ('archivedtransaction', 'type', 'transactiontype'),
+    ('transaction', 'type', 'transactiontype'),
+    ('card', 'type', 'cardtype'),
+    ('cardapplication', 'type', 'cardtype'),
+    ('bankaccountapplication', 'status', 'applicationstatus'),
+    ('cardapplication', 'status', 'applicationstatus'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0037_money_minor_units_swap'),
+    ]
+
+    operations = [
+        # Nullable while both columns exist, so that reverting 0040 can add them back before
+        # 0039 fills them again
+        migrations.AlterField(
+            model_name=model_name,
+            name=name,
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=f'banking.{lookup}'),
+        )
+        for model_name, name, lookup in LOOKUP_FIELDS
+    ] + [
+        # Filled from the foreign keys by 0039, they replace them in 0040
+        migrations.AddField(
+            model_name=model_name,
+            name=f'{name}_code',
+            field=models.PositiveSmallIntegerField(blank=True, null=True),
+        )
+        for model_name, name, lookup in LOOKUP_FIELDS
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:40
+
+from django.db import migrations
+
+LOOKUP_FIELDS = [
+    ('archivedtransaction', 'type', 'transactiontype'),
+    ('transaction', 'type', 'transactiontype'),
+    ('card', 'type', 'cardtype'),
+    ('cardapplication', 'type', 'cardtype'),
+    ('bankaccountapplication', 'status', 'applicationstatus'),
+    ('cardapplication', 'status', 'applicationstatus'),
+]
+
+# Lookup model -> (label field, label -> code), the choices of banking.models when written
+CODES = {
+    'transactiontype': ('type', {'debit': 1, 'credit': 2, 'interest': 3, 'fee': 4}),
+    'cardtype': ('type', {'debit card': 1}),
+    'applicationstatus': ('status', {'pending': 1, 'approved': 2, 'rejected': 3}),
+}
+
+
+def copy_to_codes(apps, schema_editor):
+    # One UPDATE per lookup row and referencing column, the lookup tables have a few rows
+    for lookup, (label_field, codes) in CODES.items():
+        for lookup_id, label in apps.get_model('banking', lookup).objects.values_list('id', label_field):
+            if label not in codes:
+                raise RuntimeError(f'{lookup} "{label}" has no code, add it to the choices and to this migration')
+
+            for model_name, name, field_lookup in LOOKUP_FIELDS:
+                if field_lookup == lookup:
+                    apps.get_model('banking', model_name).objects.filter(**{f'{name}_id': lookup_id}) \
+                                                                .update(**{f'{name}_code': codes[label]})
+
+
+def copy_from_codes(apps, schema_editor):
+    for lookup, (label_field, codes) in CODES.items():
+        for label, code in codes.items():
+            row, _ = apps.get_model('banking', lookup).objects.get_or_create(**{label_field: label})
+
+            for model_name, name, field_lookup in LOOKUP_FIELDS:
+                if field_lookup == lookup:
+                    apps.get_model('banking', model_name).objects.filter(**{f'{name}_code': code}) \
+                                                                .update(**{f'{name}_id': row.id})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0038_enum_codes'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_codes, copy_from_codes),
+    ]
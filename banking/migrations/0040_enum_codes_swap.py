@@ -0,0 +1,55 @@
+# Generated by Django 5.1.2 on 2026-10-19 13:40
+
+from django.db import migrations, models
+
+TRANSACTION_TYPES = [(1, 'debit'), (2, 'credit'), (3, 'interest'), (4, 'fee')]
+CARD_TYPES = [(1, 'debit card')]
+APPLICATION_STATUSES = [(1, 'pending'), (2, 'approved'), (3, 'rejected')]
+
+LOOKUP_FIELDS = [
+    ('archivedtransaction', 'type', TRANSACTION_TYPES),
+    ('transaction', 'type', TRANSACTION_TYPES),
+    ('card', 'type', CARD_TYPES),
+    ('cardapplication', 'type', CARD_TYPES),
+    ('bankaccountapplication', 'status', APPLICATION_STATUSES),
+    ('cardapplication', 'status', APPLICATION_STATUSES),
+]
+
+# (model, fields, name over the foreign key, name over the code) of the indexes on the columns
+STATUS_INDEXES = [
+    ('bankaccountapplication', ['status', 'date'], 'banking_ban_status__57f590_idx', 'banking_ban_status_0978e2_idx'),
+    ('cardapplication', ['status', 'monthly_salary'], 'banking_car_status__9c1eda_idx', 'banking_car_status_beb32a_idx'),
+    ('cardapplication', ['status', 'date'], 'banking_car_status__35b910_idx', 'banking_car_status_07bdd2_idx'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0039_enum_codes_data'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(model_name=model_name, name=old_name)
+        for model_name, fields, old_name, new_name in STATUS_INDEXES
+    ] + [
+        migrations.RemoveField(model_name=model_name, name=name)
+        for model_name, name, choices in LOOKUP_FIELDS
+    ] + [
+        migrations.RenameField(model_name=model_name, old_name=f'{name}_code', new_name=name)
+        for model_name, name, choices in LOOKUP_FIELDS
+    ] + [
+        migrations.AlterField(
+            model_name=model_name,
+            name=name,
+            field=models.PositiveSmallIntegerField(choices=choices, db_index=True),
+        )
+        for model_name, name, choices in LOOKUP_FIELDS
+    ] + [
+        migrations.AddIndex(model_name=model_name, index=models.Index(fields=fields, name=new_name))
+        for model_name, fields, old_name, new_name in STATUS_INDEXES
+    ] + [
+        migrations.DeleteModel(name='ApplicationStatus'),
+        migrations.DeleteModel(name='CardType'),
+        migrations.DeleteModel(name='TransactionType'),
+    ]
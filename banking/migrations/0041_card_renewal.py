@@ -0,0 +1,28 @@
+# Generated by Django 5.1.2 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0040_enum_codes_swap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='card',
+            name='replaces',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='replacements', to='banking.card'),
+        ),
+        migrations.AddIndex(
+            model_name='card',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['expiry_date'], name='card_active_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:40
+
+from django.db import migrations, models
+
+# (model, field, max digits) of the remaining amounts moving to integer minor units, in 0042
+# to 0044 like the amounts of 0035 to 0037
+MONEY_FIELDS = [
+    ('accrualrun', 'total', 14),
+    ('dashboardcounter', 'value', 20),
+    ('hold', 'amount', 10),
+    ('hold', 'captured_amount', 10),
+    ('reconciliationdiscrepancy', 'balance', 14),
+    ('reconciliationdiscrepancy', 'ledger_balance', 14),
+    ('scheduledtransfer', 'amount', 10),
+    ('transferrequest', 'amount', 10),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0041_card_renewal'),
+    ]
+
+    operations = [
+        # Every money column stores hundredths, the exponent of a currency was never used
+        migrations.RemoveField(
+            model_name='currency',
+            name='exponent',
+        ),
+    ] + [
+        # Nullable while both columns exist, so that reverting 0044 can add them back before
+        # 0043 copies the amounts back
+        migrations.AlterField(
+            model_name=model_name,
+            name=name,
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=max_digits, null=True),
+        )
+        for model_name, name, max_digits in MONEY_FIELDS
+    ] + [
+        # Filled from the decimal columns by 0043, they replace them in 0044
+        migrations.AddField(
+            model_name=model_name,
+            name=f'{name}_minor',
+            field=models.BigIntegerField(blank=True, null=True),
+        )
+        for model_name, name, max_digits in MONEY_FIELDS
+    ]
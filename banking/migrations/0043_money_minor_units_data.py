@@ -0,0 +1,44 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:40
+
+from django.db import migrations, models
+from django.db.models import F, Value
+from django.db.models.functions import Cast, Round
+
+MONEY_FIELDS = [
+    ('accrualrun', 'total', 14),
+    ('dashboardcounter', 'value', 20),
+    ('hold', 'amount', 10),
+    ('hold', 'captured_amount', 10),
+    ('reconciliationdiscrepancy', 'balance', 14),
+    ('reconciliationdiscrepancy', 'ledger_balance', 14),
+    ('scheduledtransfer', 'amount', 10),
+    ('transferrequest', 'amount', 10),
+]
+
+
+def copy_to_minor_units(apps, schema_editor):
+    # One UPDATE per table, the amounts have 2 decimal places like in 0036
+    for model_name, name, max_digits in MONEY_FIELDS:
+        model = apps.get_model('banking', model_name)
+        model.objects.update(**{
+            f'{name}_minor': Cast(Round(F(name) * 100), output_field=models.BigIntegerField())
+        })
+
+
+def copy_from_minor_units(apps, schema_editor):
+    for model_name, name, max_digits in MONEY_FIELDS:
+        model = apps.get_model('banking', model_name)
+        model.objects.update(**{
+            name: Cast(F(f'{name}_minor') / Value(100.0), output_field=models.DecimalField(max_digits=max_digits, decimal_places=2))
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0042_money_minor_units'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_to_minor_units, copy_from_minor_units),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-19 16:40
+
+import banking.money
+from django.db import migrations
+
+MONEY_FIELDS = [
+    ('accrualrun', 'total', {'max_digits': 14, 'default': 0}),
+    ('dashboardcounter', 'value', {'max_digits': 20, 'default': 0}),
+    ('hold', 'amount', {'max_digits': 10}),
+    ('hold', 'captured_amount', {'max_digits': 10, 'blank': True, 'null': True}),
+    ('reconciliationdiscrepancy', 'balance', {'max_digits': 14}),
+    ('reconciliationdiscrepancy', 'ledger_balance', {'max_digits': 14}),
+    ('scheduledtransfer', 'amount', {'max_digits': 10}),
+    ('transferrequest', 'amount', {'max_digits': 10}),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0043_money_minor_units_data'),
+    ]
+
+    operations = [
+        migrations.RemoveField(model_name=model_name, name=name)
+        for model_name, name, options in MONEY_FIELDS
+    ] + [
+        migrations.RenameField(model_name=model_name, old_name=f'{name}_minor', new_name=name)
+        for model_name, name, options in MONEY_FIELDS
+    ] + [
+        migrations.AlterField(
+            model_name=model_name,
+            name=name,
+            field=banking.money.MoneyField(decimal_places=2, **options),
+        )
+        for model_name, name, options in MONEY_FIELDS
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.2 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+from banking.utils import is_luhn_valid
+
+
+def flag_legacy_check_digits(apps, schema_editor):
+    # The numbers stay as issued, they are printed on the customers' cards
+    Card = apps.get_model('banking', 'Card')
+    legacy = [
+        card_id for card_id, card_number in Card.objects.values_list('id', 'card_number').iterator(chunk_size=10000)
+        if not is_luhn_valid(card_number)
+    ]
+    for start in range(0, len(legacy), 500):
+        Card.objects.filter(pk__in=legacy[start:start + 500]).update(legacy_check_digit=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0044_money_minor_units_swap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='card',
+            name='legacy_check_digit',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(flag_legacy_check_digits, migrations.RunPython.noop),
+    ]
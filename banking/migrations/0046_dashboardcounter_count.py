@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-19 18:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def move_counts(apps, schema_editor):
+    # The counts were stored in value as hundredths, 3 cards as 300
+    DashboardCounter = apps.get_model('banking', 'DashboardCounter')
+    DashboardCounter.objects.exclude(name='balance').update(count=F('value') / 100, value=0)
+
+
+def restore_counts(apps, schema_editor):
+    DashboardCounter = apps.get_model('banking', 'DashboardCounter')
+    DashboardCounter.objects.exclude(name='balance').update(value=F('count') * 100, count=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0045_card_legacy_check_digit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dashboardcounter',
+            name='count',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(move_counts, restore_counts),
+    ]
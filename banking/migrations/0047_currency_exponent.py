@@ -0,0 +1,19 @@
+# Generated by Django 5.1.2 on 2026-10-19 18:55
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('banking', '0046_dashboardcounter_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='currency',
+            name='exponent',
+            field=models.PositiveSmallIntegerField(default=2, validators=[django.core.validators.MaxValueValidator(2)]),
+        ),
+    ]
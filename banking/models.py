@@ -1,14 +1,20 @@
 from datetime import datetime
 from django.db import models
+from django.db.models import Sum
+from django.utils import timezone
 from django.contrib.auth.hashers import make_password, check_password
+from django.core.validators import MaxValueValidator
 
-# Create your models here.
-class ApplicationStatus(models.Model):
-    id = models.AutoField(primary_key=True)
-    status = models.CharField(max_length=10, unique=True)
+from .money import MoneyField
 
-    def __name__(self):
-        return self.status
+# Create your models here.
+# Status, transaction type and card type are stored as small integer codes on the rows.
+# The codes are the ids of the lookup table rows they replaced, and the API shows them the
+# same way: the code as "id" next to the label
+class ApplicationStatus(models.IntegerChoices):
+    PENDING = 1, 'pending'
+    APPROVED = 2, 'approved'
+    REJECTED = 3, 'rejected'
 
 class Role(models.Model):
     id = models.AutoField(primary_key=True)
@@ -25,23 +31,27 @@ class Currency(models.Model):
     id = models.AutoField(primary_key=True)
     currency = models.CharField(max_length=10, unique=True)
     sign = models.CharField(max_length=1)
+    # Decimal places of the minor unit (2 for cents, 0 for yen). Amounts of the currency are
+    # rounded to it when they enter the API or are converted; the money columns store
+    # hundredths, so a currency cannot have more than 2
+    exponent = models.PositiveSmallIntegerField(default=2, validators=[MaxValueValidator(2)])
 
     def __name__(self):
         return self.currency
 
-class TransactionType(models.Model):
-    id = models.AutoField(primary_key=True)
-    type = models.CharField(max_length=10, unique=True)
+class TransactionType(models.IntegerChoices):
+    DEBIT = 1, 'debit'
+    CREDIT = 2, 'credit'
+    # Posted by the accrual runs, the labels are the AccrualRun kinds
+    INTEREST = 3, 'interest'
+    FEE = 4, 'fee'
 
-    def __name__(self):
-        return self.type
+class CardType(models.IntegerChoices):
+    DEBIT_CARD = 1, 'debit card'
 
-class CardType(models.Model):
-    id = models.AutoField(primary_key=True)
-    type = models.CharField(max_length=10, unique=True)
-
-    def __name__(self):
-        return self.type
+def get_code(choices, label):
+    # The code of `label` in `choices`, None when it has none
+    return next((code for code, code_label in choices.choices if code_label == label), None)
 
 
 class User(models.Model):
@@ -70,14 +80,53 @@ class BankAccount(models.Model):
     bank_account_id = models.IntegerField(unique=True)
     IBAN = models.CharField(max_length=34, unique=True)
     currency = models.ForeignKey(Currency, on_delete=models.CASCADE)
-    balance = models.DecimalField(max_digits=10, decimal_places=2)
+    balance = MoneyField(max_digits=10, decimal_places=2)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     date = models.DateField(auto_now=True)
     bankApplication = models.ForeignKey('BankAccountApplication', on_delete=models.CASCADE, blank=True, null=True)
+    # Hot accounts receive credits through striped BalanceDelta rows instead of updating balance
+    is_hot = models.BooleanField(default=False)
+    # Sum of the active card holds, kept in step with Hold so the available balance needs no aggregate
+    reserved = MoneyField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        indexes = [
+            # Range filters and ordering of BankAccountFilter
+            models.Index(fields=['balance']),
+            models.Index(fields=['user', 'balance']),
+            models.Index(fields=['currency', 'balance']),
+        ]
+
+    def get_balance(self):
+        # Include the credits that fold_balance_deltas has not merged into balance yet
+        if not self.is_hot:
+            return self.balance
+
+        pending_delta = getattr(self, 'pending_delta', None)
+        if pending_delta is None:
+            pending_delta = self.balance_deltas.aggregate(total=Sum('amount'))['total'] or 0
+        return self.balance + pending_delta
+
+    def get_available_balance(self):
+        return self.get_balance() - self.reserved
 
     def __name__(self):
         return self.bank_account_id
 
+class BalanceDelta(models.Model):
+    id = models.AutoField(primary_key=True)
+    bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='balance_deltas')
+    stripe = models.PositiveSmallIntegerField()
+    amount = MoneyField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bank_account', 'stripe'], name='unique_balance_delta_stripe'),
+        ]
+
+    def __name__(self):
+        return self.id
+
 class Card(models.Model):
     id = models.AutoField(primary_key=True)
     card_number = models.CharField(max_length=16, unique=True)
@@ -85,33 +134,136 @@ class Card(models.Model):
     cvv = models.IntegerField()
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE)
-    type = models.ForeignKey(CardType, on_delete=models.CASCADE)
+    type = models.PositiveSmallIntegerField(choices=CardType.choices, db_index=True)
     date = models.DateField(auto_now=True)
     cardApplication = models.ForeignKey('CardApplication', on_delete=models.CASCADE, blank=True, null=True)
+    # Last 4 digits of the card number, indexed for banker search
+    last4 = models.CharField(max_length=4, db_index=True, blank=True)
+    # A renewed card is kept inactive, pointed to by the card that replaced it
+    is_active = models.BooleanField(default=True)
+    replaces = models.ForeignKey('self', on_delete=models.SET_NULL, blank=True, null=True, related_name='replacements')
+    # Issued before generate_credit_card computed the Luhn check digit correctly, the only
+    # numbers card authorizations accept with a wrong check digit
+    legacy_check_digit = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # The renewal job picks up "is_active AND expiry_date <= until ORDER BY expiry_date"
+            models.Index(fields=['expiry_date'], condition=models.Q(is_active=True), name='card_active_expiry_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.last4 = self.card_number[-4:]
+        super(Card, self).save(*args, **kwargs)
 
     def __name__(self):
         return self.card_number
 
-class Transaction(models.Model):
+class FxRateSnapshot(models.Model):
+    # A published set of exchange rates, rows are never updated so transactions can point to them
+    id = models.AutoField(primary_key=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __name__(self):
+        return self.id
+
+class FxRate(models.Model):
+    id = models.AutoField(primary_key=True)
+    snapshot = models.ForeignKey(FxRateSnapshot, on_delete=models.CASCADE, related_name='rates')
+    base = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name='+')
+    quote = models.ForeignKey(Currency, on_delete=models.CASCADE, related_name='+')
+    # Units of quote currency for one unit of base currency
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['snapshot', 'base', 'quote'], name='unique_fx_rate_pair'),
+        ]
+
+    def __name__(self):
+        return self.id
+
+class BaseTransaction(models.Model):
     id = models.AutoField(primary_key=True)
     transaction_id = models.CharField(max_length=30, unique=True)
     bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE)
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField(max_digits=10, decimal_places=2)
     currency = models.ForeignKey(Currency, on_delete=models.CASCADE)
-    type = models.ForeignKey(TransactionType, on_delete=models.CASCADE)
+    type = models.PositiveSmallIntegerField(choices=TransactionType.choices, db_index=True)
     date = models.DateField()
+    # Balance of the bank account right after this transaction, null until it is known
+    # (credits to hot accounts and history older than the column get it from
+    # fold_balance_deltas and backfill_running_balances)
+    balance_after = MoneyField(max_digits=10, decimal_places=2, blank=True, null=True)
+    # Rates used to convert the amount of a cross-currency transfer
+    fx_snapshot = models.ForeignKey(FxRateSnapshot, on_delete=models.PROTECT, blank=True, null=True, related_name='+')
+    # The other account of a transfer
+    counterparty = models.ForeignKey(BankAccount, on_delete=models.SET_NULL, blank=True, null=True, related_name='+')
+    # When the transaction was posted, null for the history older than the column
+    created_at = models.DateTimeField(default=timezone.now, blank=True, null=True)
+
+    class Meta:
+        abstract = True
 
     def __name__(self):
         return self.transaction_id
 
+class Transaction(BaseTransaction):
+    class Meta:
+        indexes = [
+            # Balance as of a date is the last transaction of the account on or before it
+            models.Index(fields=['bank_account', 'date', 'id']),
+            # Range filters and ordering of TransactionFilter
+            models.Index(fields=['date']),
+            models.Index(fields=['amount']),
+            models.Index(fields=['bank_account', 'amount']),
+            # Recent history read by the velocity checks at startup
+            models.Index(fields=['created_at']),
+        ]
+
+class ArchivedTransaction(BaseTransaction):
+    # Transactions moved out of the Transaction table by archive_transactions, they keep their id
+    class Meta:
+        indexes = [
+            models.Index(fields=['bank_account', 'date', 'id']),
+            models.Index(fields=['date']),
+            models.Index(fields=['amount']),
+            models.Index(fields=['bank_account', 'amount']),
+        ]
+
+class TransactionEvent(models.Model):
+    # Outbox of the transaction change feed, written in the database transaction of the
+    # transaction. The id is the cursor clients resume from
+    id = models.AutoField(primary_key=True)
+    bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='+')
+    # The transaction as listed by /transactions/, it stays readable once the transaction is archived
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Backlog of the accounts of a client after its cursor
+            models.Index(fields=['bank_account', 'id']),
+        ]
+
+    def __name__(self):
+        return self.id
+
 class BankAccountApplication(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     currency = models.ForeignKey(Currency, on_delete=models.CASCADE)
-    status = models.ForeignKey(ApplicationStatus, on_delete=models.CASCADE)
+    status = models.PositiveSmallIntegerField(choices=ApplicationStatus.choices, db_index=True)
 
     date = models.DateField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Range filters and ordering of BankAccountApplicationFilter
+            models.Index(fields=['date']),
+            models.Index(fields=['status', 'date']),
+        ]
+
     def __name__(self):
         return self.id
 
@@ -119,11 +271,271 @@ class CardApplication(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE)
-    type = models.ForeignKey(CardType, on_delete=models.CASCADE)
-    monthly_salary = models.DecimalField(max_digits=10, decimal_places=2)
-    status = models.ForeignKey(ApplicationStatus, on_delete=models.CASCADE)
+    type = models.PositiveSmallIntegerField(choices=CardType.choices, db_index=True)
+    monthly_salary = MoneyField(max_digits=10, decimal_places=2)
+    status = models.PositiveSmallIntegerField(choices=ApplicationStatus.choices, db_index=True)
     date = models.DateField(auto_now=True)
     reason = models.CharField(max_length=100, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Filters, range filters and ordering of CardApplicationFilter
+            models.Index(fields=['date']),
+            models.Index(fields=['reason']),
+            models.Index(fields=['monthly_salary']),
+            models.Index(fields=['status', 'monthly_salary']),
+            models.Index(fields=['status', 'date']),
+        ]
+
+    def __name__(self):
+        return self.id
+
+class ApplicationEvent(models.Model):
+    # Outbox of the status changes of the applications of a user, written in the database
+    # transaction of the banker action. The id is the cursor clients resume from
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Backlog of a client after its cursor
+            models.Index(fields=['user', 'id']),
+        ]
+
     def __name__(self):
-        return self.id
\ No newline at end of file
+        return self.id
+
+class TransferRequest(models.Model):
+    PENDING = 'pending'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    transfer_id = models.CharField(max_length=30, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='outgoing_transfer_requests')
+    bank_account_receiver = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='incoming_transfer_requests')
+    amount = MoneyField(max_digits=10, decimal_places=2)
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    error = models.CharField(max_length=100, blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Workers drain the queue with "status = pending ORDER BY id"
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __name__(self):
+        return self.transfer_id
+
+class ScheduledTransfer(models.Model):
+    DAILY = 'daily'
+    WEEKLY = 'weekly'
+    MONTHLY = 'monthly'
+    INTERVAL_CHOICES = [
+        (DAILY, 'Daily'),
+        (WEEKLY, 'Weekly'),
+        (MONTHLY, 'Monthly'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='outgoing_scheduled_transfers')
+    bank_account_receiver = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='incoming_scheduled_transfers')
+    amount = MoneyField(max_digits=10, decimal_places=2)
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE)
+    interval = models.CharField(max_length=10, choices=INTERVAL_CHOICES)
+    # First occurrence, the following ones are computed from it so monthly orders keep their day
+    start_at = models.DateTimeField()
+    # Number of occurrences already executed or given up
+    occurrences = models.IntegerField(default=0)
+    # Next occurrence, or the next retry of a failed one
+    next_run_at = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+    # Consecutive failures of the current occurrence
+    failures = models.IntegerField(default=0)
+    last_error = models.CharField(max_length=100, blank=True, null=True)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The scheduler picks up "is_active AND next_run_at <= now ORDER BY next_run_at"
+            models.Index(fields=['next_run_at'], condition=models.Q(is_active=True), name='scheduled_transfer_due_idx'),
+        ]
+
+    def __name__(self):
+        return self.id
+
+class AccrualRun(models.Model):
+    INTEREST = 'interest'
+    FEE = 'fee'
+    KIND_CHOICES = [
+        (INTEREST, 'Interest'),
+        (FEE, 'Fee'),
+    ]
+
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Day the interest is for, or the first day of the month of the fee
+    accrual_date = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RUNNING)
+    accounts = models.IntegerField(default=0)
+    total = MoneyField(max_digits=14, decimal_places=2, default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'accrual_date'], name='unique_accrual_run'),
+        ]
+
+    def __name__(self):
+        return self.id
+
+class ReconciliationRun(models.Model):
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=RUNNING)
+    chunk_size = models.IntegerField()
+    # Checkpoint: every account with a lower id is reconciled, a resumed run starts here
+    next_account_id = models.IntegerField(default=0)
+    accounts = models.IntegerField(default=0)
+    discrepancies = models.IntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __name__(self):
+        return self.id
+
+class ReconciliationDiscrepancy(models.Model):
+    id = models.AutoField(primary_key=True)
+    run = models.ForeignKey(ReconciliationRun, on_delete=models.CASCADE, related_name='discrepancy_rows')
+    bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE)
+    # Stored balance (with the pending credits of hot accounts) and the sum of the transactions
+    balance = MoneyField(max_digits=14, decimal_places=2)
+    ledger_balance = MoneyField(max_digits=14, decimal_places=2)
+
+    def __name__(self):
+        return self.id
+
+class Hold(models.Model):
+    ACTIVE = 'active'
+    CAPTURED = 'captured'
+    RELEASED = 'released'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = [
+        (ACTIVE, 'Active'),
+        (CAPTURED, 'Captured'),
+        (RELEASED, 'Released'),
+        (EXPIRED, 'Expired'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    authorization_code = models.CharField(max_length=30, unique=True)
+    bank_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name='holds')
+    card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name='holds')
+    # Amount held, it is counted in BankAccount.reserved while the hold is active
+    amount = MoneyField(max_digits=10, decimal_places=2)
+    captured_amount = MoneyField(max_digits=10, decimal_places=2, blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=ACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    settled_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Expiry queue of sweep_holds: "status = active AND expires_at <= now ORDER BY expires_at",
+            # settled holds are left out of the index so it only grows with the active ones
+            models.Index(fields=['expires_at'], condition=models.Q(status='active'), name='hold_active_expiry_idx'),
+        ]
+
+    def __name__(self):
+        return self.authorization_code
+
+class DashboardCounter(models.Model):
+    # Figures of the banker dashboard, kept up to date in the database transaction of every
+    # change they count. A counter is spread over stripes like the hot account deltas, so
+    # concurrent changes do not serialize on one row; its value is the sum of its stripes
+    id = models.AutoField(primary_key=True)
+    # name:day:currency:stripe
+    key = models.CharField(max_length=60, unique=True)
+    name = models.CharField(max_length=30)
+    # Set on the counters of a day (approvals, rejections)
+    day = models.DateField(blank=True, null=True)
+    currency = models.ForeignKey(Currency, on_delete=models.CASCADE, blank=True, null=True, related_name='+')
+    stripe = models.PositiveSmallIntegerField(default=0)
+    # The balance counters sum amounts, the other counters count rows
+    value = MoneyField(max_digits=20, decimal_places=2, default=0)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # The dashboard reads the counters without a day and those of today
+            models.Index(fields=['day']),
+        ]
+
+    def __name__(self):
+        return self.key
+
+class ClientImport(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    file = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Number of CSV rows already handled, a resumed import skips them
+    rows_processed = models.IntegerField(default=0)
+    imported = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __name__(self):
+        return self.id
+
+class ClientImportError(models.Model):
+    id = models.AutoField(primary_key=True)
+    client_import = models.ForeignKey(ClientImport, on_delete=models.CASCADE, related_name='errors')
+    row = models.IntegerField()
+    username = models.CharField(max_length=100, blank=True)
+    error = models.CharField(max_length=100)
+
+    def __name__(self):
+        return self.id
@@ -0,0 +1,91 @@
+from decimal import Context, Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+from django import forms
+from django.core import exceptions
+from django.db import models
+from django.db.models import Value
+
+
+def to_minor_units(amount, decimal_places=2):
+    """
+    Convert an amount to a whole number of minor units (cents for 2 decimal places).
+
+    Digits past `decimal_places` are rounded half to even, like a DecimalField rounds them.
+    """
+    return int(Decimal(amount).scaleb(decimal_places).quantize(Decimal(1), rounding=ROUND_HALF_EVEN))
+
+
+def minor_unit(exponent=2):
+    # The smallest amount of a currency, Decimal('0.01') for an exponent of 2
+    return Decimal(1).scaleb(-exponent)
+
+
+def from_minor_units(units, decimal_places=2):
+    # Exact, Decimal(12345).scaleb(-2) is Decimal('123.45')
+    return Decimal(units).scaleb(-decimal_places)
+
+
+class MoneyField(models.BigIntegerField):
+    """
+    An amount stored as a whole number of minor units in a BIGINT column.
+
+    The Python value is a Decimal with `decimal_places` places, the same as a DecimalField
+    with these arguments, so the code and the API keep working with Decimal amounts. The
+    database only sees integers: SUM aggregates are exact and stay in integer arithmetic.
+
+    A plain Python amount in an expression (F('balance') + amount) is not converted by the
+    field, wrap it with money_value().
+    """
+
+    description = 'Amount stored in minor units'
+
+    def __init__(self, *args, max_digits=None, decimal_places=2, **kwargs):
+        self.max_digits = max_digits
+        self.decimal_places = decimal_places
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.max_digits is not None:
+            kwargs['max_digits'] = self.max_digits
+        if self.decimal_places != 2:
+            kwargs['decimal_places'] = self.decimal_places
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return from_minor_units(value, self.decimal_places)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        try:
+            # Floats are cut to max_digits significant digits first, like a DecimalField does
+            if isinstance(value, float):
+                return Context(prec=self.max_digits).create_decimal_from_float(value)
+            return Decimal(value)
+        except (InvalidOperation, TypeError, ValueError):
+            raise exceptions.ValidationError(
+                '"%(value)s" value must be a decimal number.', code='invalid', params={'value': value}
+            )
+
+    def get_prep_value(self, value):
+        # Skip the int() of IntegerField, the value is an amount and not minor units
+        value = models.Field.get_prep_value(self, value)
+        if value is None:
+            return None
+        return to_minor_units(self.to_python(value), self.decimal_places)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'max_digits': self.max_digits,
+            'decimal_places': self.decimal_places,
+            **kwargs,
+        })
+
+
+def money_value(amount, decimal_places=2):
+    # A Python amount inside an expression on a MoneyField, converted to minor units like the column
+    return Value(amount, output_field=MoneyField(decimal_places=decimal_places))
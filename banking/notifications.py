@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .events import EventHub
+from .models import ApplicationEvent, BankAccountApplication
+
+
+def post_application_event(application, **details):
+    """
+    Publish the status change of a bank account or card application to its user.
+
+    Must run inside the database transaction of the banker action.
+
+    Args:
+        application (BankAccountApplication | CardApplication): The application, with its new status.
+        **details: Extra fields of the event (the new bank account or card, the rejection reason).
+    """
+    kind = 'bank_account_application' if isinstance(application, BankAccountApplication) else 'card_application'
+    application_hub.publish([ApplicationEvent(user_id=application.user_id, payload={
+        'application': kind,
+        'id': application.id,
+        'status': application.get_status_display(),
+        **details,
+    })])
+
+
+# Status changes of the applications, a topic is a user
+application_hub = EventHub(import_string(settings.EVENT_HUB_BACKEND)(ApplicationEvent, 'user_id'))
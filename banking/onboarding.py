@@ -0,0 +1,121 @@
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import ClientImport, ClientImportError, Role, User
+from .search import index_usernames
+
+USERNAME_MAX_LENGTH = User._meta.get_field('username').max_length
+
+
+def read_rows(path, start=0):
+    """
+    Stream the rows of a client CSV file (columns: username, password).
+
+    Args:
+        path (str): The CSV file.
+        start (int): The number of rows to skip, used to resume an import.
+
+    Yields:
+        tuple: The 1-based row number and the row as a dict.
+    """
+    with open(path, newline='', encoding='utf-8') as csv_file:
+        for number, row in enumerate(csv.DictReader(csv_file), start=1):
+            if number > start:
+                yield number, row
+
+
+def batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_clients(client_import, batch_size=1000, workers=None):
+    """
+    Create the clients listed in the CSV file of an import.
+
+    Every batch is checked against the existing usernames with one query, its passwords
+    are hashed in a process pool across all cores and the users are inserted with
+    bulk_create. The batch, its errors and the import progress are committed together,
+    so a failed import resumes after the last committed batch.
+
+    Args:
+        client_import (ClientImport): The import to run.
+        batch_size (int): The number of CSV rows handled per database transaction.
+        workers (int): The number of hashing processes. Default is the number of CPUs.
+
+    Returns:
+        ClientImport: The finished import.
+    """
+    role = Role.objects.get(client_permission=True)
+
+    client_import.status = ClientImport.RUNNING
+    client_import.save()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            rows = read_rows(client_import.file, start=client_import.rows_processed)
+            for batch in batches(rows, batch_size):
+                import_batch(client_import, batch, role, pool)
+    except Exception:
+        client_import.status = ClientImport.FAILED
+        client_import.save()
+        raise
+
+    client_import.status = ClientImport.COMPLETED
+    client_import.save()
+    return client_import
+
+
+def import_batch(client_import, batch, role, pool):
+    errors = []
+    valid = {}
+
+    for number, row in batch:
+        username = (row.get('username') or '').strip()
+        password = row.get('password') or ''
+
+        if not username:
+            errors.append(ClientImportError(client_import=client_import, row=number, error='username is required'))
+        elif len(username) > USERNAME_MAX_LENGTH:
+            errors.append(ClientImportError(client_import=client_import, row=number, username=username[:100],
+                                            error=f'username must be at most {USERNAME_MAX_LENGTH} characters'))
+        elif not password:
+            errors.append(ClientImportError(client_import=client_import, row=number, username=username,
+                                            error='password is required'))
+        elif username in valid:
+            errors.append(ClientImportError(client_import=client_import, row=number, username=username,
+                                            error='Duplicate username in file'))
+        else:
+            valid[username] = (number, password)
+
+    existing = set(User.objects.filter(username__in=list(valid)).values_list('username', flat=True))
+    for username in existing:
+        number, _ = valid.pop(username)
+        errors.append(ClientImportError(client_import=client_import, row=number, username=username,
+                                        error='Username already exists'))
+
+    usernames = list(valid)
+    passwords = pool.map(make_password, [valid[username][1] for username in usernames], chunksize=16)
+    users = [
+        User(username=username, password=password, role=role)
+        for username, password in zip(usernames, passwords)
+    ]
+
+    with transaction.atomic():
+        users = User.objects.bulk_create(users)
+        index_usernames(users)
+        ClientImportError.objects.bulk_create(sorted(errors, key=lambda error: error.row))
+
+        client_import.rows_processed = batch[-1][0]
+        client_import.imported += len(users)
+        client_import.save()
@@ -0,0 +1,135 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import BigIntegerField, Max, Sum
+from django.utils import timezone
+
+from .models import ArchivedTransaction, BalanceDelta, BankAccount, ReconciliationDiscrepancy, \
+                    ReconciliationRun, Transaction
+from .money import from_minor_units, to_minor_units
+
+
+def sum_cents(queryset):
+    """
+    Sum the amounts of `queryset` in integer cents per bank account with one grouped query.
+
+    The amounts are stored in cents, the totals are read as integers without the
+    conversion of MoneyField.
+
+    Returns:
+        dict: Bank account id -> total in cents.
+    """
+    return dict(
+        queryset.order_by().values_list('bank_account_id')
+                .annotate(total=Sum('amount', output_field=BigIntegerField()))
+    )
+
+
+def reconcile_accounts(**lookups):
+    """
+    Compare the stored balance of bank accounts with the sum of their transactions.
+
+    The balance of a hot account includes its pending credit stripes, the transactions
+    of both the hot and the archive table are summed.
+
+    Args:
+        **lookups: Lookups on the account id selecting the accounts (gte, lt, in).
+
+    Returns:
+        tuple: The number of accounts checked and a list of (bank account id, balance,
+        ledger balance) for the accounts that do not match.
+    """
+    account_filter = {f'id__{lookup}': value for lookup, value in lookups.items()}
+    ledger_filter = {f'bank_account_id__{lookup}': value for lookup, value in lookups.items()}
+
+    balances = BankAccount.objects.filter(**account_filter).values_list('id', 'balance')
+    pending_deltas = sum_cents(BalanceDelta.objects.filter(**ledger_filter))
+    ledger = sum_cents(Transaction.objects.filter(**ledger_filter))
+    for bank_account_id, total in sum_cents(ArchivedTransaction.objects.filter(**ledger_filter)).items():
+        ledger[bank_account_id] = ledger.get(bank_account_id, 0) + total
+
+    accounts = 0
+    mismatches = []
+    for bank_account_id, balance in balances.iterator():
+        accounts += 1
+        balance_cents = to_minor_units(balance) + pending_deltas.get(bank_account_id, 0)
+        ledger_cents = ledger.get(bank_account_id, 0)
+        if balance_cents != ledger_cents:
+            mismatches.append((bank_account_id, from_minor_units(balance_cents), from_minor_units(ledger_cents)))
+
+    return accounts, mismatches
+
+
+def reconcile_chunk(start, end):
+    # Runs in a worker process, it only reads
+    return reconcile_accounts(gte=start, lt=end)
+
+
+def split_chunks(start, end, chunk_size):
+    # Half open ranges of account ids [low, low + chunk_size) covering [start, end]
+    return [(low, low + chunk_size) for low in range(start, end + 1, chunk_size)]
+
+
+def run_reconciliation(reconciliation_run, workers=None):
+    """
+    Reconcile every bank account, resuming `reconciliation_run` from its checkpoint.
+
+    The account ids are cut into chunks of `chunk_size` ids that worker processes reconcile
+    in parallel with grouped SUM queries. The results are taken in chunk order and this
+    process alone writes them: the discrepancies of a chunk and the checkpoint after it are
+    committed together. Mismatches are read once more before being reported, so a transfer
+    committed between the balance and the ledger queries of a chunk is not reported.
+
+    Args:
+        reconciliation_run (ReconciliationRun): The run to execute or resume.
+        workers (int): The number of worker processes. Default is the number of CPUs.
+
+    Returns:
+        ReconciliationRun: The finished run.
+    """
+    reconciliation_run.status = ReconciliationRun.RUNNING
+    reconciliation_run.save()
+
+    last_id = BankAccount.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+    chunks = split_chunks(reconciliation_run.next_account_id, last_id, reconciliation_run.chunk_size)
+
+    try:
+        if (workers or os.cpu_count()) == 1 or len(chunks) <= 1:
+            record_chunks(reconciliation_run, chunks, (reconcile_chunk(*chunk) for chunk in chunks))
+        else:
+            # The forked workers must not share the connection of this process
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=connections.close_all) as pool:
+                results = pool.map(reconcile_chunk, *zip(*chunks))
+                record_chunks(reconciliation_run, chunks, results)
+    except Exception:
+        reconciliation_run.status = ReconciliationRun.FAILED
+        reconciliation_run.save()
+        raise
+
+    reconciliation_run.status = ReconciliationRun.COMPLETED
+    reconciliation_run.finished_at = timezone.now()
+    reconciliation_run.save()
+    return reconciliation_run
+
+
+def record_chunks(reconciliation_run, chunks, results):
+    for (_, end), (accounts, mismatches) in zip(chunks, results):
+        if mismatches:
+            _, mismatches = reconcile_accounts(**{'in': [bank_account_id for bank_account_id, _, _ in mismatches]})
+
+        with transaction.atomic():
+            ReconciliationDiscrepancy.objects.bulk_create([
+                ReconciliationDiscrepancy(
+                    run=reconciliation_run,
+                    bank_account_id=bank_account_id,
+                    balance=balance,
+                    ledger_balance=ledger_balance
+                )
+                for bank_account_id, balance, ledger_balance in mismatches
+            ])
+            reconciliation_run.next_account_id = end
+            reconciliation_run.accounts += accounts
+            reconciliation_run.discrepancies += len(mismatches)
+            reconciliation_run.save(update_fields=['next_account_id', 'accounts', 'discrepancies'])
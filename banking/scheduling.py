@@ -0,0 +1,113 @@
+import calendar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from .models import ScheduledTransfer
+from .transfers import apply_transfers
+
+INTERVALS = {
+    ScheduledTransfer.DAILY: timedelta(days=1),
+    ScheduledTransfer.WEEKLY: timedelta(weeks=1),
+}
+
+
+def get_occurrence(start_at, interval, n):
+    """
+    Return the date and time of occurrence `n` (0 based) of a scheduled transfer.
+
+    Monthly occurrences keep the day of `start_at`, clamped to the length of the month,
+    so an order starting on the 31st runs on the last day of shorter months.
+    """
+    if interval != ScheduledTransfer.MONTHLY:
+        return start_at + INTERVALS[interval] * n
+
+    start_at = timezone.localtime(start_at)
+    month = start_at.month - 1 + n
+    year = start_at.year + month // 12
+    month = month % 12 + 1
+    day = min(start_at.day, calendar.monthrange(year, month)[1])
+    return start_at.replace(year=year, month=month, day=day)
+
+
+def skip_to_next_occurrence(scheduled_transfer, now):
+    # Move to the first occurrence after `now`, occurrences missed entirely are not made up
+    scheduled_transfer.occurrences += 1
+    next_run_at = get_occurrence(scheduled_transfer.start_at, scheduled_transfer.interval, scheduled_transfer.occurrences)
+    while next_run_at <= now:
+        scheduled_transfer.occurrences += 1
+        next_run_at = get_occurrence(scheduled_transfer.start_at, scheduled_transfer.interval, scheduled_transfer.occurrences)
+
+    scheduled_transfer.next_run_at = next_run_at
+    scheduled_transfer.failures = 0
+
+
+def get_retry_delay(failures):
+    return timedelta(seconds=settings.SCHEDULED_TRANSFER_RETRY_DELAY * 2 ** (failures - 1))
+
+
+def run_scheduled_batch(batch_size=500, now=None, worker=0, workers=1):
+    """
+    Execute up to `batch_size` due scheduled transfers in a single database transaction.
+
+    The due orders come from the partial index on `next_run_at`, the transfers are applied
+    with the same group commit as the queued transfers. A failed order is retried with an
+    exponential backoff until SCHEDULED_TRANSFER_MAX_FAILURES or its next occurrence.
+
+    Args:
+        batch_size (int): The maximum number of orders to execute.
+        now (datetime, optional): The current time.
+        worker (int): The index of the calling worker.
+        workers (int): The total number of workers, orders are partitioned by id.
+
+    Returns:
+        int: The number of orders executed (successfully or not).
+    """
+    now = now or timezone.now()
+
+    with transaction.atomic():
+        due = ScheduledTransfer.objects.select_for_update(skip_locked=True) \
+                                       .filter(is_active=True, next_run_at__lte=now)
+        if workers > 1:
+            due = due.annotate(partition=Mod('id', workers)).filter(partition=worker)
+        due = list(due.order_by('next_run_at')[:batch_size])
+
+        if not due:
+            return 0
+
+        errors = apply_transfers(due)
+
+        succeeded = []
+        failed = []
+        for scheduled_transfer, error in zip(due, errors):
+            if error is None:
+                skip_to_next_occurrence(scheduled_transfer, now)
+                succeeded.append(scheduled_transfer)
+                continue
+
+            scheduled_transfer.last_run_at = now
+            scheduled_transfer.last_error = error
+            scheduled_transfer.failures += 1
+            retry_at = now + get_retry_delay(scheduled_transfer.failures)
+            next_occurrence = get_occurrence(
+                scheduled_transfer.start_at, scheduled_transfer.interval, scheduled_transfer.occurrences + 1
+            )
+            if scheduled_transfer.failures >= settings.SCHEDULED_TRANSFER_MAX_FAILURES or retry_at >= next_occurrence:
+                skip_to_next_occurrence(scheduled_transfer, now)
+            else:
+                scheduled_transfer.next_run_at = retry_at
+            failed.append(scheduled_transfer)
+
+        # The columns that are the same for every succeeded order are set with one plain UPDATE,
+        # bulk_update (a CASE per column) is kept for the ones that differ
+        ScheduledTransfer.objects.filter(pk__in=[scheduled_transfer.id for scheduled_transfer in succeeded]) \
+                                 .update(failures=0, last_error=None, last_run_at=now)
+        ScheduledTransfer.objects.bulk_update(succeeded, ['occurrences', 'next_run_at'])
+        ScheduledTransfer.objects.bulk_update(
+            failed, ['occurrences', 'next_run_at', 'failures', 'last_error', 'last_run_at']
+        )
+
+    return len(due)
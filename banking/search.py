@@ -0,0 +1,106 @@
+from django.db import connection
+
+from .models import User, BankAccount, Card
+
+# Upper bound of a prefix range: every string starting with the prefix sorts below prefix + MAX_CHAR
+MAX_CHAR = '\U0010ffff'
+
+# Number of digits of a bank account id, see utils.generate_bank_account_id
+BANK_ACCOUNT_ID_LENGTH = 10
+
+
+def has_user_fts():
+    return connection.vendor == 'sqlite'
+
+
+def index_usernames(users):
+    """
+    Add or refresh users in the username full text index.
+
+    Args:
+        users (iterable of User): The users to index.
+    """
+    if not has_user_fts():
+        return
+
+    rows = [(user.id, user.username) for user in users]
+    with connection.cursor() as cursor:
+        cursor.executemany('DELETE FROM banking_user_fts WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany('INSERT INTO banking_user_fts(rowid, username) VALUES (%s, %s)', rows)
+
+
+def unindex_username(user_id):
+    if not has_user_fts():
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM banking_user_fts WHERE rowid = %s', [user_id])
+
+
+def prefix_range(field, prefix):
+    # A range on the field's unique index, "LIKE 'x%'" cannot use it on SQLite
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + MAX_CHAR}
+
+
+def search_users(query, limit):
+    """
+    Find clients by username prefix, or by substring when the query is at least 3 characters.
+
+    Prefixes are a range scan on the unique username index. Substrings go through the
+    trigram FTS5 table on SQLite, other databases fall back to a scan.
+    """
+    clients = User.objects.filter(role__client_permission=True).select_related('role')
+
+    users = list(clients.filter(**prefix_range('username', query)).order_by('username')[:limit])
+    if len(users) >= limit or len(query) < 3:
+        return users
+
+    found = {user.id for user in users}
+    if has_user_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM banking_user_fts WHERE username MATCH %s LIMIT %s',
+                ['"' + query.replace('"', '""') + '"', limit * 2]
+            )
+            ids = [row[0] for row in cursor.fetchall() if row[0] not in found]
+        matches = clients.filter(pk__in=ids)
+    else:
+        matches = clients.filter(username__contains=query).exclude(pk__in=found)
+
+    return users + list(matches.order_by('username')[:limit - len(users)])
+
+
+def search_bank_accounts(query, limit):
+    """
+    Find bank accounts by IBAN (exact or prefix) or by bank account id (exact or prefix).
+    """
+    bank_accounts = BankAccount.objects.select_related('currency', 'user')
+
+    results = list(bank_accounts.filter(**prefix_range('IBAN', query.upper())).order_by('IBAN')[:limit])
+
+    if query.isdigit() and len(query) <= BANK_ACCOUNT_ID_LENGTH and len(results) < limit:
+        # Ids are stored as integers, so the prefix "123" of a 10 digit id is the range
+        # 1230000000..1239999999, and shorter ids (leading zeros were dropped) get their own range
+        found = {bank_account.id for bank_account in results}
+        prefix = int(query)
+        for length in range(len(query), BANK_ACCOUNT_ID_LENGTH + 1):
+            scale = 10 ** (length - len(query))
+            matches = bank_accounts.filter(
+                bank_account_id__gte=prefix * scale,
+                bank_account_id__lt=(prefix + 1) * scale
+            ).exclude(pk__in=found).order_by('bank_account_id')[:limit - len(results)]
+            results += list(matches)
+            found.update(bank_account.id for bank_account in results)
+            if len(results) >= limit:
+                break
+
+    return results
+
+
+def search_cards(query, limit):
+    """
+    Find cards by the last 4 digits of the card number.
+    """
+    if len(query) != 4 or not query.isdigit():
+        return []
+    return list(Card.objects.filter(last4=query)[:limit])
@@ -1,45 +1,149 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth.hashers import make_password
+from django.db import transaction
 from .models import Role, User, Transaction, \
                     Card, Currency, TransactionType, \
                     CardType, BankAccountApplication, \
-                    BankAccount, CardApplication, ApplicationStatus
+                    BankAccount, CardApplication, ApplicationStatus, \
+                    ArchivedTransaction, ScheduledTransfer
+from .money import MoneyField
+
+def parse_query_list(request, name):
+    # Comma separated list from the query string, None when the parameter is not given
+    if request is None or request.method not in SAFE_METHODS or name not in request.query_params:
+        return None
+    return {item.strip() for item in request.query_params[name].split(',') if item.strip()}
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    A ModelSerializer that takes `?fields=` and `?expand=` from the request in its context.
+
+    `?fields=a,b` keeps only the listed fields. `?expand=x,y` nests only the listed relations
+    of `expandable_fields`, the other relations are returned as ids. Without `?expand=` the
+    relations that are nested by default stay nested.
+    """
+    # Relation name -> (serializer class, nested by default)
+    expandable_fields = {}
+    # Fields read by to_representation or the permissions besides the requested ones
+    required_fields = ()
+    # Amounts stored in minor units are decimals in the API
+    serializer_field_mapping = {
+        **serializers.ModelSerializer.serializer_field_mapping,
+        MoneyField: serializers.DecimalField,
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
 
-class ApplicationStatusSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = ApplicationStatus
-        fields = '__all__'
-
-class RoleSerializer(serializers.ModelSerializer):
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return
+
+        fields = self.get_requested_fields(request)
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+        # Relations that are not expanded are read from the foreign key column without loading
+        # the row, codes are returned as they are
+        for name in set(self.expandable_fields) - self.get_expanded_fields(request):
+            if name in self.fields:
+                attname = self.Meta.model._meta.get_field(name).attname
+                self.fields[name] = serializers.ReadOnlyField(**({'source': attname} if attname != name else {}))
+
+    def build_standard_field(self, field_name, model_field):
+        field_class, field_kwargs = super().build_standard_field(field_name, model_field)
+        if isinstance(model_field, MoneyField):
+            field_kwargs.update(max_digits=model_field.max_digits, decimal_places=model_field.decimal_places)
+        return field_class, field_kwargs
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        fields = parse_query_list(request, 'fields')
+        if fields is not None:
+            fields.add('id')
+        return fields
+
+    @classmethod
+    def get_expanded_fields(cls, request):
+        expand = parse_query_list(request, 'expand')
+        if expand is None:
+            return {name for name, (_, default) in cls.expandable_fields.items() if default}
+        return expand & set(cls.expandable_fields)
+
+    @classmethod
+    def narrow_queryset(cls, queryset, request):
+        """
+        Load only the columns of the requested fields and join only the expanded relations.
+        """
+        fields = cls.get_requested_fields(request)
+        expanded = cls.get_expanded_fields(request)
+        if fields is not None:
+            expanded &= fields
+
+        # Codes are expanded from their choices, only relations are joined
+        expanded = {name for name in expanded if queryset.model._meta.get_field(name).is_relation}
+        if expanded:
+            queryset = queryset.select_related(*expanded)
+
+        if fields is not None:
+            model_fields = {field.name for field in queryset.model._meta.concrete_fields}
+            queryset = queryset.only(*((fields | set(cls.required_fields)) & model_fields))
+
+        return queryset
+
+    def expand(self, data, instance, name):
+        # Nest a relation when it is requested and expanded
+        if name in data and name in self.get_expanded_fields(self.context.get('request')):
+            related = getattr(instance, name)
+            serializer_class = self.expandable_fields[name][0]
+            data[name] = serializer_class(related).to_representation(related)
+
+class ChoiceSerializer(serializers.BaseSerializer):
+    """
+    A code of `choices` shown as the lookup table row it replaced: {"id": code, <label_field>: label}.
+    """
+    choices = None
+    label_field = None
+
+    def to_representation(self, code):
+        code = self.choices(code)
+        return {'id': code.value, self.label_field: code.label}
+
+class ApplicationStatusSerializer(ChoiceSerializer):
+    choices = ApplicationStatus
+    label_field = 'status'
+
+class RoleSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Role
         fields = '__all__'
 
-class CurrencySerializer(serializers.ModelSerializer):
+class CurrencySerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Currency
         fields = '__all__'
 
-class TransactionTypeSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = TransactionType
-        fields = '__all__'
+class TransactionTypeSerializer(ChoiceSerializer):
+    choices = TransactionType
+    label_field = 'type'
 
-class CardTypeSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = CardType
-        fields = '__all__'
+class CardTypeSerializer(ChoiceSerializer):
+    choices = CardType
+    label_field = 'type'
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsModelSerializer):
     password = serializers.CharField(write_only=True)  # Hide the password in response
     role = serializers.CharField(required=False)  # Role is not required in the request
+    expandable_fields = {'role': (RoleSerializer, True)}
     class Meta:
         model = User
         fields = '__all__'
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['role'] = RoleSerializer(instance.role).to_representation(instance.role)
+        self.expand(data, instance, 'role')
         return data
 
     def create(self, validated_data):
@@ -87,54 +191,82 @@ class UserSerializer(serializers.ModelSerializer):
 
         return super().validate(data)
 
-class BankAccountSerializer(serializers.ModelSerializer):
+class BankAccountSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {'currency': (CurrencySerializer, True), 'user': (None, True)}
+    required_fields = ('user', 'IBAN', 'currency', 'is_hot')
     class Meta:
         model = BankAccount
         fields = '__all__'
 
     def to_representation(self, instance):
         authUser = self.context.get('request').user
+        expanded = self.get_expanded_fields(self.context.get('request'))
 
-        if authUser.role.client_permission and instance.user.id != authUser.id:
+        if authUser.role.client_permission and instance.user_id != authUser.id:
             data = {}
             data['id'] = instance.id
             data['IBAN'] = instance.IBAN
-            data['user'] = {'id': instance.user.id} 
-            data['currency'] = CurrencySerializer(instance.currency).to_representation(instance.currency)
-            return data
+            data['user'] = {'id': instance.user_id} 
+            data['currency'] = instance.currency_id
+            self.expand(data, instance, 'currency')
+            return {name: value for name, value in data.items() if name in self.fields}
         
         data = super().to_representation(instance)
 
-        data['currency'] = CurrencySerializer(instance.currency).to_representation(instance.currency)
-        data['user'] = {'id': instance.user.id, 'username': instance.user.username} 
+        if 'balance' in data:
+            data['balance'] = self.fields['balance'].to_representation(instance.get_balance())
+        self.expand(data, instance, 'currency')
+        if 'user' in data and 'user' in expanded:
+            data['user'] = {'id': instance.user.id, 'username': instance.user.username} 
         return data
     
-class CardSerializer(serializers.ModelSerializer):
+class CardSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {'type': (CardTypeSerializer, True)}
+    required_fields = ('user',)
     class Meta:
         model = Card
         fields = '__all__'        
+        # Set once by migration 0045 for the cards issued with a wrong check digit
+        read_only_fields = ('legacy_check_digit',)
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['type'] = CardTypeSerializer(instance.type).to_representation(instance.type)
+        self.expand(data, instance, 'type')
         return data
 
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(DynamicFieldsModelSerializer):
+    expandable_fields = {'currency': (CurrencySerializer, False), 'type': (TransactionTypeSerializer, False)}
+    required_fields = ('bank_account',)
     class Meta:
         model = Transaction
         fields = '__all__'
 
-class BankAccountApplicationSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        self.expand(data, instance, 'currency')
+        self.expand(data, instance, 'type')
+        return data
+
+class ArchivedTransactionSerializer(TransactionSerializer):
+    class Meta:
+        model = ArchivedTransaction
+        fields = '__all__'
+
+class BankAccountApplicationSerializer(DynamicFieldsModelSerializer):
     user = serializers.CharField(required=False)
     status = serializers.CharField(required=False)
+    expandable_fields = {'status': (ApplicationStatusSerializer, True), 'currency': (CurrencySerializer, False)}
+    required_fields = ('user',)
     class Meta:
         model = BankAccountApplication
         fields = '__all__'
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['user'] = instance.user.id
-        data['status'] = ApplicationStatusSerializer(instance.status).to_representation(instance.status)
+        if 'user' in data:
+            data['user'] = instance.user_id
+        self.expand(data, instance, 'status')
+        self.expand(data, instance, 'currency')
         return data
 
     def create(self, validated_data):
@@ -143,15 +275,19 @@ class BankAccountApplicationSerializer(serializers.ModelSerializer):
 
         data = {
             'user': authUser,
-            'status': ApplicationStatus.objects.get(status='pending'),
+            'status': ApplicationStatus.PENDING,
             'currency': validated_data['currency'],
         }
 
-        return super().create(data)
+        # The pending counter of the dashboard is updated with the insert
+        with transaction.atomic():
+            return super().create(data)
 
-class CardApplicationSerializer(serializers.ModelSerializer):
+class CardApplicationSerializer(DynamicFieldsModelSerializer):
     user = serializers.CharField(required=False)
     status = serializers.CharField(required=False)
+    expandable_fields = {'status': (ApplicationStatusSerializer, True), 'type': (CardTypeSerializer, False)}
+    required_fields = ('user',)
 
     class Meta:
         model = CardApplication
@@ -159,10 +295,12 @@ class CardApplicationSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['user'] = instance.user.id
-        data['bank_account'] = instance.bank_account.id
-        data['type'] = instance.type.id
-        data['status'] = ApplicationStatusSerializer(instance.status).to_representation(instance.status)
+        if 'user' in data:
+            data['user'] = instance.user_id
+        if 'bank_account' in data:
+            data['bank_account'] = instance.bank_account_id
+        self.expand(data, instance, 'type')
+        self.expand(data, instance, 'status')
         return data
 
     def create(self, validated_data):
@@ -174,10 +312,11 @@ class CardApplicationSerializer(serializers.ModelSerializer):
             'bank_account': validated_data['bank_account'],
             'type': validated_data['type'],
             'monthly_salary': validated_data['monthly_salary'],
-            'status': ApplicationStatus.objects.get(status='pending')
+            'status': ApplicationStatus.PENDING
         }
 
-        return super().create(data)
+        with transaction.atomic():
+            return super().create(data)
     
     def validate(self, data):
         request = self.context.get('request')
@@ -192,6 +331,7 @@ class CardApplicationSerializer(serializers.ModelSerializer):
                 
         return super().validate(data)
 
-
-
-
+class ScheduledTransferSerializer(DynamicFieldsModelSerializer):
+    class Meta:
+        model = ScheduledTransfer
+        fields = '__all__'
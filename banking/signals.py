@@ -0,0 +1,108 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User, Card, BankAccount, BalanceDelta, BankAccountApplication, CardApplication, \
+                    ApplicationStatus
+from .search import index_usernames, unindex_username
+from .cards import card_index
+from .ibans import iban_cache
+from .dashboard import BANK_ACCOUNTS, CARDS, add_balance_changes, add_to_counter, get_pending_counter
+
+
+@receiver(pre_save, sender=User)
+def track_username(sender, instance, update_fields=None, **kwargs):
+    # Saves that cannot change the username (the last_login update of every login) do not
+    # touch the full text index, the others compare with the stored username
+    if update_fields is not None and 'username' not in update_fields:
+        instance._username_changed = False
+    elif instance.pk is None:
+        instance._username_changed = True
+    else:
+        stored = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+        instance._username_changed = stored != instance.username
+
+@receiver(post_save, sender=User)
+def index_user(sender, instance, **kwargs):
+    # Keep the username full text index in sync
+    if getattr(instance, '_username_changed', True):
+        index_usernames([instance])
+
+@receiver(post_delete, sender=User)
+def unindex_user(sender, instance, **kwargs):
+    unindex_username(instance.id)
+
+@receiver(post_save, sender=Card)
+def index_card(sender, instance, **kwargs):
+    # Keep the in-memory card index used by card authorizations coherent, once the change is
+    # committed: a rolled back card must not authorize payments
+    transaction.on_commit(lambda: card_index.put(instance))
+
+@receiver(post_delete, sender=Card)
+def unindex_card(sender, instance, **kwargs):
+    transaction.on_commit(lambda: card_index.remove(instance.card_number))
+
+@receiver(post_save, sender=Card)
+@receiver(post_delete, sender=Card)
+def uncache_card_account(sender, instance, **kwargs):
+    # The IBAN cache knows whether an account has a card
+    iban_cache.invalidate_account(instance.bank_account_id)
+
+@receiver(post_save, sender=BankAccount)
+def recache_bank_account(sender, instance, **kwargs):
+    iban_cache.account_saved(instance)
+
+@receiver(post_delete, sender=BankAccount)
+def uncache_bank_account(sender, instance, **kwargs):
+    iban_cache.invalidate_account(instance.id)
+
+
+@receiver(post_save, sender=BankAccount)
+def count_bank_account(sender, instance, created, **kwargs):
+    # Dashboard counters, the balance changes of existing accounts are counted by their writers
+    if created:
+        add_to_counter(BANK_ACCOUNTS, 1)
+        add_balance_changes([(instance.currency_id, instance.balance)])
+
+@receiver(post_delete, sender=BankAccount)
+def uncount_bank_account(sender, instance, **kwargs):
+    add_to_counter(BANK_ACCOUNTS, -1)
+    add_balance_changes([(instance.currency_id, -instance.balance)])
+
+@receiver(post_delete, sender=BalanceDelta)
+def uncount_balance_delta(sender, instance, **kwargs):
+    # Pending credits of a deleted hot account
+    add_balance_changes([(instance.bank_account.currency_id, -instance.amount)])
+
+@receiver(pre_save, sender=Card)
+def track_card_activity(sender, instance, update_fields=None, **kwargs):
+    # The active card counter follows the transitions of is_active, not every save
+    if update_fields is not None and 'is_active' not in update_fields:
+        instance._was_active = instance.is_active
+    elif instance.pk is None:
+        instance._was_active = False
+    else:
+        instance._was_active = Card.objects.filter(pk=instance.pk, is_active=True).exists()
+
+@receiver(post_save, sender=Card)
+def count_card(sender, instance, created, **kwargs):
+    was_active = False if created else getattr(instance, '_was_active', instance.is_active)
+    if instance.is_active != was_active:
+        add_to_counter(CARDS, 1 if instance.is_active else -1)
+
+@receiver(post_delete, sender=Card)
+def uncount_card(sender, instance, **kwargs):
+    if instance.is_active:
+        add_to_counter(CARDS, -1)
+
+@receiver(post_save, sender=BankAccountApplication)
+@receiver(post_save, sender=CardApplication)
+def count_application(sender, instance, created, **kwargs):
+    if created and instance.status == ApplicationStatus.PENDING:
+        add_to_counter(get_pending_counter(instance), 1)
+
+@receiver(post_delete, sender=BankAccountApplication)
+@receiver(post_delete, sender=CardApplication)
+def uncount_application(sender, instance, **kwargs):
+    if instance.status == ApplicationStatus.PENDING:
+        add_to_counter(get_pending_counter(instance), -1)
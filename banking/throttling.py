@@ -0,0 +1,226 @@
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse, QueryDict
+from django.urls import Resolver404, resolve
+
+# (method, url name) -> budget of settings.RATE_LIMITS
+SCOPES = {
+    ('POST', 'login'): 'login',
+    ('POST', 'transfer-money'): 'transfer',
+    ('POST', 'transfer-money-async'): 'transfer',
+    ('GET', 'search'): 'list',
+    ('POST', 'batch'): 'list',
+    ('GET', 'resolve-iban'): 'list',
+}
+
+
+class TokenBucket:
+    __slots__ = ('tokens', 'updated_at', 'full_at')
+
+    def __init__(self, capacity, now):
+        self.tokens = capacity
+        self.updated_at = now
+        self.full_at = now
+
+    def take(self, capacity, period, now):
+        """
+        Take a token, `capacity` tokens are refilled every `period` seconds.
+
+        Returns:
+            float: 0 if a token was taken, else the seconds until the next token.
+        """
+        rate = capacity / period
+        self.tokens = min(capacity, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return (1 - self.tokens) / rate
+
+        self.tokens -= 1
+        self.full_at = now + (capacity - self.tokens) / rate
+        return 0
+
+
+class LocalBucketStore:
+    """
+    Token buckets kept in process memory, every process enforces the budgets on its own.
+
+    The buckets are kept in least recently used order. A bucket that refilled since its
+    last use is the same as a new one, so it is dropped when it reaches the front.
+    Past `max_buckets` the least recently used buckets are dropped anyway.
+    """
+
+    def __init__(self, max_buckets):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period, now):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(capacity, now)
+            else:
+                self._buckets.move_to_end(key)
+            wait = bucket.take(capacity, period, now)
+
+            while self._buckets:
+                oldest = next(iter(self._buckets.values()))
+                if oldest.full_at > now and len(self._buckets) <= self.max_buckets:
+                    break
+                self._buckets.popitem(last=False)
+            return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class CacheBucketStore:
+    """
+    Token buckets kept in a Django cache shared by the processes (Redis, Memcached).
+
+    A bucket is read and written back without a lock, so concurrent requests of the same
+    client on different processes can overspend it by a few tokens.
+    """
+
+    def __init__(self, alias):
+        self.cache = caches[alias]
+
+    def take(self, key, capacity, period, now):
+        key = 'ratelimit:' + ':'.join(key)
+        state = self.cache.get(key)
+        bucket = TokenBucket(capacity, now)
+        if state is not None:
+            bucket.tokens, bucket.updated_at = state
+
+        wait = bucket.take(capacity, period, now)
+        self.cache.set(key, (bucket.tokens, bucket.updated_at), timeout=math.ceil(bucket.full_at - now) + 1)
+        return wait
+
+
+_local_store = None
+_local_store_lock = threading.Lock()
+
+
+def get_bucket_store():
+    global _local_store
+    if settings.RATE_LIMIT_CACHE:
+        return CacheBucketStore(settings.RATE_LIMIT_CACHE)
+
+    if _local_store is None:
+        with _local_store_lock:
+            if _local_store is None:
+                _local_store = LocalBucketStore(settings.RATE_LIMIT_MAX_BUCKETS)
+    return _local_store
+
+
+def get_scope(request):
+    # The budget of a request from its url name, list endpoints of the router end in -list
+    try:
+        url_name = resolve(request.path_info).url_name
+    except Resolver404:
+        return None
+    if request.method == 'GET' and url_name and url_name.endswith('-list'):
+        return 'list'
+    return SCOPES.get((request.method, url_name))
+
+
+def get_client_ip(request):
+    if settings.RATE_LIMIT_CLIENT_IP_HEADER:
+        forwarded = request.META.get(settings.RATE_LIMIT_CLIENT_IP_HEADER)
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def get_login_username(request):
+    # Read from the raw body, the request data is parsed again by the view
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body or b'{}')
+        elif request.content_type == 'application/x-www-form-urlencoded':
+            data = QueryDict(request.body)
+        else:
+            return None
+    except ValueError:
+        return None
+    username = data.get('username') if hasattr(data, 'get') else None
+    return str(username).lower() if username else None
+
+
+def get_client_keys(request, scope):
+    """
+    The identities a request is limited as: the client IP, and the user when it is known
+    without a query. That is the username sent to the login, or the session cookie.
+    """
+    keys = [('ip', get_client_ip(request))]
+    if scope == 'login':
+        user = get_login_username(request)
+    else:
+        user = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if user:
+        # Hashed so that session keys do not end up in a shared cache
+        keys.append(('user', hashlib.sha256(user.encode()).hexdigest()[:32]))
+    return keys
+
+
+class RateLimitMiddleware:
+    """
+    Limit the login, transfer and list endpoints with token buckets per user and per
+    client IP, budgets are set by settings.RATE_LIMITS.
+
+    This runs before the session or the user are loaded, and a rejected request returns
+    from here: it never reaches the database or the password hasher. The throttles of the
+    REST framework would only run after the authentication.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Under ASGI the chain stays async, the streaming views are not run in a thread
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.limit(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        # The shared cache is a network call, the buckets of the process are only a dict
+        if settings.RATE_LIMIT_CACHE:
+            response = await sync_to_async(self.limit)(request)
+        else:
+            response = self.limit(request)
+        return response or await self.get_response(request)
+
+    def limit(self, request):
+        # The 429 response of a request over its budget, None if a token was taken
+        scope = get_scope(request)
+        budgets = settings.RATE_LIMITS.get(scope) if scope else None
+        if not budgets:
+            return None
+
+        store = get_bucket_store()
+        now = time.time()
+        wait = 0
+        for kind, client in get_client_keys(request, scope):
+            if kind in budgets:
+                capacity, period = budgets[kind]
+                wait = max(wait, store.take((scope, kind, client), capacity, period, now))
+        if not wait:
+            return None
+
+        response = JsonResponse({'error': 'Too many requests, try again later'}, status=429)
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
@@ -0,0 +1,528 @@
+import random
+import time
+from datetime import datetime
+from multiprocessing import Process
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Mod
+from django.utils import timezone
+
+from .models import BankAccount, BalanceDelta, Card, Currency, Transaction, TransactionType, TransferRequest, \
+                    ArchivedTransaction
+from .money import money_value
+from .utils import generate_transaction_id
+from .fx import FxError, get_rate_table
+from .feed import post_transactions
+from .dashboard import add_balance_changes
+from .ibans import iban_cache
+
+
+class TransferError(Exception):
+    """Raised when a transfer cannot be applied. The message is safe to return to the client."""
+
+
+def load_transfer_request(user, data):
+    """
+    Validate the payload of a transfer request and load the objects it refers to.
+
+    The receiver is given by its id in "bank_account_receiver" or by its IBAN in
+    "receiver_iban", which is resolved through the IBAN cache.
+
+    Args:
+        user (User): The authenticated user sending the money.
+        data (dict): The request payload.
+
+    Returns:
+        tuple: The amount, the Currency, the sender BankAccount and the receiver BankAccount.
+
+    Raises:
+        TransferError: If the payload is invalid.
+    """
+    required_fields = {
+        'amount': int, 
+        'currency': int, 
+        'bank_account': int
+    }
+    if 'receiver_iban' not in data:
+        required_fields['bank_account_receiver'] = int
+
+    for field, field_type in required_fields.items():
+        if field not in data:
+            raise TransferError(f'{field} is required')
+        if not isinstance(data[field], field_type):
+            raise TransferError(f'{field} must be an integer')
+
+    currency = Currency.objects.get(pk=data['currency'])
+
+    if 'receiver_iban' in data:
+        if not isinstance(data['receiver_iban'], str):
+            raise TransferError('receiver_iban must be a string')
+        entry = iban_cache.get(data['receiver_iban'])
+        if entry is None:
+            raise TransferError('Invalid receiver IBAN')
+        receiver_id = entry.bank_account_id
+    else:
+        receiver_id = data['bank_account_receiver']
+
+    accounts = BankAccount.objects.in_bulk([data['bank_account'], receiver_id])
+
+    bank_account = accounts.get(data['bank_account'])
+    if bank_account is None:
+        raise TransferError('Invalid bank account')
+
+    bank_account_receiver = accounts.get(receiver_id)
+    if bank_account_receiver is None:
+        raise TransferError('Invalid bank account receiver')
+
+    if bank_account.user_id != user.id:
+        raise TransferError('Invalid bank account')
+
+    return data['amount'], currency, bank_account, bank_account_receiver
+
+
+def quote_transfer(amount, currency_id, bank_account, bank_account_receiver, rate_table=None):
+    """
+    Convert the amount of a transfer into the currencies of the two accounts.
+
+    Args:
+        amount (Decimal | int): The amount to transfer, in the currency of the request.
+        currency_id (int): The currency of the request.
+        bank_account (BankAccount): The sender account.
+        bank_account_receiver (BankAccount): The receiver account.
+        rate_table (RateTable, optional): The rates to use, defaults to the current rate table.
+
+    Returns:
+        tuple: The debit amount in the sender currency, the credit amount in the receiver
+        currency and the id of the rate snapshot used (None when nothing was converted).
+
+    Raises:
+        TransferError: If there is no rate for the currencies.
+    """
+    if currency_id == bank_account.currency_id == bank_account_receiver.currency_id:
+        return amount, amount, None
+
+    try:
+        rate_table = rate_table or get_rate_table()
+        debit_amount = rate_table.convert(amount, currency_id, bank_account.currency_id)
+        credit_amount = rate_table.convert(amount, currency_id, bank_account_receiver.currency_id)
+    except FxError as e:
+        raise TransferError(str(e))
+
+    if amount > 0 and (debit_amount <= 0 or credit_amount <= 0):
+        raise TransferError('Amount is too small to convert')
+
+    return debit_amount, credit_amount, rate_table.snapshot_id
+
+
+def validate_transfer(bank_account, bank_account_receiver, amount, linked_account_ids):
+    """
+    Run the business checks of a transfer against already loaded accounts.
+
+    Args:
+        bank_account (BankAccount): The sender account.
+        bank_account_receiver (BankAccount): The receiver account.
+        amount (Decimal | int): The amount to debit, in the currency of the sender account.
+        linked_account_ids (set of int): Ids of the accounts that have a card linked.
+
+    Raises:
+        TransferError: If the transfer is not allowed.
+    """
+    if amount <= 0:
+        raise TransferError('Amount must be greater than 0')
+
+    if bank_account.get_available_balance() < amount:
+        raise TransferError('Insufficient funds')
+
+    # Check if the bank accounts have a card linked to them
+    if bank_account.id not in linked_account_ids:
+        raise TransferError('Your bank account does not have a card linked')
+
+    if bank_account_receiver.id not in linked_account_ids:
+        raise TransferError('Receiver bank account does not have a card linked')
+
+
+def build_transfer_transactions(bank_account, bank_account_receiver, debit_amount, credit_amount,
+                                debit, credit, date, fx_snapshot_id=None):
+    """
+    Build the (unsaved) debit and credit transactions of a transfer.
+
+    Each transaction is posted in the currency of its account. The balances of the accounts
+    must already include the transfer, they are stored as the running balance of the
+    transactions. Hot accounts get no running balance here because their credits are not
+    applied under the account lock, fold_balance_deltas fills it in.
+
+    Returns:
+        list of Transaction: The debit transaction of the sender and the credit transaction of the receiver.
+    """
+    return [
+        Transaction(
+            transaction_id=generate_transaction_id(),
+            bank_account=bank_account,
+            amount=-debit_amount,
+            currency_id=bank_account.currency_id,
+            type=debit,
+            date=date,
+            balance_after=None if bank_account.is_hot else bank_account.balance,
+            fx_snapshot_id=fx_snapshot_id,
+            counterparty=bank_account_receiver
+        ),
+        Transaction(
+            transaction_id=generate_transaction_id(),
+            bank_account=bank_account_receiver,
+            amount=credit_amount,
+            currency_id=bank_account_receiver.currency_id,
+            type=credit,
+            date=date,
+            balance_after=None if bank_account_receiver.is_hot else bank_account_receiver.balance,
+            fx_snapshot_id=fx_snapshot_id,
+            counterparty=bank_account
+        ),
+    ]
+
+
+def apply_transfers(transfers):
+    """
+    Apply a batch of transfers inside the current database transaction (group commit).
+
+    The accounts, linked cards and transaction types needed by the whole batch are loaded
+    with a constant number of queries, balances are tracked in memory while the batch is
+    applied, and the results are written back with bulk statements.
+
+    Args:
+        transfers (list): Objects with `bank_account_id`, `bank_account_receiver_id`,
+            `amount` and `currency_id` (TransferRequest, ScheduledTransfer).
+
+    Returns:
+        list of str: The error of every transfer, in order, None for the applied ones.
+    """
+    sender_ids = {transfer.bank_account_id for transfer in transfers}
+    receiver_ids = {transfer.bank_account_receiver_id for transfer in transfers}
+    account_ids = sender_ids | receiver_ids
+
+    # Hot accounts that only receive money are credited through their delta stripes,
+    # so their rows are not locked
+    hot_receiver_ids = set(
+        BankAccount.objects.filter(pk__in=receiver_ids - sender_ids, is_hot=True).values_list('id', flat=True)
+    )
+    accounts = BankAccount.objects.select_for_update().in_bulk(account_ids - hot_receiver_ids)
+    accounts.update(BankAccount.objects.in_bulk(hot_receiver_ids))
+    load_pending_deltas(accounts.values())
+    linked_account_ids = set(
+        Card.objects.filter(bank_account_id__in=account_ids, is_active=True).values_list('bank_account_id', flat=True)
+    )
+    debit = TransactionType.DEBIT
+    credit = TransactionType.CREDIT
+
+    now = datetime.now()
+    errors = []
+    transactions = []
+    updated_accounts = {}
+    hot_credits = {}
+    balance_changes = []
+
+    for transfer in transfers:
+        bank_account = accounts.get(transfer.bank_account_id)
+        bank_account_receiver = accounts.get(transfer.bank_account_receiver_id)
+
+        try:
+            if bank_account is None or bank_account_receiver is None:
+                raise TransferError('Invalid bank account')
+            debit_amount, credit_amount, fx_snapshot_id = quote_transfer(
+                transfer.amount, transfer.currency_id, bank_account, bank_account_receiver
+            )
+            validate_transfer(bank_account, bank_account_receiver, debit_amount, linked_account_ids)
+        except TransferError as e:
+            errors.append(str(e))
+            continue
+
+        bank_account.balance -= debit_amount
+        updated_accounts[bank_account.id] = bank_account
+
+        if bank_account_receiver.is_hot:
+            bank_account_receiver.pending_delta += credit_amount
+            hot_credits[bank_account_receiver.id] = hot_credits.get(bank_account_receiver.id, 0) + credit_amount
+        else:
+            bank_account_receiver.balance += credit_amount
+            updated_accounts[bank_account_receiver.id] = bank_account_receiver
+
+        transactions += build_transfer_transactions(
+            bank_account, bank_account_receiver, debit_amount, credit_amount,
+            debit, credit, now, fx_snapshot_id
+        )
+        balance_changes += [
+            (bank_account.currency_id, -debit_amount),
+            (bank_account_receiver.currency_id, credit_amount)
+        ]
+        errors.append(None)
+
+    post_transactions(transactions)
+    BankAccount.objects.bulk_update(updated_accounts.values(), ['balance'])
+    for bank_account_id, amount in hot_credits.items():
+        credit_hot_account(bank_account_id, amount)
+    add_balance_changes(balance_changes)
+
+    return errors
+
+
+def process_transfer_batch(batch_size=500, worker=0, workers=1):
+    """
+    Apply up to `batch_size` queued transfers in a single database transaction.
+
+    Args:
+        batch_size (int): The maximum number of transfers to apply.
+        worker (int): The index of the calling worker.
+        workers (int): The total number of workers. Each worker only drains the transfers
+            whose id modulo `workers` equals `worker`, so two workers never claim the same row.
+
+    Returns:
+        int: The number of transfers processed.
+    """
+    with transaction.atomic():
+        pending = TransferRequest.objects.select_for_update(skip_locked=True) \
+                                         .filter(status=TransferRequest.PENDING)
+        if workers > 1:
+            pending = pending.annotate(partition=Mod('id', workers)).filter(partition=worker)
+        pending = list(pending.order_by('id')[:batch_size])
+
+        if not pending:
+            return 0
+
+        errors = apply_transfers(pending)
+
+        processed_at = timezone.now()
+        for transfer, error in zip(pending, errors):
+            transfer.status = TransferRequest.COMPLETED if error is None else TransferRequest.FAILED
+            transfer.error = error
+            transfer.processed_at = processed_at
+
+        TransferRequest.objects.bulk_update(pending, ['status', 'error', 'processed_at'])
+
+    return len(pending)
+
+
+def drain_batches(run_batch, worker, workers, batch_size, poll_interval, once):
+    """
+    Call `run_batch` as worker `worker` of `workers` until it finds nothing to do, then
+    exit or wait `poll_interval` seconds and start again.
+
+    Args:
+        run_batch (callable): Claims and applies one batch of work in one database transaction,
+            called with `batch_size`, `worker` and `workers`, returns the number of items
+            processed (process_transfer_batch, run_scheduled_batch).
+        once (bool): Return once a batch finds nothing to do instead of polling.
+
+    Returns:
+        int: The number of items processed.
+    """
+    # Every worker process opens its own database connection
+    connections.close_all()
+
+    processed = 0
+    while True:
+        count = run_batch(batch_size=batch_size, worker=worker, workers=workers)
+        processed += count
+
+        if count == 0:
+            if once:
+                return processed
+            time.sleep(poll_interval)
+
+
+def run_batch_workers(run_batch, workers, batch_size, poll_interval, once):
+    """
+    Drain `run_batch` with `workers` processes, or in this process when there is one worker.
+
+    Returns:
+        int | None: The number of items processed by a single worker, None for worker processes.
+    """
+    if workers == 1:
+        return drain_batches(run_batch, 0, 1, batch_size, poll_interval, once)
+
+    processes = [
+        Process(target=drain_batches, args=(run_batch, worker, workers, batch_size, poll_interval, once))
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+def load_pending_deltas(accounts):
+    """
+    Set `pending_delta` on the hot accounts of `accounts` with a single grouped query,
+    so `BankAccount.get_balance` does not query them one by one.
+    """
+    hot_accounts = [account for account in accounts if account.is_hot]
+    if not hot_accounts:
+        return
+
+    totals = dict(
+        BalanceDelta.objects.filter(bank_account__in=hot_accounts)
+                            .values('bank_account_id')
+                            .annotate(total=Sum('amount'))
+                            .values_list('bank_account_id', 'total')
+    )
+    for account in hot_accounts:
+        account.pending_delta = totals.get(account.id) or 0
+
+
+def credit_hot_account(bank_account_id, amount, stripes=None):
+    """
+    Credit a hot account by incrementing one of its delta stripes chosen at random.
+
+    Concurrent credits to the same account land on different rows, so they do not
+    serialize on the BankAccount row. fold_balance_deltas merges the stripes into the balance.
+
+    Args:
+        bank_account_id (int): The id of the hot account.
+        amount (Decimal | int): The amount to credit.
+        stripes (int): The number of stripes. Default is settings.HOT_ACCOUNT_STRIPES.
+    """
+    stripe = random.randrange(stripes or settings.HOT_ACCOUNT_STRIPES)
+
+    with transaction.atomic():
+        updated = BalanceDelta.objects.filter(bank_account_id=bank_account_id, stripe=stripe) \
+                                      .update(amount=F('amount') + money_value(amount))
+        if not updated:
+            BalanceDelta.objects.get_or_create(bank_account_id=bank_account_id, stripe=stripe)
+            BalanceDelta.objects.filter(bank_account_id=bank_account_id, stripe=stripe) \
+                                .update(amount=F('amount') + money_value(amount))
+
+
+def fold_balance_deltas(bank_account):
+    """
+    Merge the delta stripes of a hot account into its balance.
+
+    Each stripe is decremented by the exact amount that was read, so credits that land
+    while the fold runs stay in their stripe and are picked up by the next fold.
+
+    Returns:
+        Decimal: The amount folded into the balance.
+    """
+    with transaction.atomic():
+        BankAccount.objects.select_for_update().filter(pk=bank_account.pk).first()
+        deltas = list(BalanceDelta.objects.filter(bank_account=bank_account).exclude(amount=0))
+        total = sum((delta.amount for delta in deltas), 0)
+
+        if not deltas:
+            return total
+
+        BankAccount.objects.filter(pk=bank_account.pk).update(balance=F('balance') + money_value(total))
+        for delta in deltas:
+            BalanceDelta.objects.filter(pk=delta.pk).update(amount=F('amount') - money_value(delta.amount))
+
+    fill_running_balances(bank_account)
+    return total
+
+
+def fill_running_balances(bank_account, chunk_size=1000):
+    """
+    Compute `balance_after` for the transactions of an account that do not have it yet, oldest first.
+
+    Every chunk is written in its own database transaction under the account lock. Rows are
+    only ever filled oldest first, so an interrupted run resumes from the previous filled row.
+    The opening balance of an account without any filled row is its current balance minus
+    the sum of all its transactions.
+
+    Args:
+        bank_account (BankAccount): The account to fill.
+        chunk_size (int): The number of transactions updated per database transaction.
+
+    Returns:
+        int: The number of transactions filled.
+    """
+    filled = 0
+
+    while True:
+        with transaction.atomic():
+            locked_account = BankAccount.objects.select_for_update().get(pk=bank_account.pk)
+            chunk = list(
+                Transaction.objects.filter(bank_account=locked_account, balance_after__isnull=True)
+                                   .order_by('id')[:chunk_size]
+            )
+            if not chunk:
+                return filled
+
+            # Only transactions with a running balance are archived, so the previous row
+            # of either table has one
+            previous = None
+            previous_id = 0
+            for model in (Transaction, ArchivedTransaction):
+                row = model.objects.filter(bank_account=locked_account, id__lt=chunk[0].id) \
+                                   .order_by('-id').values('id', 'balance_after').first()
+                if row is not None and row['id'] > previous_id:
+                    previous, previous_id = row['balance_after'], row['id']
+
+            if previous is None:
+                # The chunk starts at the first transaction of the account
+                total = sum_transactions(bank_account=locked_account)
+                previous = locked_account.get_balance() - total
+
+            running = previous
+            for row in chunk:
+                running += row.amount
+                row.balance_after = running
+
+            Transaction.objects.bulk_update(chunk, ['balance_after'])
+            filled += len(chunk)
+
+
+def sum_transactions(**filters):
+    """
+    Sum the amounts of the transactions matching `filters` in both the hot and the archive table.
+
+    Returns:
+        Decimal: The total, 0 when nothing matches.
+    """
+    return sum(
+        (model.objects.filter(**filters).aggregate(total=Sum('amount'))['total'] or 0
+         for model in (Transaction, ArchivedTransaction)),
+        0
+    )
+
+
+def get_balance_at(bank_account, date):
+    """
+    Return the balance of an account at the end of `date`.
+
+    This is normally one lookup per table on the (bank_account, date, id) index: the running
+    balance of the last transaction on or before the date. When that transaction has no
+    running balance yet (unfolded hot account credits, history not backfilled), the amounts
+    of the transactions after the date are subtracted from the current balance instead.
+    Before the first transaction, the balance is the one the first transaction started from.
+
+    Args:
+        bank_account (BankAccount): The account.
+        date (date): The date.
+
+    Returns:
+        Decimal: The balance.
+    """
+    last = None
+    first = None
+    for model in (Transaction, ArchivedTransaction):
+        history = model.objects.filter(bank_account=bank_account).order_by('-date', '-id')
+
+        row = history.filter(date__lte=date).values('id', 'date', 'amount', 'balance_after').first()
+        if row is not None and (last is None or (row['date'], row['id']) > (last['date'], last['id'])):
+            last = row
+
+        row = history.reverse().values('id', 'date', 'amount', 'balance_after').first()
+        if row is not None and (first is None or (row['date'], row['id']) < (first['date'], first['id'])):
+            first = row
+
+    if last is not None and last['balance_after'] is not None:
+        return last['balance_after']
+
+    if last is None:
+        # Nothing happened up to the date, the balance is the one before the first transaction
+        if first is None:
+            return bank_account.get_balance()
+        if first['balance_after'] is not None:
+            return first['balance_after'] - first['amount']
+
+    # Walk back from the current balance over the transactions that happened after the date
+    return bank_account.get_balance() - sum_transactions(bank_account=bank_account, date__gt=date)
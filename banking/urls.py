@@ -7,15 +7,22 @@ from .views import UserViewSet, RoleViewSet, TransactionViewSet, \
                     BankAccountViewSet,  CardApplicationViewSet, \
                     ApplicationStatusViewSet, \
                     loginView, logoutView, bankApplicationBankerAction, \
-                    cardApplicationBankerAction, transfer_money, get_current_user
+                    cardApplicationBankerAction, transfer_money, get_current_user, \
+                    transfer_money_async, transfer_status, balance_at, \
+                    search, bulk_import_clients, bulk_import_status, \
+                    card_authorization, capture_card_authorization, \
+                    release_card_authorization, fx_rates, fx_convert_transactions, \
+                    scheduled_transfers, scheduled_transfer_detail, transaction_events, \
+                    application_events, dashboard, client_overview, batch, \
+                    resolve_iban
 
 router = DefaultRouter()
 
 router.register(r'roles', RoleViewSet)
-router.register(r'application-statuses', ApplicationStatusViewSet)
+router.register(r'application-statuses', ApplicationStatusViewSet, basename='applicationstatus')
 router.register(r'currencies', CurrencyViewSet)
-router.register(r'card-types', CardTypeViewSet)
-router.register(r'transaction-types', TransactionTypeViewSet)
+router.register(r'card-types', CardTypeViewSet, basename='cardtype')
+router.register(r'transaction-types', TransactionTypeViewSet, basename='transactiontype')
 router.register(r'users', UserViewSet)
 router.register(r'bank-accounts', BankAccountViewSet)
 router.register(r'cards', CardViewSet)
@@ -25,12 +32,31 @@ router.register(r'card-applications', CardApplicationViewSet)
 
 
 urlpatterns = [
-    path('login/', loginView),
+    path('login/', loginView, name='login'),
     path('logout/', logoutView),
     path('bank-account-applications/<int:pk>/banker-action/', bankApplicationBankerAction),
     path('card-applications/<int:pk>/banker-action/', cardApplicationBankerAction),
-    path('transfer-money/', transfer_money),
+    path('transfer-money/', transfer_money, name='transfer-money'),
+    path('transfer-money/async/', transfer_money_async, name='transfer-money-async'),
+    path('transfer-money/<str:transfer_id>/', transfer_status),
+    path('resolve-iban/', resolve_iban, name='resolve-iban'),
     path('get-current-user/', get_current_user),
+    path('overview/', client_overview),
+    path('batch/', batch, name='batch'),
+    path('scheduled-transfers/', scheduled_transfers),
+    path('scheduled-transfers/<int:pk>/', scheduled_transfer_detail),
+    path('bank-accounts/<int:pk>/balance-at/', balance_at),
+    path('search/', search, name='search'),
+    path('users/bulk-import/', bulk_import_clients),
+    path('users/bulk-import/<int:pk>/', bulk_import_status),
+    path('card-authorizations/', card_authorization),
+    path('card-authorizations/<str:authorization_code>/capture/', capture_card_authorization),
+    path('card-authorizations/<str:authorization_code>/release/', release_card_authorization),
+    path('fx-rates/', fx_rates),
+    path('fx-rates/convert/', fx_convert_transactions),
+    path('transactions/events/', transaction_events),
+    path('application-events/', application_events),
+    path('dashboard/', dashboard),
     path('', include(router.urls)),
 ]
 
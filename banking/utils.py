@@ -69,6 +69,20 @@ def luhn_checksum(card_number):
     
     return checksum % 10
 
+def is_luhn_valid(card_number):
+    """
+    Check the Luhn check digit of a credit card number.
+    
+    Args:
+        card_number (str): The card number, check digit included.
+    
+    Returns:
+        bool: True if the card number only has digits and a valid check digit.
+    """
+    if not card_number.isdigit():
+        return False
+    return luhn_checksum([int(digit) for digit in card_number]) == 0
+
 def generate_credit_card(prefix, length=16):
     """
     Generate a valid random credit card number using the Luhn algorithm.
@@ -87,8 +101,8 @@ def generate_credit_card(prefix, length=16):
     while len(card_number) < (length - 1):
         card_number.append(random.randint(0, 9))
     
-    # Calculate the Luhn check digit
-    check_digit = luhn_checksum(card_number)
+    # Calculate the Luhn check digit, the checksum is taken with a 0 in place of the check digit
+    check_digit = luhn_checksum(card_number + [0])
     check_digit = 0 if check_digit == 0 else 10 - check_digit
     
     # Append the check digit to the card number
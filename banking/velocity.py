@@ -0,0 +1,238 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Transaction
+from .transfers import TransferError
+
+logger = logging.getLogger(__name__)
+
+# Window name -> (bucket width in seconds, number of buckets)
+WINDOWS = {
+    'minute': (5, 12),
+    'hour': (60, 60),
+    'day': (3600, 24),
+}
+LONGEST_WINDOW = max(width * size for width, size in WINDOWS.values())
+
+# The windows of accounts idle for longer than the longest window are freed every PRUNE_EVERY records
+PRUNE_EVERY = 10000
+
+
+class VelocityError(TransferError):
+    """Raised when a transfer breaks a velocity rule. The message is safe to return to the client."""
+
+
+class SlidingWindow:
+    """
+    Ring buffer of time buckets with the count and the sum of the amounts of each bucket.
+
+    A bucket is reused once its slot comes around again, the totals only add the buckets
+    that are still inside the window.
+    """
+    __slots__ = ('width', 'epochs', 'counts', 'amounts')
+
+    def __init__(self, width, size):
+        self.width = width
+        self.epochs = [-1] * size
+        self.counts = [0] * size
+        self.amounts = [Decimal(0)] * size
+
+    def add(self, timestamp, amount, count=1):
+        epoch = int(timestamp // self.width)
+        slot = epoch % len(self.epochs)
+        if self.epochs[slot] != epoch:
+            self.epochs[slot] = epoch
+            self.counts[slot] = 0
+            self.amounts[slot] = Decimal(0)
+        self.counts[slot] += count
+        self.amounts[slot] += amount
+
+    def totals(self, timestamp):
+        epoch = int(timestamp // self.width)
+        oldest = epoch - len(self.epochs) + 1
+        count = 0
+        amount = Decimal(0)
+        for slot, bucket_epoch in enumerate(self.epochs):
+            if oldest <= bucket_epoch <= epoch:
+                count += self.counts[slot]
+                amount += self.amounts[slot]
+        return count, amount
+
+
+class AccountVelocity:
+    # The windows are only allocated for the accounts with a transfer in the longest window
+    __slots__ = ('windows', 'new_receivers', 'receivers', 'last_seen')
+
+    def __init__(self):
+        self.windows = None
+        self.new_receivers = None
+        self.receivers = set()
+        self.last_seen = 0
+
+    def add(self, timestamp, amount, new_receiver=False):
+        if self.windows is None:
+            self.windows = {name: SlidingWindow(width, size) for name, (width, size) in WINDOWS.items()}
+            self.new_receivers = SlidingWindow(*WINDOWS['day'])
+
+        for window in self.windows.values():
+            window.add(timestamp, amount)
+        if new_receiver:
+            self.new_receivers.add(timestamp, amount)
+        self.last_seen = max(self.last_seen, timestamp)
+
+
+class VelocityChecker:
+    """
+    Per-account velocity counters of outgoing transfers, kept in process memory.
+
+    The counters are rebuilt from the recent transactions at startup (see banking.apps) or
+    on first use, so a check costs no query. They are not shared between
+    processes: every process enforces the limits on the transfers it handles.
+    """
+
+    def __init__(self):
+        self._accounts = None
+        self._lock = threading.Lock()
+        # Held while the counters are rebuilt, a transfer arriving during the startup warm waits for it
+        self._warming = threading.Lock()
+        self._records = 0
+
+    def warm(self, now=None):
+        with self._warming:
+            self._warm(now)
+
+    def ensure_warm(self):
+        with self._warming:
+            if self._accounts is None:
+                self._warm()
+
+    def _warm(self, now=None):
+        now = now or timezone.now()
+        accounts = {}
+        # (bank account id, receiver id) -> timestamp and amount of the first payment in the history
+        first_payments = {}
+
+        # Receivers paid during the history window are known, the debits of the last day fill the counters
+        history = Transaction.objects.filter(
+            created_at__gte=now - timedelta(days=settings.VELOCITY_RECEIVER_HISTORY_DAYS),
+            amount__lt=0,
+            counterparty__isnull=False
+        ).values_list('bank_account_id', 'counterparty_id', 'amount', 'created_at')
+
+        since = now.timestamp() - LONGEST_WINDOW
+        for bank_account_id, counterparty_id, amount, created_at in history.iterator(chunk_size=10000):
+            account = accounts.get(bank_account_id)
+            if account is None:
+                account = accounts[bank_account_id] = AccountVelocity()
+            account.receivers.add(counterparty_id)
+
+            timestamp = created_at.timestamp()
+            if timestamp >= since:
+                account.add(timestamp, -amount)
+
+            first_payment = first_payments.get((bank_account_id, counterparty_id))
+            if first_payment is None or timestamp < first_payment[0]:
+                first_payments[bank_account_id, counterparty_id] = (timestamp, -amount)
+
+        # A receiver first paid inside the last day counts as a new receiver of that day
+        for (bank_account_id, _), (timestamp, amount) in first_payments.items():
+            if timestamp >= since:
+                accounts[bank_account_id].new_receivers.add(timestamp, amount)
+
+        with self._lock:
+            self._accounts = accounts
+
+    def check(self, bank_account_id, receiver_id, amount, timestamp=None):
+        """
+        Check a transfer against the velocity rules of settings.VELOCITY_LIMITS and the
+        new receiver rules, and log the decision.
+
+        Raises:
+            VelocityError: If the transfer breaks a rule.
+        """
+        if self._accounts is None:
+            self.ensure_warm()
+
+        timestamp = timestamp or time.time()
+        account = self._accounts.get(bank_account_id)
+
+        try:
+            if account is not None and account.windows is not None:
+                for name, limits in settings.VELOCITY_LIMITS.items():
+                    count, total = account.windows[name].totals(timestamp)
+                    if 'count' in limits and count + 1 > limits['count']:
+                        raise VelocityError(f'Too many transfers in the last {name}')
+                    if 'amount' in limits and total + amount > Decimal(limits['amount']):
+                        raise VelocityError(f'Transfer limit per {name} exceeded')
+
+            if account is None or receiver_id not in account.receivers:
+                if amount > Decimal(settings.VELOCITY_NEW_RECEIVER_MAX_AMOUNT):
+                    raise VelocityError('Amount too high for a new receiver')
+                if account is not None and account.windows is not None:
+                    new_receivers, _ = account.new_receivers.totals(timestamp)
+                    if new_receivers + 1 > settings.VELOCITY_NEW_RECEIVERS_PER_DAY:
+                        raise VelocityError('Too many new receivers today')
+        except VelocityError as e:
+            logger.warning('velocity declined account=%s receiver=%s amount=%s rule="%s"',
+                           bank_account_id, receiver_id, amount, e)
+            raise
+
+        logger.debug('velocity approved account=%s receiver=%s amount=%s', bank_account_id, receiver_id, amount)
+
+    def record(self, bank_account_id, receiver_id, amount, timestamp=None):
+        # Count a transfer that was applied, called once the transfer is committed
+        if self._accounts is None:
+            self.ensure_warm()
+
+        timestamp = timestamp or time.time()
+        with self._lock:
+            self._record(bank_account_id, receiver_id, amount, timestamp)
+
+    def check_and_record(self, bank_account_id, receiver_id, amount, timestamp=None):
+        """
+        Check a transfer and count it in one step under the lock, so two concurrent transfers
+        of an account cannot both pass a limit only one of them fits in.
+
+        Raises:
+            VelocityError: If the transfer breaks a rule, it is not counted then.
+        """
+        if self._accounts is None:
+            self.ensure_warm()
+
+        timestamp = timestamp or time.time()
+        with self._lock:
+            self.check(bank_account_id, receiver_id, amount, timestamp)
+            self._record(bank_account_id, receiver_id, amount, timestamp)
+
+    def _record(self, bank_account_id, receiver_id, amount, timestamp):
+        account = self._accounts.get(bank_account_id)
+        if account is None:
+            account = self._accounts[bank_account_id] = AccountVelocity()
+
+        new_receiver = receiver_id not in account.receivers
+        account.receivers.add(receiver_id)
+        account.add(timestamp, amount, new_receiver)
+
+        self._records += 1
+        if self._records % PRUNE_EVERY == 0:
+            self.prune(timestamp)
+
+    def prune(self, timestamp):
+        # Free the windows of idle accounts, they would all be empty anyway. The known receivers are kept
+        since = timestamp - LONGEST_WINDOW
+        for account in self._accounts.values():
+            if account.windows is not None and account.last_seen < since:
+                account.windows = None
+                account.new_receivers = None
+
+    def __len__(self):
+        return len(self._accounts or {})
+
+
+velocity_checker = VelocityChecker()
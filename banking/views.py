@@ -1,10 +1,21 @@
+import json
+import logging
+import os
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 
 from rest_framework import viewsets
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.core.exceptions import ValidationError, FieldError
+from django.db import transaction
+from django.db.models import Count, F, Sum, Window
+from django.db.models.functions import RowNumber
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
 
 
 from django.contrib.auth import login, logout, authenticate
@@ -16,18 +27,51 @@ from .utils import generate_bank_account_id, generate_albanian_iban, \
 from .models import Role, User, Transaction, \
                     Card, Currency, TransactionType, \
                     CardType, BankAccountApplication, \
-                    BankAccount, CardApplication, ApplicationStatus
+                    BankAccount, CardApplication, ApplicationStatus, \
+                    TransferRequest, ArchivedTransaction, ClientImport, ScheduledTransfer, get_code
 
 from .serializers import RoleSerializer, UserSerializer, TransactionSerializer, \
                          CardSerializer, CurrencySerializer, TransactionTypeSerializer, \
                          CardTypeSerializer, BankAccountApplicationSerializer, \
-                         BankAccountSerializer, CardApplicationSerializer, ApplicationStatusSerializer
+                         BankAccountSerializer, CardApplicationSerializer, ApplicationStatusSerializer, \
+                         ArchivedTransactionSerializer, ScheduledTransferSerializer
+
+from .filters import TransactionFilter, ArchivedTransactionFilter, BankAccountFilter, \
+                     BankAccountApplicationFilter, CardApplicationFilter
+
+from .archive import get_tier_ordering, merge_tiers, order_tier, spans_archive
+
+from .search import search_users, search_bank_accounts, search_cards
+
+from .cards import AuthorizationDeclined, authorize_card_payment
+
+from .holds import HoldError, capture_hold, release_hold
+
+from .fx import FxError, get_rate_table, publish_rates, round_amount
+
+from .velocity import velocity_checker
+
+from .feed import post_transactions, transaction_feed
+
+from .notifications import application_hub, post_application_event
+
+from .dashboard import add_balance_changes, get_dashboard, record_application_decision
+
+from .batch import run_batch
+
+from .ibans import iban_cache, normalize_iban
+
+from .transfers import TransferError, load_transfer_request, \
+                        quote_transfer, validate_transfer, build_transfer_transactions, \
+                        credit_hot_account, get_balance_at, load_pending_deltas
 
 from .permissions import IsAdminUser, IsBankerUser, \
                         IsClientUser, IsLoggedIn, \
                         ClientReadOnlyPermission, \
                         ClientApplicationPermission, BankerReadOnlyPermission
 
+logger = logging.getLogger(__name__)
+
 
 @api_view(['POST'])
 def loginView(request):
@@ -58,32 +102,90 @@ def get_current_user(request):
     print('data', data)
     return Response(data, status=200)
 
-class ApplicationStatusViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = ApplicationStatus.objects.all()
-    serializer_class = ApplicationStatusSerializer
+@api_view(['GET'])
+@permission_classes([IsLoggedIn, IsClientUser])
+def client_overview(request):
+    """
+    Everything the client app shows after login in one response: the user, the bank accounts
+    with their balances and last `?transactions=` transactions, the active cards and the currencies
+    and card types.
+
+    The number of queries does not depend on the number of accounts: the last transactions
+    of every account come from one query ranking them per account.
+    """
+    user = request.user
+    try:
+        limit = int(request.query_params.get('transactions', settings.CLIENT_OVERVIEW_TRANSACTIONS))
+    except ValueError:
+        return Response({'error': 'transactions must be a number'}, status=400)
+    if not 0 <= limit <= settings.CLIENT_OVERVIEW_MAX_TRANSACTIONS:
+        return Response({'error': f'transactions must be between 0 and {settings.CLIENT_OVERVIEW_MAX_TRANSACTIONS}'}, status=400)
+
+    context = {'request': request}
+    bank_accounts = list(BankAccount.objects.filter(user=user).select_related('currency', 'user').order_by('id'))
+    load_pending_deltas(bank_accounts)
+
+    transactions = {}
+    if bank_accounts and limit:
+        latest = Transaction.objects.filter(bank_account__in=bank_accounts).annotate(rank=Window(
+            RowNumber(),
+            partition_by=F('bank_account_id'),
+            order_by=[F('date').desc(), F('id').desc()]
+        )).filter(rank__lte=limit).order_by('bank_account_id', '-date', '-id')
+        for row in TransactionSerializer(latest, many=True, context=context).data:
+            transactions.setdefault(row['bank_account'], []).append(row)
+
+    accounts = BankAccountSerializer(bank_accounts, many=True, context=context).data
+    for account in accounts:
+        account['transactions'] = transactions.get(account['id'], [])
+
+    return Response({
+        'user': UserSerializer(user, context=context).data,
+        'bank_accounts': accounts,
+        'cards': CardSerializer(Card.objects.filter(user=user, is_active=True), many=True, context=context).data,
+        'currencies': CurrencySerializer(Currency.objects.all(), many=True, context=context).data,
+        'card_types': CardTypeSerializer(CardType.values, many=True).data,
+    })
+
+class SparseFieldsetMixin:
+    # Narrow the queryset to the ?fields= and ?expand= of the request, see DynamicFieldsModelSerializer
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return self.get_serializer_class().narrow_queryset(queryset, self.request)
+
+class ChoicesViewSet(viewsets.ViewSet):
+    # The codes of the choices of serializer_class, listed like the rows of the lookup table they replaced
+    serializer_class = None
     permission_classes = [IsLoggedIn]
 
-class RoleViewSet(viewsets.ReadOnlyModelViewSet):
+    def list(self, request):
+        return Response(self.serializer_class(self.serializer_class.choices.values, many=True).data)
+
+    def retrieve(self, request, pk=None):
+        if pk not in {str(code) for code in self.serializer_class.choices.values}:
+            raise NotFound()
+        return Response(self.serializer_class(int(pk)).data)
+
+class ApplicationStatusViewSet(ChoicesViewSet):
+    serializer_class = ApplicationStatusSerializer
+
+class RoleViewSet(SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
     permission_classes = [IsLoggedIn, IsAdminUser]
 
-class CurrencyViewSet(viewsets.ReadOnlyModelViewSet):
+class CurrencyViewSet(SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Currency.objects.all()
     serializer_class = CurrencySerializer
     permission_classes = [IsLoggedIn]
 
-class CardTypeViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = CardType.objects.all()
+class CardTypeViewSet(ChoicesViewSet):
     serializer_class = CardTypeSerializer
-    permission_classes = [IsLoggedIn] 
 
-class TransactionTypeViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = TransactionType.objects.all()
+class TransactionTypeViewSet(ChoicesViewSet):
     serializer_class = TransactionTypeSerializer
-    permission_classes = [IsLoggedIn]
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsLoggedIn, IsAdminUser | IsBankerUser | ClientReadOnlyPermission]
@@ -109,12 +211,12 @@ class UserViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.data, status=200)
 
-class BankAccountViewSet(viewsets.ModelViewSet):
+class BankAccountViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = BankAccount.objects.all()
     serializer_class = BankAccountSerializer
     permission_classes = [IsLoggedIn, IsBankerUser | ClientReadOnlyPermission]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['user', 'currency', 'balance']
+    filterset_class = BankAccountFilter
 
     def get_serializer_context(self):
         # Include the request in the serializer context
@@ -138,12 +240,20 @@ class BankAccountViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data, status=200)
 
-class CardViewSet(viewsets.ModelViewSet):
+    def perform_update(self, serializer):
+        # A balance set by a banker is a balance change of the dashboard counters, counted in
+        # the same database transaction against the locked row
+        with transaction.atomic():
+            old = BankAccount.objects.select_for_update().only('balance', 'currency_id').get(pk=serializer.instance.pk)
+            bank_account = serializer.save()
+            add_balance_changes([(old.currency_id, -old.balance), (bank_account.currency_id, bank_account.balance)])
+
+class CardViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Card.objects.all()
     serializer_class = CardSerializer
     permission_classes = [IsLoggedIn, IsBankerUser | ClientReadOnlyPermission]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['bank_account', 'type', 'user']
+    filterset_fields = ['bank_account', 'type', 'user', 'is_active']
 
     def get_serializer_context(self):
         # Include the request in the serializer context
@@ -166,12 +276,12 @@ class CardViewSet(viewsets.ModelViewSet):
 
         return Response(serializer.data, status=200)
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     permission_classes = [IsLoggedIn, BankerReadOnlyPermission | ClientReadOnlyPermission]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['bank_account', 'type', 'date', 'currency']
+    filterset_class = TransactionFilter
 
     def get_serializer_context(self):
         # Include the request in the serializer context
@@ -184,22 +294,42 @@ class TransactionViewSet(viewsets.ModelViewSet):
 
         if authUser.role.banker_permission or authUser.role.admin_permission:
             queryset = self.get_queryset()
+            archived = ArchivedTransaction.objects.all()
         else:
             queryset = self.get_queryset().filter(bank_account__user=authUser)
+            archived = ArchivedTransaction.objects.filter(bank_account__user=authUser)
 
         # Apply filters based from the auth user's role
         queryset = self.filter_queryset(queryset)
 
-        serializer = self.get_serializer(queryset, many=True)
+        filterset = TransactionFilter(request.query_params)
+        ordering = get_tier_ordering(filterset.form.cleaned_data.get('ordering') if filterset.is_valid() else None)
 
-        return Response(serializer.data, status=200)
+        # Older transactions live in the archive table, read it only when the date range reaches it
+        date_from, date_to = filterset.get_date_range()
+        if not spans_archive(date_from, date_to):
+            serializer = self.get_serializer(queryset.order_by(*ordering), many=True)
+            return Response(serializer.data, status=200)
+
+        archived = ArchivedTransactionFilter(request.query_params, queryset=archived).qs
+        archived = ArchivedTransactionSerializer.narrow_queryset(archived, request)
+
+        # Both tables in the requested order, merged into one list
+        tiers = []
+        context = self.get_serializer_context()
+        for tier, serializer_class in ((queryset, self.get_serializer_class()), (archived, ArchivedTransactionSerializer)):
+            rows = list(order_tier(tier, ordering))
+            tiers.append(list(zip(rows, serializer_class(rows, many=True, context=context).data)))
+        data = merge_tiers(*tiers, ordering)
+
+        return Response(data, status=200)
     
-class BankAccountApplicationViewSet(viewsets.ModelViewSet):
+class BankAccountApplicationViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = BankAccountApplication.objects.all()
     serializer_class = BankAccountApplicationSerializer
     permission_classes = [IsLoggedIn, BankerReadOnlyPermission | ClientApplicationPermission]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['status', 'user', 'currency', 'date']
+    filterset_class = BankAccountApplicationFilter
 
     def list(self, request, *args, **kwargs):
         authUser = request.user
@@ -222,12 +352,12 @@ class BankAccountApplicationViewSet(viewsets.ModelViewSet):
         context['request'] = self.request
         return context
 
-class CardApplicationViewSet(viewsets.ModelViewSet):
+class CardApplicationViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = CardApplication.objects.all()
     serializer_class = CardApplicationSerializer
     permission_classes = [IsLoggedIn, BankerReadOnlyPermission | ClientApplicationPermission]
     filter_backends = [DjangoFilterBackend]
-    filterset_fields = ['status', 'user', 'reason', 'date']
+    filterset_class = CardApplicationFilter
 
     def get_serializer_context(self):
         # Include the request in the serializer context
@@ -259,17 +389,15 @@ def bankApplicationBankerAction(request, pk):
     if 'action' not in data:
         return Response({'error': 'Action is required'}, status=400)
     
-    applicationStatus = ApplicationStatus.objects.filter(status=data['action']).exists()
+    applicationStatus = get_code(ApplicationStatus, data['action'])
 
-    if not applicationStatus:
+    if applicationStatus is None:
         return Response({'error': 'Invalid action'}, status=400)
     
-    applicationStatus = ApplicationStatus.objects.get(status=data['action'])
-    
-    if applicationApplication.status.status != 'pending':
+    if applicationApplication.status != ApplicationStatus.PENDING:
         return Response({'error': 'Application already processed'}, status=400)
 
-    if applicationStatus.status == 'approved':
+    if applicationStatus == ApplicationStatus.APPROVED:
         # to do
         applicationApplication.status = applicationStatus
 
@@ -282,21 +410,27 @@ def bankApplicationBankerAction(request, pk):
             IBAN = generate_albanian_iban()
 
 
-        # create bank account
-        BankAccount.objects.create(
-            bank_account_id=bank_account_id,
-            IBAN=IBAN,
-            currency=applicationApplication.currency, 
-            user=applicationApplication.user,
-            balance=0,
-            bankApplication=applicationApplication
-        )
+        with transaction.atomic():
+            # create bank account
+            bank_account = BankAccount.objects.create(
+                bank_account_id=bank_account_id,
+                IBAN=IBAN,
+                currency=applicationApplication.currency, 
+                user=applicationApplication.user,
+                balance=0,
+                bankApplication=applicationApplication
+            )
 
-        applicationApplication.save()
+            applicationApplication.save()
+            post_application_event(applicationApplication, bank_account=bank_account.id)
+            record_application_decision(applicationApplication)
         return Response({'status': 'ok'})
-    elif applicationStatus.status == 'rejected':
+    elif applicationStatus == ApplicationStatus.REJECTED:
         applicationApplication.status = applicationStatus
-        applicationApplication.save()
+        with transaction.atomic():
+            applicationApplication.save()
+            post_application_event(applicationApplication)
+            record_application_decision(applicationApplication)
         return Response({'status': 'ok'})
 
     return Response({'error': 'Invalid action'}, status=400)
@@ -311,39 +445,40 @@ def cardApplicationBankerAction(request, pk):
         if 'action' not in data:
             return Response({'error': 'Action is required'}, status=400)
 
-        if cardApplication.status.status != 'pending':
+        if cardApplication.status != ApplicationStatus.PENDING:
             return Response({'error': 'Application already processed'}, status=400)
         
-        applicationStatus = ApplicationStatus.objects.filter(status=data['action']).exists()
+        applicationStatus = get_code(ApplicationStatus, data['action'])
 
-        if not applicationStatus:
+        if applicationStatus is None:
             return Response({'error': 'Invalid action'}, status=400)
-        
-        applicationStatus = ApplicationStatus.objects.get(status=data['action'])
 
         print('applicationStatus', applicationStatus)        
 
-        if applicationStatus.status == 'approved':
+        if applicationStatus == ApplicationStatus.APPROVED:
             cardApplication.status = applicationStatus
             
             card_number = generate_credit_card_visa()
             while Card.objects.filter(card_number=card_number).exists():
                 card_number = generate_credit_card_visa()
 
-            card = Card.objects.create(
-                card_number=card_number,
-                expiry_date=generate_expiry_date(),
-                cvv=generate_cvv(),
-                user=cardApplication.user,
-                bank_account=cardApplication.bank_account,
-                type=cardApplication.type,
-                cardApplication=cardApplication
-            )
-            
-            card.save()
-            cardApplication.save()
+            with transaction.atomic():
+                card = Card.objects.create(
+                    card_number=card_number,
+                    expiry_date=generate_expiry_date(),
+                    cvv=generate_cvv(),
+                    user=cardApplication.user,
+                    bank_account=cardApplication.bank_account,
+                    type=cardApplication.type,
+                    cardApplication=cardApplication
+                )
+                
+                card.save()
+                cardApplication.save()
+                post_application_event(cardApplication, card=card.id)
+                record_application_decision(cardApplication)
             return Response({'status': 'ok'})
-        elif applicationStatus.status == 'rejected':
+        elif applicationStatus == ApplicationStatus.REJECTED:
             if 'reason' not in data:
                 return Response({'error': 'Reason is required'}, status=400)
             if not isinstance(data['reason'], str):
@@ -351,7 +486,10 @@ def cardApplicationBankerAction(request, pk):
 
             cardApplication.status = applicationStatus
             cardApplication.reason = data['reason']
-            cardApplication.save()
+            with transaction.atomic():
+                cardApplication.save()
+                post_application_event(cardApplication, reason=cardApplication.reason)
+                record_application_decision(cardApplication)
 
             return Response({'status': 'ok'})
         
@@ -370,87 +508,518 @@ def transfer_money(request):
 
     data = request.data
     print("data", data)
-    required_fields = {
-        'amount': int, 
-        'currency': int, 
-        'bank_account': int, 
-        'bank_account_receiver': int
-    }
-
-    for field, field_type in required_fields.items():
-        if field not in data:
-            return Response({'error': f'{field} is required'}, status=400)
-        if not isinstance(data[field], field_type):
-            return Response({'error': f'{field} must be an integer'}, status=400)
 
     try:
-        amount = data['amount']
-        currency = Currency.objects.get(pk=data['currency'])
-        
+        amount, currency, bank_account, bank_account_receiver = load_transfer_request(request.user, data)
 
-        if not BankAccount.objects.filter(pk=data['bank_account']).exists():
-            return Response({'error': 'Invalid bank account'}, status=400)
-        
-        if not BankAccount.objects.filter(pk=data['bank_account_receiver']).exists():
-            return Response({'error': 'Invalid bank account receiver'}, status=400)
+        with transaction.atomic():
+            # Reload the accounts under the account lock, the running balances depend on it
+            accounts = BankAccount.objects.select_for_update().in_bulk([bank_account.id, bank_account_receiver.id])
+            bank_account = accounts[bank_account.id]
+            bank_account_receiver = accounts[bank_account_receiver.id]
 
+            linked_account_ids = set(
+                Card.objects.filter(bank_account__in=[bank_account, bank_account_receiver], is_active=True)
+                            .values_list('bank_account_id', flat=True)
+            )
+            debit_amount, credit_amount, fx_snapshot_id = quote_transfer(
+                amount, currency.id, bank_account, bank_account_receiver
+            )
+            validate_transfer(bank_account, bank_account_receiver, debit_amount, linked_account_ids)
+            velocity_checker.check(bank_account.id, bank_account_receiver.id, debit_amount)
+
+            bank_account.balance -= debit_amount
+            bank_account.save()
+
+            if bank_account_receiver.is_hot:
+                credit_hot_account(bank_account_receiver.id, credit_amount)
+            else:
+                bank_account_receiver.balance += credit_amount
+                bank_account_receiver.save()
+
+            post_transactions(build_transfer_transactions(
+                bank_account, bank_account_receiver, debit_amount, credit_amount,
+                TransactionType.DEBIT,
+                TransactionType.CREDIT,
+                datetime.now(), fx_snapshot_id
+            ))
+            add_balance_changes([
+                (bank_account.currency_id, -debit_amount),
+                (bank_account_receiver.currency_id, credit_amount)
+            ])
+            transaction.on_commit(
+                lambda: velocity_checker.record(bank_account.id, bank_account_receiver.id, debit_amount)
+            )
 
-        bank_account = BankAccount.objects.get(pk=data['bank_account'])
-        bank_account_receiver = BankAccount.objects.get(pk=data['bank_account_receiver'])
-        
-        if bank_account.user.id != request.user.id:
-            return Response({'error': 'Invalid bank account'}, status=400)
+        return Response({'status': 'ok'})
+    except TransferError as e:
+        return Response({'error': str(e)}, status=400)
+    except (ValidationError, FieldError, ValueError) as e:
+        return Response({'error': str(e)}, status=400)
+    except Exception:
+        logger.exception('Transfer failed')
+        return Response({'error': 'An error occurred'}, status=500)
+
+@api_view(['POST'])
+@permission_classes([IsLoggedIn, IsClientUser])
+def transfer_money_async(request):
+    # Validate and enqueue the transfer, the process_transfers workers apply it later
+    data = request.data
+
+    try:
+        amount, currency, bank_account, bank_account_receiver = load_transfer_request(request.user, data)
 
         if amount <= 0:
             return Response({'error': 'Amount must be greater than 0'}, status=400)
 
-        if bank_account.balance < amount:
-            return Response({'error': 'Insufficient funds'}, status=400)
-        
-        # Check if the bank accounts have the same currency type
-        if bank_account.currency.id != bank_account_receiver.currency.id:
-            return Response({'error': 'Bank accounts have different currency types'}, status=400)
-
-        # Check if the bank accounts have a card linked to them
-        if not Card.objects.filter(bank_account=bank_account).exists():
-            return Response({'error': 'Your bank account does not have a card linked'}, status=400)
-        
-        if not Card.objects.filter(bank_account=bank_account_receiver).exists():
-            return Response({'error': 'Receiver bank account does not have a card linked'}, status=400)
+        # The velocity rules count the transfers when they are accepted, the workers run in other processes
+        debit_amount, _, _ = quote_transfer(amount, currency.id, bank_account, bank_account_receiver)
+        velocity_checker.check_and_record(bank_account.id, bank_account_receiver.id, debit_amount)
 
-        # Create a debit transaction for the bank account sender
-        Transaction.objects.create(
-            transaction_id=generate_transaction_id(),
+        transfer = TransferRequest.objects.create(
+            transfer_id=generate_transaction_id(prefix='TRF'),
+            user=request.user,
             bank_account=bank_account,
-            amount=-amount,
-            currency=currency,
-            type=TransactionType.objects.get(type='debit'),
-            date=datetime.now()
-        )
-
-        # Create a credit transaction for the bank account receiver
-        Transaction.objects.create(
-            transaction_id=generate_transaction_id(),
-            bank_account=bank_account_receiver,
+            bank_account_receiver=bank_account_receiver,
             amount=amount,
-            currency=currency,
-            type=TransactionType.objects.get(type='credit'),
-            date=datetime.now()
+            currency=currency
         )
 
-        bank_account.balance -= amount
-        bank_account_receiver.balance += amount
-
-        bank_account.save()
-        bank_account_receiver.save()
-
-        return Response({'status': 'ok'})
+        return Response({'transfer_id': transfer.transfer_id, 'status': transfer.status}, status=202)
+    except TransferError as e:
+        return Response({'error': str(e)}, status=400)
     except (ValidationError, FieldError, ValueError) as e:
         return Response({'error': str(e)}, status=400)
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception('Transfer could not be queued')
         return Response({'error': 'An error occurred'}, status=500)
 
+@api_view(['GET'])
+@permission_classes([IsLoggedIn, IsClientUser])
+def resolve_iban(request):
+    # The account to send money to for ?iban=, without the details of its owner
+    iban = request.query_params.get('iban')
+    if not iban:
+        return Response({'error': 'iban is required'}, status=400)
+
+    entry = iban_cache.get(iban)
+    if entry is None:
+        return Response({'error': 'IBAN not found'}, status=404)
+
+    return Response({
+        'IBAN': normalize_iban(iban),
+        'bank_account': entry.bank_account_id,
+        'currency': entry.currency_id,
+        'has_card': entry.has_card,
+    })
 
+@api_view(['GET'])
+@permission_classes([IsLoggedIn, IsClientUser])
+def transfer_status(request, transfer_id):
+    transfer = TransferRequest.objects.filter(transfer_id=transfer_id, user=request.user).first()
+
+    if transfer is None:
+        return Response({'error': 'Transfer not found'}, status=404)
 
-     
\ No newline at end of file
+    return Response({
+        'transfer_id': transfer.transfer_id,
+        'status': transfer.status,
+        'error': transfer.error,
+        'created_at': transfer.created_at,
+        'processed_at': transfer.processed_at,
+    })
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsLoggedIn, IsClientUser])
+def scheduled_transfers(request):
+    # GET: standing orders of the client. POST: create one, the payload of transfer-money/ plus
+    # "interval" (daily, weekly or monthly) and an optional ISO "start_at" (defaults to now)
+    if request.method == 'GET':
+        queryset = ScheduledTransfer.objects.filter(user=request.user).order_by('id')
+        queryset = ScheduledTransferSerializer.narrow_queryset(queryset, request)
+        return Response(ScheduledTransferSerializer(queryset, many=True, context={'request': request}).data)
+
+    data = request.data
+
+    try:
+        amount, currency, bank_account, bank_account_receiver = load_transfer_request(request.user, data)
+    except TransferError as e:
+        return Response({'error': str(e)}, status=400)
+    except (Currency.DoesNotExist, ValueError):
+        return Response({'error': 'Invalid currency'}, status=400)
+
+    if amount <= 0:
+        return Response({'error': 'Amount must be greater than 0'}, status=400)
+
+    if data.get('interval') not in dict(ScheduledTransfer.INTERVAL_CHOICES):
+        return Response({'error': 'interval must be daily, weekly or monthly'}, status=400)
+
+    start_at = timezone.now()
+    if data.get('start_at'):
+        try:
+            start_at = datetime.fromisoformat(data['start_at'])
+        except (TypeError, ValueError):
+            return Response({'error': 'start_at must be an ISO timestamp'}, status=400)
+        if timezone.is_naive(start_at):
+            start_at = timezone.make_aware(start_at)
+
+    scheduled_transfer = ScheduledTransfer.objects.create(
+        user=request.user,
+        bank_account=bank_account,
+        bank_account_receiver=bank_account_receiver,
+        amount=amount,
+        currency=currency,
+        interval=data['interval'],
+        start_at=start_at,
+        next_run_at=start_at
+    )
+
+    return Response(ScheduledTransferSerializer(scheduled_transfer).data, status=201)
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsLoggedIn, IsClientUser])
+def scheduled_transfer_detail(request, pk):
+    scheduled_transfer = ScheduledTransfer.objects.filter(pk=pk, user=request.user).first()
+
+    if scheduled_transfer is None:
+        return Response({'error': 'Scheduled transfer not found'}, status=404)
+
+    if request.method == 'DELETE':
+        # Cancelled orders are kept with their history but never picked up again
+        scheduled_transfer.is_active = False
+        scheduled_transfer.save(update_fields=['is_active'])
+
+    return Response(ScheduledTransferSerializer(scheduled_transfer).data)
+
+@api_view(['GET'])
+@permission_classes([IsLoggedIn])
+def balance_at(request, pk):
+    # Balance of a bank account at the end of the given date (?date=YYYY-MM-DD or an ISO timestamp)
+    bank_account = BankAccount.objects.filter(pk=pk).first()
+
+    if bank_account is None:
+        return Response({'error': 'Invalid bank account'}, status=404)
+
+    authUser = request.user
+    if not (authUser.role.banker_permission or authUser.role.admin_permission) and bank_account.user_id != authUser.id:
+        return Response({'error': 'Invalid bank account'}, status=404)
+
+    if 'date' not in request.query_params:
+        return Response({'error': 'date is required'}, status=400)
+
+    try:
+        date = datetime.fromisoformat(request.query_params['date']).date()
+    except ValueError:
+        return Response({'error': 'date must be an ISO date or timestamp'}, status=400)
+
+    return Response({
+        'bank_account': bank_account.id,
+        'date': date,
+        'balance': BankAccountSerializer().fields['balance'].to_representation(get_balance_at(bank_account, date)),
+    })
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsLoggedIn])
+def fx_rates(request):
+    # GET: rates of the current snapshot. POST (bankers): publish a new snapshot
+    # {"rates": [{"base": <currency id>, "quote": <currency id>, "rate": "1.0834"}, ...]}
+    if request.method == 'POST':
+        authUser = request.user
+        if not (authUser.role.banker_permission or authUser.role.admin_permission):
+            return Response({'error': 'You do not have permission to perform this action.'}, status=403)
+
+        rates = request.data.get('rates')
+        if not isinstance(rates, list) or not rates:
+            return Response({'error': 'rates is required'}, status=400)
+
+        currency_ids = set(Currency.objects.values_list('id', flat=True))
+        rows = {}
+        for rate in rates:
+            try:
+                base, quote, value = rate['base'], rate['quote'], Decimal(str(rate['rate']))
+            except (KeyError, TypeError, InvalidOperation):
+                return Response({'error': 'every rate needs a base, a quote and a rate'}, status=400)
+            if base not in currency_ids or quote not in currency_ids or base == quote:
+                return Response({'error': 'Invalid currency'}, status=400)
+            if value <= 0:
+                return Response({'error': 'rate must be greater than 0'}, status=400)
+            rows[(base, quote)] = value
+
+        snapshot = publish_rates([(base, quote, value) for (base, quote), value in rows.items()])
+        return Response({'fx_snapshot': snapshot.id, 'created_at': snapshot.created_at}, status=201)
+
+    try:
+        rate_table = get_rate_table()
+    except FxError as e:
+        return Response({'error': str(e)}, status=404)
+
+    return Response({
+        'fx_snapshot': rate_table.snapshot_id,
+        'rates': [
+            {'base': base, 'quote': quote, 'rate': str(rate)}
+            for (base, quote), rate in sorted(rate_table.rates.items())
+        ],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsLoggedIn])
+def fx_convert_transactions(request):
+    # Total of the transactions matching the transaction filters, converted to ?to_currency=<id>
+    try:
+        currency = int(request.query_params['to_currency'])
+    except (KeyError, ValueError):
+        return Response({'error': 'to_currency is required and must be an integer'}, status=400)
+
+    authUser = request.user
+    queryset = Transaction.objects.all()
+    archived = ArchivedTransaction.objects.all()
+    if not (authUser.role.banker_permission or authUser.role.admin_permission):
+        queryset = queryset.filter(bank_account__user=authUser)
+        archived = archived.filter(bank_account__user=authUser)
+
+    filterset = TransactionFilter(request.query_params, queryset=queryset)
+    if not filterset.is_valid():
+        return Response({'error': filterset.errors}, status=400)
+    querysets = [filterset.qs]
+
+    date_from, date_to = filterset.get_date_range()
+    if spans_archive(date_from, date_to):
+        querysets.append(ArchivedTransactionFilter(request.query_params, queryset=archived).qs)
+
+    # One row per currency from the database, the conversion runs on these totals only
+    totals = {}
+    counts = {}
+    for qs in querysets:
+        for row in qs.order_by().values('currency_id').annotate(total=Sum('amount'), count=Count('id')):
+            totals[row['currency_id']] = totals.get(row['currency_id'], 0) + row['total']
+            counts[row['currency_id']] = counts.get(row['currency_id'], 0) + row['count']
+
+    try:
+        rate_table = get_rate_table()
+        converted, total = rate_table.convert_totals(totals, currency)
+    except FxError as e:
+        return Response({'error': str(e)}, status=400)
+
+    return Response({
+        'to_currency': currency,
+        'fx_snapshot': rate_table.snapshot_id,
+        'count': sum(counts.values()),
+        'total': str(total),
+        'by_currency': [
+            {
+                'currency': currency_id,
+                'count': counts[currency_id],
+                'total': str(round_amount(Decimal(totals[currency_id]), rate_table.get_exponent(currency_id))),
+                'converted': str(converted[currency_id]),
+            }
+            for currency_id in sorted(totals)
+        ],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsLoggedIn, IsBankerUser])
+def search(request):
+    # Banker search over clients, bank accounts and cards (?q=...&limit=20)
+    query = request.query_params.get('q', '').strip()
+
+    if not query:
+        return Response({'error': 'q is required'}, status=400)
+
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        return Response({'error': 'limit must be an integer'}, status=400)
+
+    context = {'request': request}
+
+    return Response({
+        'users': UserSerializer(search_users(query, limit), many=True, context=context).data,
+        'bank_accounts': BankAccountSerializer(search_bank_accounts(query, limit), many=True, context=context).data,
+        'cards': CardSerializer(search_cards(query, limit), many=True, context=context).data,
+    })
+
+@api_view(['POST'])
+@permission_classes([IsLoggedIn, IsBankerUser])
+def bulk_import_clients(request):
+    # Store an uploaded CSV of clients (username, password), the import_clients command creates them
+    if 'file' not in request.FILES:
+        return Response({'error': 'file is required'}, status=400)
+
+    os.makedirs(settings.CLIENT_IMPORT_DIR, exist_ok=True)
+    path = os.path.join(settings.CLIENT_IMPORT_DIR, f'{generate_transaction_id(prefix="IMP")}.csv')
+
+    with open(path, 'wb') as destination:
+        for chunk in request.FILES['file'].chunks():
+            destination.write(chunk)
+
+    client_import = ClientImport.objects.create(user=request.user, file=path)
+
+    return Response({'id': client_import.id, 'status': client_import.status}, status=202)
+
+@api_view(['GET'])
+@permission_classes([IsLoggedIn, IsBankerUser])
+def bulk_import_status(request, pk):
+    client_import = ClientImport.objects.filter(pk=pk).first()
+
+    if client_import is None:
+        return Response({'error': 'Import not found'}, status=404)
+
+    try:
+        offset = int(request.query_params.get('offset', 0))
+        limit = min(int(request.query_params.get('limit', 100)), 1000)
+    except ValueError:
+        return Response({'error': 'offset and limit must be integers'}, status=400)
+
+    errors = client_import.errors.order_by('row').values('row', 'username', 'error')[offset:offset + limit]
+
+    return Response({
+        'id': client_import.id,
+        'status': client_import.status,
+        'rows_processed': client_import.rows_processed,
+        'imported': client_import.imported,
+        'error_count': client_import.errors.count(),
+        'errors': list(errors),
+    })
+
+@api_view(['POST'])
+@permission_classes([IsLoggedIn, IsBankerUser])
+def card_authorization(request):
+    # Authorize a card payment and reserve the funds on the linked bank account, for the
+    # bank's card processing only: clients do not place holds on cards
+    data = request.data
+
+    for field in ['card_number', 'cvv', 'expiry', 'amount']:
+        if field not in data:
+            return Response({'error': f'{field} is required'}, status=400)
+
+    try:
+        hold = authorize_card_payment(data['card_number'], data['cvv'], data['expiry'], data['amount'])
+    except AuthorizationDeclined as e:
+        return Response({'status': 'declined', 'reason': str(e)})
+
+    return Response({
+        'status': 'approved',
+        'authorization_code': hold.authorization_code,
+        'amount': str(hold.amount),
+        'expires_at': hold.expires_at,
+    })
+
+def hold_response(hold):
+    return Response({
+        'authorization_code': hold.authorization_code,
+        'status': hold.status,
+        'amount': str(hold.amount),
+        'captured_amount': None if hold.captured_amount is None else str(hold.captured_amount),
+        'expires_at': hold.expires_at,
+        'settled_at': hold.settled_at,
+    })
+
+@api_view(['POST'])
+@permission_classes([IsLoggedIn, IsBankerUser])
+def capture_card_authorization(request, authorization_code):
+    # Post the debit of an authorized card payment, optionally for a lower amount than the hold
+    try:
+        hold, _ = capture_hold(authorization_code, request.data.get('amount'))
+    except HoldError as e:
+        return Response({'error': str(e)}, status=400)
+
+    return hold_response(hold)
+
+@api_view(['POST'])
+@permission_classes([IsLoggedIn, IsBankerUser])
+def release_card_authorization(request, authorization_code):
+    # Cancel an authorized card payment, the held funds become available again
+    try:
+        hold = release_hold(authorization_code)
+    except HoldError as e:
+        return Response({'error': str(e)}, status=400)
+
+    return hold_response(hold)
+
+@api_view(['GET'])
+@permission_classes([IsLoggedIn, IsBankerUser])
+def dashboard(request):
+    # Figures of the banker dashboard, read from the counters instead of the tables they count
+    return Response(get_dashboard())
+
+async def batch(request):
+    """
+    Run a list of GET sub-requests against the API in one round trip.
+
+    The body is {"requests": [{"method": "GET", "path": "/api/cards/1/"}, ...]}, the response
+    has the status and the body of every sub-request in the same order. The sub-requests run
+    concurrently and share the authentication of the batch.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    user = await request.auser()
+    if str(user) == 'AnonymousUser':
+        return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=403)
+    # The permissions of every sub-request read the role, it is loaded once here
+    user = await User.objects.select_related('role').aget(pk=user.pk)
+
+    try:
+        sub_requests = json.loads(request.body)['requests']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'requests is required'}, status=400)
+    if not isinstance(sub_requests, list) or not sub_requests:
+        return JsonResponse({'error': 'requests must be a non empty list'}, status=400)
+    if len(sub_requests) > settings.BATCH_MAX_REQUESTS:
+        return JsonResponse({'error': f'A batch has at most {settings.BATCH_MAX_REQUESTS} requests'}, status=400)
+    if any(not isinstance(sub_request, dict) or sub_request.get('method', 'GET') != 'GET' for sub_request in sub_requests):
+        return JsonResponse({'error': 'Only GET requests can be batched'}, status=400)
+
+    responses = await run_batch(request, [sub_request.get('path') for sub_request in sub_requests], user)
+    return JsonResponse({'responses': responses})
+
+async def get_client_user(request):
+    # The client of an async view, the permission classes of the REST framework do not run there
+    user = await request.auser()
+    if str(user) == 'AnonymousUser':
+        return None, JsonResponse({'error': 'Authentication credentials were not provided.'}, status=403)
+    if not await Role.objects.filter(pk=user.role_id, client_permission=True).aexists():
+        return None, JsonResponse({'error': 'You do not have permission to perform this action.'}, status=403)
+    return user, None
+
+async def event_stream_response(request, hub, topics):
+    # Server-Sent Events of `topics`, resumed from the standard Last-Event-ID header (or ?cursor=)
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('cursor')
+    if cursor is not None:
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            return JsonResponse({'error': 'cursor must be an event id'}, status=400)
+
+    subscription, position = await hub.subscribe(topics)
+    response = StreamingHttpResponse(hub.stream(subscription, position, cursor), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Proxies must not buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def transaction_events(request):
+    """
+    Stream the new transactions of the accounts of the authenticated client as Server-Sent
+    Events, served by the ASGI application.
+
+    A client that resumes first gets the events it missed. Accounts opened after the stream
+    started are picked up when the client reconnects.
+    """
+    user, error = await get_client_user(request)
+    if error:
+        return error
+
+    bank_account_ids = [
+        bank_account_id async for bank_account_id in
+        BankAccount.objects.filter(user=user).values_list('id', flat=True)
+    ]
+    return await event_stream_response(request, transaction_feed, bank_account_ids)
+
+async def application_events(request):
+    # Stream the status changes of the bank account and card applications of the authenticated client
+    user, error = await get_client_user(request)
+    if error:
+        return error
+
+    return await event_stream_response(request, application_hub, [user.id])